@@ -0,0 +1,81 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+    Micro-benchmark of the JSON codecs: serializing the requests (with and
+    without the pre-serialized key/gzip envelope) and decoding the
+    responses, from small reports to big feeds and detailed reports.
+
+        python benchmarks/bench_codec.py
+        python benchmarks/bench_codec.py --codecs json orjson
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+
+from urlquery.codec import available, get_codec, Codec  # noqa: E402
+from urlquery.fakeserver import _Data, _ok  # noqa: E402
+
+
+def _responses():
+    data = _Data(0, 500, 10, 65536)
+    details = {'include_details': True, 'recent_limit': 50}
+    return [
+        ('report', _ok(data.report(140000000))),
+        ('report, details', _ok(data.report(140000001, details))),
+        ('report, screenshot', _ok(data.report(
+            140000002, dict(details, include_screenshot=True)))),
+        ('report_list (50)', _ok({'reports': [data.report(140000000 + i)
+                                              for i in range(50)]})),
+        ('urlfeed (hour)', _ok({'start_time': '', 'end_time': '',
+                                'feed': data.feed(0, 1000)})),
+    ]
+
+
+def _time(function):
+    number, total = timeit.Timer(function).autorange()
+    return total / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description='JSON codec benchmark.')
+    parser.add_argument('--codecs', nargs='+', default=available(),
+                        help='Codecs to compare. Default: all available')
+    args = parser.parse_args()
+
+    from urlquery.api import Client
+    query = {'method': 'report', 'report_id': 140000000,
+             'include_details': True, 'recent_limit': 10}
+    print('Serializing a report request, with the key/gzip fields '
+          'serialized every time or spliced in:')
+    for name in args.codecs:
+        codec = get_codec(name)
+        timings = []
+        for envelope in (False, True):
+            client = Client(key='0' * 32, codec=Codec(
+                name, codec.dumps, codec.loads, envelope))
+            timings.append(_time(lambda: client._serialize(dict(query),
+                                                           True)))
+        print('    {:<12} every time {:>7.2f} us    spliced {:>7.2f} us    '
+              '(default: {})'.format(name, timings[0] * 1e6,
+                                     timings[1] * 1e6,
+                                     'spliced' if codec.envelope
+                                     else 'every time'))
+
+    print('Decoding the responses (from bytes):')
+    for label, response in _responses():
+        body = get_codec('json').dumps(response)
+        print('    {} ({:.1f} KiB):'.format(label, len(body) / 1024.))
+        for name in args.codecs:
+            loads = get_codec(name).loads
+            seconds = _time(lambda: loads(body))
+            print('        {:<12} {:>10.1f} us {:>8.1f} MiB/s'.format(
+                name, seconds * 1e6, len(body) / seconds / 1024 ** 2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+    Benchmark of the start-up cost of urlquery: the time to import it (and
+    to create a client) in a fresh interpreter, the heaviest modules it
+    imports, and the cost of converting the different kinds of timestamps.
+
+        python benchmarks/bench_import.py
+        python benchmarks/bench_import.py -n 50
+"""
+
+import argparse
+from datetime import datetime
+import os
+import subprocess
+import sys
+import timeit
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, root)
+
+
+def _run(code, runs):
+    """
+        Returns the median wall time of running *code* in a new
+        interpreter, in seconds.
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([root, env.get('PYTHONPATH', '')])
+    timings = []
+    for _ in range(runs):
+        output = subprocess.check_output(
+            [sys.executable, '-c', 'import time; start = time.perf_counter()'
+             '\n{}\nprint(time.perf_counter() - start)'.format(code)],
+            env=env, universal_newlines=True)
+        timings.append(float(output.split()[-1]))
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def _heaviest_imports(count):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([root, env.get('PYTHONPATH', '')])
+    stderr = subprocess.Popen([sys.executable, '-X', 'importtime', '-c',
+                               'import urlquery'], env=env,
+                              stderr=subprocess.PIPE,
+                              universal_newlines=True).communicate()[1]
+    modules = []
+    for line in stderr.splitlines():
+        parts = line.split('|')
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2].rstrip()
+        if name == ' urlquery':
+            break
+        # A new top-level import: what came before is not under urlquery
+        if not name.startswith('  '):
+            modules = []
+            continue
+        modules.append((int(parts[1]), name[2:]))
+    return sorted(modules, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Start-up benchmark.')
+    parser.add_argument('-n', '--runs', type=int, default=20,
+                        help='Interpreters started per measure. Default: 20')
+    args = parser.parse_args()
+
+    print('Median time in a new interpreter:')
+    for name, code in (('import urlquery', 'import urlquery'),
+                       ('import + Client()',
+                        'import urlquery; urlquery.Client()'),
+                       ('import urlquery.aio', 'import urlquery.aio')):
+        print('    {:<20} {:>8.1f} ms'.format(name,
+                                              _run(code, args.runs) * 1000))
+
+    print('Heaviest imports of "import urlquery" (cumulative):')
+    for microseconds, module in _heaviest_imports(10):
+        print('    {:<40} {:>8.1f} ms'.format(module, microseconds / 1000.))
+
+    from urlquery.api import _to_timestamp
+    print('Timestamp conversion:')
+    for name, value in (('int', 1400000000), ('float', 1400000000.5),
+                        ('datetime', datetime(2014, 5, 13, 16, 53)),
+                        ('ISO string', '2014-05-13T16:53:20'),
+                        ('free-form string', 'May 13 2014 4:53pm')):
+        number, total = timeit.Timer(lambda: _to_timestamp(value)) \
+            .autorange()
+        print('    {:<20} {:>8.2f} us'.format(name,
+                                              total / number * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+    Benchmark of the client, for every API method and several levels of
+    concurrency, against the offline server (urlquery.fakeserver) running in
+    its own process.
+
+    For each method and concurrency level: throughput (calls per second),
+    p50 and p99 latency, peak memory allocated by the client (tracemalloc)
+    and number of errors.
+
+        python benchmarks/bench_methods.py
+        python benchmarks/bench_methods.py --methods report,urlfeed -c 1,32
+        python benchmarks/bench_methods.py --json before.json
+        python benchmarks/bench_methods.py --compare before.json
+
+    With --compare, exits with 1 if the throughput of a benchmark dropped,
+    or its memory grew, by more than --tolerance.
+"""
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..'))
+
+import urlquery
+
+
+def _iter_search(client):
+    """
+        Searches the last hour, raises if nothing came back: an empty search
+        means the client and the server disagree on the search direction.
+    """
+    now = time.time()
+    stream = client.iter_search('bank', start=now - 3600, end=now)
+    count = sum(1 for _ in stream)
+    if stream.error is not None or not count:
+        raise RuntimeError('iter_search returned {} reports: {}'.format(
+            count, stream.error))
+    return count
+
+
+def _workloads(client):
+    """
+        Returns a dict of method name -> function doing one call.
+    """
+    latest = int(client.report_list(limit=1)['reports'][0]['report_id'])
+    queue_id = client.submit('http://www.example.com/')['queue_id']
+    rng = random.Random(0)
+    return {
+        'urlfeed': lambda: client.urlfeed(),
+        'iter_urlfeed': lambda: sum(1 for _ in client.iter_urlfeed()),
+        'submit': lambda: client.submit('http://www.example.com/'),
+        'mass_submit': lambda: client.mass_submit(
+            ['http://www.example{}.com/'.format(i) for i in range(100)]),
+        'queue_status': lambda: client.queue_status(queue_id),
+        'report': lambda: client.report(latest - rng.randint(0, 10000),
+                                        include_details=True),
+        'report_screenshot': lambda: client.report(
+            latest - rng.randint(0, 10000), include_screenshot=True),
+        'report_list': lambda: client.report_list(limit=50),
+        'search': lambda: client.search('bank'),
+        'iter_search': lambda: _iter_search(client),
+        'reputation': lambda: client.reputation(
+            'www.example{}.com'.format(rng.randint(0, 100000))),
+        'user_agent_list': lambda: client.user_agent_list(),
+    }
+
+
+def _is_error(response):
+    return isinstance(response, dict) and (
+        response.get('error') is not None or
+        (response.get('_response_') or {}).get('status') == 'error')
+
+
+def _run(call, calls, concurrency):
+    """
+        Runs *calls* calls with *concurrency* threads, returns the total
+        time, the latency of each call and the number of errors.
+    """
+    def timed(_):
+        start = time.perf_counter()
+        try:
+            error = _is_error(call())
+        except Exception:
+            error = True
+        return time.perf_counter() - start, error
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(timed, range(calls)))
+    return (time.perf_counter() - start, sorted(r[0] for r in results),
+            sum(1 for r in results if r[1]))
+
+
+def _percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def benchmark(url, method, concurrency, calls, gzip):
+    with urlquery.Client(base_url=url, gzip=gzip, pool_size=concurrency,
+                         coalesce=False) as client:
+        call = _workloads(client)[method]
+        call()  # warm up the connections
+        total, latencies, errors = _run(call, calls, concurrency)
+        tracemalloc.start()
+        _run(call, min(calls, 4 * concurrency), concurrency)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return {'method': method, 'concurrency': concurrency, 'calls': calls,
+            'throughput': calls / total,
+            'p50': _percentile(latencies, 0.5),
+            'p99': _percentile(latencies, 0.99),
+            'peak_memory': peak, 'errors': errors}
+
+
+def _start_server(args):
+    command = [sys.executable, '-m', 'urlquery.fakeserver', '--port', '0',
+               '--feed-size', str(args.feed_size),
+               '--latency', str(args.latency),
+               '--error-rate', str(args.error_rate)]
+    env = dict(os.environ)
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+    env['PYTHONPATH'] = os.pathsep.join([root, env.get('PYTHONPATH', '')])
+    server = subprocess.Popen(command, stdout=subprocess.PIPE, env=env,
+                              universal_newlines=True)
+    url = server.stdout.readline().split()[-1]
+    return server, url
+
+
+def _compare(results, baseline, tolerance):
+    baseline = dict(((r['method'], r['concurrency']), r) for r in baseline)
+    regressions = []
+    for r in results:
+        before = baseline.get((r['method'], r['concurrency']))
+        if before is None:
+            continue
+        if r['throughput'] < before['throughput'] * (1 - tolerance):
+            regressions.append('{method} x{concurrency}: throughput '
+                               '{0:.1f} -> {1:.1f}/s'.format(
+                                   before['throughput'], r['throughput'], **r))
+        if r['peak_memory'] > before['peak_memory'] * (1 + tolerance):
+            regressions.append('{method} x{concurrency}: peak memory '
+                               '{0} -> {1} bytes'.format(
+                                   before['peak_memory'], r['peak_memory'],
+                                   **r))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the client.')
+    parser.add_argument('--methods', default='all',
+                        help='Comma separated list of methods. Default: all')
+    parser.add_argument('-c', '--concurrency', default='1,4,16',
+                        help='Comma separated concurrency levels. '
+                        'Default: 1,4,16')
+    parser.add_argument('-n', '--calls', type=int, default=200,
+                        help='Calls per benchmark. Default: 200')
+    parser.add_argument('--gzip', action='store_true')
+    parser.add_argument('--feed-size', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--url', help='Use a running server instead of '
+                        'starting one')
+    parser.add_argument('--json', help='Write the results to this file')
+    parser.add_argument('--compare', help='Results of a previous run')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if url is None:
+        server, url = _start_server(args)
+    try:
+        if args.methods == 'all':
+            with urlquery.Client(base_url=url) as client:
+                methods = sorted(_workloads(client))
+        else:
+            methods = args.methods.split(',')
+        levels = [int(c) for c in args.concurrency.split(',')]
+        results = []
+        print('{:<18} {:>4} {:>10} {:>9} {:>9} {:>11} {:>6}'.format(
+            'method', 'conc', 'calls/s', 'p50 ms', 'p99 ms', 'peak KiB',
+            'errors'))
+        for method in methods:
+            for concurrency in levels:
+                r = benchmark(url, method, concurrency, args.calls, args.gzip)
+                results.append(r)
+                print('{:<18} {:>4} {:>10.1f} {:>9.2f} {:>9.2f} {:>11.1f} '
+                      '{:>6}'.format(method, concurrency, r['throughput'],
+                                     r['p50'] * 1000, r['p99'] * 1000,
+                                     r['peak_memory'] / 1024., r['errors']))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = _compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print('REGRESSION ' + regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
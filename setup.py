@@ -1,6 +1,6 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
-from distutils.core import setup
+from setuptools import setup
 
 setup(
     name='urlquery',
@@ -18,10 +18,12 @@ setup(
         'Environment :: Console',
         'Intended Audience :: Science/Research',
         'Intended Audience :: Telecommunications Industry',
-        'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3 :: Only',
         'Topic :: Security',
         'Topic :: Internet',
     ],
+    python_requires='>=3.7',
     install_requires=['requests', 'python-dateutil'],
+    extras_require={'aio': ['aiohttp']},
 )
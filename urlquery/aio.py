@@ -0,0 +1,712 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+    asyncio version of the urlquery API, built on aiohttp.
+
+    Every function of urlquery.api has a coroutine equivalent here, with the
+    same parameters and return values, except iter_urlfeed and iter_search
+    which return async iterators, used with async for. The queries are
+    validated by the same code as the synchronous API.
+"""
+
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+import time
+
+import aiohttp
+
+from . import api, cache, models
+from .codec import get_codec
+from .coalesce import AsyncSingleFlight, methods as _coalesced_methods
+from .metrics import error_details
+from .search import SearchStream
+from .stream import _Gunzip, URLFeedStream, aiter_array
+from .api import Client, MassSubmitResult, _Exchange, _chunks, \
+    _gzip_compress, _urlfeed_query, _submit_query, _user_agent_list_query, \
+    _mass_submit_query, _queue_status_query, _report_query, \
+    _report_list_query, _search_query, _iter_search_query, \
+    _reputation_query, _normalize_host
+
+
+async def _iter_body(r, chunk_size=65536):
+    """
+        Yields the decompressed body of an aiohttp response, one chunk at a
+        time.
+    """
+    gunzip = _Gunzip()
+    async for chunk in r.content.iter_chunked(chunk_size):
+        data = gunzip.feed(chunk)
+        if data:
+            yield data
+    data = gunzip.flush()
+    if data:
+        yield data
+
+
+class AsyncMassSubmitResult(MassSubmitResult):
+    """
+        MassSubmitResult of AsyncClient.mass_submit, retry is a coroutine.
+    """
+
+    async def retry(self):
+        failures, self.failures = self.failures, []
+        responses = await asyncio.gather(*[self._submit_chunk(failure.urls)
+                                           for failure in failures])
+        for failure, response in zip(failures, responses):
+            self._add(failure.start, failure.urls, response)
+        return self
+
+
+class AsyncURLFeedStream(URLFeedStream):
+    """
+        URLFeedStream of AsyncClient.iter_urlfeed, iterated with async for.
+    """
+
+    __iter__ = None
+
+    async def __aiter__(self):
+        if self._query.get('error') is not None:
+            return
+        client = self._client
+        if client.metrics is not None:
+            client.metrics.call(self._query['method'])
+        async with client._exchange(self._query, self._gzip) as exchange:
+            # What was parsed so far, if the iteration stops early
+            exchange.response = self.fields
+            async for url in aiter_array(_iter_body(exchange.r), 'feed',
+                                         self.fields):
+                if self._typed and isinstance(url, dict):
+                    url = models.URL.from_dict(url)
+                yield url
+            exchange.received = time.time()
+            exchange.response_bytes = exchange.r.content.total_bytes
+
+
+class AsyncSearchStream(SearchStream):
+    """
+        SearchStream of AsyncClient.iter_search, iterated with async for.
+        At most *max_workers* shards are searched at a time.
+    """
+
+    __iter__ = None
+
+    async def _fetch(self, shard_start):
+        date_from = self._sign * shard_start
+        try:
+            query = dict(self._query, **{'from': date_from})
+            return await self._client._query(query, self._gzip, False)
+        except Exception as e:
+            return {'error': 'Unable to search from {}: {}'.format(date_from, e)}
+
+    async def __aiter__(self):
+        if self._query.get('error') is not None:
+            return
+        # Shards in time order: (start, end, task)
+        shards = deque()
+        next_start, last = self._range()
+        # Reports of the last shard, for the ones on its end boundary
+        previous_ids = set()
+        semaphore = asyncio.Semaphore(self.max_workers)
+
+        async def fetch(shard_start):
+            async with semaphore:
+                return await self._fetch(shard_start)
+
+        def submit(shard_start, shard_end):
+            self.shards += 1
+            return (shard_start, shard_end,
+                    asyncio.ensure_future(fetch(shard_start)))
+
+        try:
+            while True:
+                while len(shards) < 2 * self.max_workers and \
+                        next_start < last:
+                    shard_end = min(last, next_start + self.shard_size)
+                    shards.append(submit(next_start, shard_end))
+                    next_start = shard_end
+                if not shards:
+                    return
+                shard_start, shard_end, task = shards.popleft()
+                result = self._process(shard_start, shard_end, await task,
+                                       previous_ids)
+                if result is None:
+                    return
+                reports, previous_ids, again = result
+                for start, end in reversed(again):
+                    shards.appendleft(submit(start, end))
+                for report in reports:
+                    yield report
+        finally:
+            for _, _, task in shards:
+                task.cancel()
+
+
+class AsyncClient(object):
+    """
+        asyncio client to the urlquery API.
+
+        All the requests of a client go through one aiohttp connection pool,
+        so many calls can be in flight at the same time on a single thread.
+        The session is created on first use, within the running event loop.
+
+        :param key: API key. Default: the module-level *key* of urlquery.api
+
+        :param base_url: URL of the API.
+            Default: the module-level *base_url* of urlquery.api
+
+        :param gzip: Use gzip for the responses, and for the requests bigger
+            than *compress_threshold*. Every API method also takes a *gzip*
+            argument overriding this setting for a single call.
+            Default: the module-level *gzip_default* of urlquery.api
+
+        :param compress_threshold: Size in bytes from which the body of a
+            gzip'ed request is compressed (None to never compress it).
+            Default: 16384
+
+        :param pool_size: Maximum number of simultaneous connections.
+            Default: 100
+
+        :param timeout: Total timeout in seconds of a request, or a dict
+            of them per method (the 'default' entry applying to the
+            others, None to wait forever). Default: the module-level
+            *default_timeouts* of urlquery.api
+
+        :param session: An aiohttp.ClientSession to use instead of creating
+            one.
+
+        :param cache: A cache from urlquery.cache for the responses of
+            report, user_agent_list and reputation. Default: None
+
+        :param rate_limiter: A urlquery.ratelimit.RateLimiter, shared with
+            the other clients using the same key. Default: None
+
+        :param coalesce: Concurrent identical calls to the read-only methods
+            share one request and its response. Default: True
+
+        :param typed: Return the typed objects of urlquery.models instead
+            of dicts. Every API method also takes a *typed* argument
+            overriding this setting for a single call. Default: False
+
+        :param metrics: A urlquery.metrics.Metrics recording the calls,
+            latencies, sizes and errors per method. Default: None
+
+        :param archive: A urlquery.archive.ReportArchive storing every
+            report received. Default: None
+
+        :param local_first: Methods answered from the archive when it
+            can, among report, search and reputation. Default: ('report',)
+
+        :param codec: JSON codec of the requests and responses, see
+            urlquery.codec. Default: None (the fastest available)
+
+        :param circuit_breaker: A urlquery.resilience.CircuitBreaker
+            failing fast while the API is failing. Default: None
+
+        :param hedging: A urlquery.resilience.Hedging sending a second copy
+            of the slow read requests, the one which lost is cancelled.
+            Default: None
+    """
+
+    def __init__(self, key=None, base_url=None, gzip=None, pool_size=100,
+                 timeout=None, session=None, compress_threshold=16384,
+                 cache=None, rate_limiter=None, coalesce=True,
+                 typed=False, metrics=None, archive=None,
+                 local_first=('report',), codec=None, circuit_breaker=None,
+                 hedging=None):
+        self.key = key
+        self.base_url = base_url
+        self.gzip = gzip
+        self.compress_threshold = compress_threshold
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self._in_flight = AsyncSingleFlight() if coalesce else None
+        self.typed = typed
+        self.metrics = metrics
+        self.archive = archive
+        self.local_first = local_first
+        self.codec = get_codec(codec)
+        self._envelopes = {}
+        self.circuit_breaker = circuit_breaker
+        self.hedging = hedging
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.session = session
+        # Event loop of the session created by the client
+        self._session_loop = None
+
+    async def _get_session(self):
+        loop = asyncio.get_running_loop()
+        stale = stale_loop = None
+        if self.session is not None and self._session_loop is not None and \
+                self._session_loop is not loop:
+            # Created in another event loop, e.g. by a previous asyncio.run
+            stale, stale_loop = self.session, self._session_loop
+            self.session = None
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size)
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self._timeout_for(None)))
+            self._session_loop = loop
+        if stale is not None and not stale.closed:
+            if stale_loop.is_closed():
+                # Its connections died with the loop, only marks it closed
+                await stale.close()
+            else:
+                asyncio.run_coroutine_threadsafe(stale.close(), stale_loop)
+        return self.session
+
+    async def close(self):
+        """
+            Closes all the connections of the pool.
+        """
+        if self.session is not None:
+            await self.session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    # The default values are computed exactly like for the synchronous client
+    _api_key = Client._api_key
+    _default_values = Client._default_values
+    _serialize = Client._serialize
+    _timeout_for = Client._timeout_for
+
+    async def _query(self, query, gzip=None, typed=None):
+        if query.get('error') is not None:
+            return query
+        if self.metrics is not None:
+            self.metrics.call(query['method'])
+        if self._in_flight is not None and \
+                query['method'] in _coalesced_methods:
+            response = await self._in_flight.do(
+                cache.make_key(query, self._api_key()),
+                lambda: self._fetch(query, gzip))
+        else:
+            response = await self._fetch(query, gzip)
+        if typed or (typed is None and self.typed):
+            return models.wrap(query['method'], response)
+        return response
+
+    async def _blocking(self, function, *args):
+        """
+            Runs *function* in the default executor: the SQLite queries and
+            JSON encoding of the archive and SQLiteCache would block the
+            event loop.
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            None, function, *args)
+
+    async def _fetch(self, query, gzip=None):
+        if self.archive is not None and query['method'] in self.local_first:
+            response = await self._blocking(self.archive.answer, query)
+            if response is not None:
+                return response
+        if self.cache is not None and query['method'] in self.cache.ttl:
+            api_key = self._api_key()
+            # An in-memory cache is faster than a round trip to a thread
+            in_memory = isinstance(self.cache, cache.LRUCache)
+            if in_memory:
+                response = cache.lookup(self.cache, query, api_key)
+            else:
+                response = await self._blocking(cache.lookup, self.cache,
+                                                query, api_key)
+            if response is not None:
+                return response
+            response = await self._request(query, gzip)
+            if in_memory:
+                cache.store(self.cache, query, api_key, response)
+            else:
+                await self._blocking(cache.store, self.cache, query, api_key,
+                                     response)
+        else:
+            response = await self._request(query, gzip)
+        if self.archive is not None:
+            await self._blocking(self.archive.store, query, response)
+        return response
+
+    async def _request(self, query, gzip=None):
+        if self.hedging is not None and query['method'] in self.hedging.methods:
+            return await self.hedging.call_async(self._send, query, gzip)
+        return await self._send(query, gzip)
+
+    async def _send(self, query, gzip=None):
+        async with self._exchange(query, gzip) as exchange:
+            r = exchange.r
+            body = b''.join([chunk async for chunk in _iter_body(r)])
+            exchange.received = time.time()
+            exchange.response_bytes = r.content.total_bytes or len(body)
+            exchange.response = self.codec.loads(body)
+        return exchange.response
+
+    @asynccontextmanager
+    async def _exchange(self, query, gzip=None):
+        """
+            POSTs the query through the circuit breaker, the rate limiter
+            and the metrics, and yields an _Exchange, see Client._exchange.
+        """
+        breaker = self.circuit_breaker
+        if breaker is not None:
+            breaker.before()
+        url = self.base_url if self.base_url is not None else api.base_url
+        metrics = self.metrics
+        event = {'method': query['method']} if metrics is not None else None
+        start = time.time()
+        limiter = self.rate_limiter
+        if limiter is not None:
+            await limiter.acquire_async(self._api_key(), query['method'])
+        serialize = time.time()
+        data = self._serialize(query, gzip)
+        headers = {}
+        if query.get('gzip') and self.compress_threshold is not None \
+                and len(data) >= self.compress_threshold:
+            data = _gzip_compress(data)
+            headers['Content-Encoding'] = 'gzip'
+        sent = time.time()
+        exchange = _Exchange()
+        status_code = exception = None
+        cancelled = False
+        try:
+            session = await self._get_session()
+            async with session.post(
+                    url, data=data, headers=headers,
+                    timeout=aiohttp.ClientTimeout(
+                        total=self._timeout_for(query['method']))) as r:
+                status_code = r.status
+                exchange.r = r
+                yield exchange
+            received = exchange.received
+            if received is not None:
+                if event is not None:
+                    event['network'] = received - sent
+                    event['decode'] = time.time() - received
+                    event['response_bytes'] = exchange.response_bytes
+                if self.hedging is not None:
+                    # From the time the request was sent, after the rate
+                    # limiter
+                    self.hedging.observe(query['method'], received - sent)
+        except asyncio.CancelledError:
+            # A hedged copy which lost, or a caller's timeout: not an answer
+            # of the server, it says nothing about its load or errors
+            cancelled = True
+            raise
+        except Exception as e:
+            exception = e
+            raise
+        finally:
+            response = exchange.response
+            if breaker is not None and not cancelled:
+                breaker.after(status_code, exception)
+            if limiter is not None and not cancelled:
+                limiter.feedback(self._api_key(), query['method'],
+                                 status_code, response)
+            if event is not None and not cancelled:
+                event['serialize'] = sent - serialize
+                event['request_bytes'] = len(data)
+                event['total'] = time.time() - start
+                event['status_code'] = status_code
+                event['error'], event['error_message'] = error_details(
+                    status_code, response, exception)
+                metrics.record(event)
+
+    async def urlfeed(self, feed='unfiltered', interval='hour', timestamp=None,
+                      gzip=None, typed=None):
+        return await self._query(_urlfeed_query(feed, interval, timestamp),
+                                 gzip, typed)
+    urlfeed.__doc__ = Client.urlfeed.__doc__
+
+    def iter_urlfeed(self, feed='unfiltered', interval='hour', timestamp=None,
+                     gzip=None, typed=None):
+        """
+            Same as Client.iter_urlfeed, the URL objects are iterated with
+            async for:
+
+                async for url in client.iter_urlfeed():
+                    ...
+
+            :return: AsyncURLFeedStream
+        """
+        return AsyncURLFeedStream(self,
+                                  _urlfeed_query(feed, interval, timestamp),
+                                  gzip, typed)
+
+    async def submit(self, url, useragent=None, referer=None, priority='low',
+                     access_level='public', callback_url=None, submit_vt=False,
+                     save_only_alerted=False, gzip=None, typed=None):
+        return await self._query(_submit_query(url, useragent, referer,
+                                               priority, access_level,
+                                               callback_url, submit_vt,
+                                               save_only_alerted), gzip, typed)
+    submit.__doc__ = Client.submit.__doc__
+
+    async def user_agent_list(self, gzip=None, typed=None):
+        return await self._query(_user_agent_list_query(), gzip, typed)
+    user_agent_list.__doc__ = Client.user_agent_list.__doc__
+
+    async def mass_submit(self, urls, useragent=None, referer=None,
+                          access_level='public', priority='low',
+                          callback_url=None, gzip=None, typed=None,
+                          chunk_size=100, max_workers=4):
+        query = _mass_submit_query((), useragent, referer, access_level,
+                                   priority, callback_url)
+        if query.get('error') is not None:
+            return query
+        semaphore = asyncio.Semaphore(max_workers)
+
+        async def submit_chunk(chunk):
+            async with semaphore:
+                try:
+                    return await self._query(dict(query, urls=chunk), gzip,
+                                             typed)
+                except Exception as e:
+                    return {'error': 'Unable to submit chunk: {}'.format(e)}
+
+        result = AsyncMassSubmitResult(submit_chunk)
+        in_flight = deque()
+        try:
+            for start, chunk in _chunks(urls, chunk_size):
+                in_flight.append((start, chunk, asyncio.ensure_future(
+                    submit_chunk(chunk))))
+                # Do not read the whole iterable in advance
+                if len(in_flight) >= 2 * max_workers:
+                    start, chunk, task = in_flight.popleft()
+                    result._add(start, chunk, await task)
+            while in_flight:
+                start, chunk, task = in_flight.popleft()
+                result._add(start, chunk, await task)
+        finally:
+            # Only left if the caller was cancelled or the iterable failed
+            for _, _, task in in_flight:
+                task.cancel()
+        return result
+    mass_submit.__doc__ = Client.mass_submit.__doc__
+
+    async def queue_status(self, queue_id, gzip=None, typed=None):
+        return await self._query(_queue_status_query(queue_id), gzip, typed)
+    queue_status.__doc__ = Client.queue_status.__doc__
+
+    async def report(self, report_id, recent_limit=0, include_details=False,
+                     include_screenshot=False, include_domain_graph=False,
+                     gzip=None, typed=None):
+        return await self._query(_report_query(report_id, recent_limit,
+                                               include_details,
+                                               include_screenshot,
+                                               include_domain_graph),
+                                 gzip, typed)
+    report.__doc__ = Client.report.__doc__
+
+    async def report_many(self, report_ids, recent_limit=0,
+                          include_details=False, include_screenshot=False,
+                          include_domain_graph=False, max_workers=10,
+                          ordered=True, gzip=None, typed=None):
+        """
+            Fetches several reports concurrently, at most *max_workers* at
+            the same time. See Client.report_many.
+
+            If *ordered* is False, returns an async iterator of
+            (report_id, result) tuples in completion order.
+        """
+        report_ids = list(report_ids)
+        semaphore = asyncio.Semaphore(max_workers)
+
+        async def fetch(report_id):
+            async with semaphore:
+                try:
+                    result = await self.report(report_id, recent_limit,
+                                               include_details,
+                                               include_screenshot,
+                                               include_domain_graph, gzip,
+                                               typed)
+                except Exception as e:
+                    result = {'error': 'Unable to fetch report {}: {}'.format(report_id, e)}
+            return report_id, result
+
+        if ordered:
+            results = await asyncio.gather(*[fetch(i) for i in report_ids])
+            return [result for _, result in results]
+        return self._iter_completed(fetch, report_ids)
+
+    @staticmethod
+    async def _iter_completed(fetch, items):
+        tasks = [asyncio.ensure_future(fetch(item)) for item in items]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def report_list(self, timestamp=None, limit=50, gzip=None,
+                          typed=None):
+        return await self._query(_report_list_query(timestamp, limit),
+                                 gzip, typed)
+    report_list.__doc__ = Client.report_list.__doc__
+
+    async def search(self, q, search_type='string', result_type='reports',
+                     url_matching='url_host', date_from=None, deep=False,
+                     gzip=None, typed=None):
+        return await self._query(_search_query(q, search_type, result_type,
+                                               url_matching, date_from, deep),
+                                 gzip, typed)
+    search.__doc__ = Client.search.__doc__
+
+    def iter_search(self, q, search_type='string', url_matching='url_host',
+                    start=None, end=None, deep=False, shard_size=3600,
+                    min_shard_size=10, max_workers=4, page_size=50,
+                    gzip=None, typed=None, direction='backward'):
+        """
+            Same as Client.iter_search, the reports are iterated with async
+            for:
+
+                async for report in client.iter_search(q, start=start):
+                    ...
+
+            :return: AsyncSearchStream
+        """
+        query, start, end = _iter_search_query(q, search_type, url_matching,
+                                               start, end, deep)
+        return AsyncSearchStream(self, query, start, end, shard_size,
+                                 min_shard_size, max_workers, page_size,
+                                 gzip, typed, direction)
+
+    async def reputation(self, q, gzip=None, typed=None):
+        return await self._query(_reputation_query(q), gzip, typed)
+    reputation.__doc__ = Client.reputation.__doc__
+
+    async def reputation_many(self, queries, max_workers=10, gzip=None,
+                              typed=None):
+        """
+            Looks up the reputation of several domains or IPs, at most
+            *max_workers* at the same time. See Client.reputation_many.
+        """
+        hosts = {}
+        for q in queries:
+            if q not in hosts:
+                hosts[q] = _normalize_host(q)
+        unique = list(set(host for host in hosts.values() if host))
+        semaphore = asyncio.Semaphore(max_workers)
+
+        async def fetch(host):
+            async with semaphore:
+                try:
+                    return await self.reputation(host, gzip, typed)
+                except Exception as e:
+                    return {'error': 'Unable to look up {}: {}'.format(host, e)}
+
+        results = dict(zip(unique, await asyncio.gather(
+            *[fetch(host) for host in unique])))
+        return dict((q, results[host] if host else
+                     {'error': 'Invalid reputation query: {!r}'.format(q)})
+                    for q, host in hosts.items())
+
+
+# Module-level coroutines, sharing the connection pool of a default client.
+
+_client = None
+
+
+def default_client():
+    """
+        Returns the AsyncClient used by the module-level coroutines, creating
+        it on first use.
+    """
+    global _client
+    if _client is None:
+        _client = AsyncClient()
+    return _client
+
+
+async def urlfeed(feed='unfiltered', interval='hour', timestamp=None, **kwargs):
+    return await default_client().urlfeed(feed, interval, timestamp, **kwargs)
+urlfeed.__doc__ = Client.urlfeed.__doc__
+
+
+def iter_urlfeed(feed='unfiltered', interval='hour', timestamp=None,
+                 **kwargs):
+    return default_client().iter_urlfeed(feed, interval, timestamp, **kwargs)
+iter_urlfeed.__doc__ = AsyncClient.iter_urlfeed.__doc__
+
+
+async def submit(url, useragent=None, referer=None, priority='low',
+                 access_level='public', callback_url=None, submit_vt=False,
+                 save_only_alerted=False, **kwargs):
+    return await default_client().submit(url, useragent, referer, priority,
+                                         access_level, callback_url,
+                                         submit_vt, save_only_alerted,
+                                         **kwargs)
+submit.__doc__ = Client.submit.__doc__
+
+
+async def user_agent_list(**kwargs):
+    return await default_client().user_agent_list(**kwargs)
+user_agent_list.__doc__ = Client.user_agent_list.__doc__
+
+
+async def mass_submit(urls, useragent=None, referer=None,
+                      access_level='public', priority='low',
+                      callback_url=None, **kwargs):
+    return await default_client().mass_submit(urls, useragent, referer,
+                                              access_level, priority,
+                                              callback_url, **kwargs)
+mass_submit.__doc__ = Client.mass_submit.__doc__
+
+
+async def queue_status(queue_id, **kwargs):
+    return await default_client().queue_status(queue_id, **kwargs)
+queue_status.__doc__ = Client.queue_status.__doc__
+
+
+async def report(report_id, recent_limit=0, include_details=False,
+                 include_screenshot=False, include_domain_graph=False,
+                 **kwargs):
+    return await default_client().report(report_id, recent_limit,
+                                         include_details, include_screenshot,
+                                         include_domain_graph, **kwargs)
+report.__doc__ = Client.report.__doc__
+
+
+async def report_many(report_ids, recent_limit=0, include_details=False,
+                      include_screenshot=False, include_domain_graph=False,
+                      max_workers=10, ordered=True, **kwargs):
+    return await default_client().report_many(report_ids, recent_limit,
+                                              include_details,
+                                              include_screenshot,
+                                              include_domain_graph,
+                                              max_workers, ordered, **kwargs)
+report_many.__doc__ = AsyncClient.report_many.__doc__
+
+
+async def report_list(timestamp=None, limit=50, **kwargs):
+    return await default_client().report_list(timestamp, limit, **kwargs)
+report_list.__doc__ = Client.report_list.__doc__
+
+
+async def search(q, search_type='string', result_type='reports',
+                 url_matching='url_host', date_from=None, deep=False,
+                 **kwargs):
+    return await default_client().search(q, search_type, result_type,
+                                         url_matching, date_from, deep,
+                                         **kwargs)
+search.__doc__ = Client.search.__doc__
+
+
+def iter_search(q, search_type='string', url_matching='url_host', start=None,
+                end=None, deep=False, **kwargs):
+    return default_client().iter_search(q, search_type, url_matching, start,
+                                        end, deep, **kwargs)
+iter_search.__doc__ = AsyncClient.iter_search.__doc__
+
+
+async def reputation(q, **kwargs):
+    return await default_client().reputation(q, **kwargs)
+reputation.__doc__ = Client.reputation.__doc__
+
+
+async def reputation_many(queries, max_workers=10, **kwargs):
+    return await default_client().reputation_many(queries, max_workers,
+                                                  **kwargs)
+reputation_many.__doc__ = Client.reputation_many.__doc__
@@ -1,15 +1,22 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
-try:
-    import simplejson as json
-except:
-    import json
-
-import requests
-from dateutil.parser import parse
-from datetime import datetime, timedelta
+import calendar
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import date, datetime
+import itertools
+import threading
 import time
+import zlib
+
+from . import cache, models
+from .codec import get_codec
+from .coalesce import SingleFlight, methods as _coalesced_methods
+from .metrics import error_details
+from .search import SearchStream
+from .stream import _iter_body, URLFeedStream
 try:
     from .api_key import key
 except:
@@ -17,163 +24,95 @@ except:
 
 base_url = 'https://uqapi.net/v3/json'
 gzip_default = False
+# Timeouts in seconds of the requests of the clients created without one,
+# per method, the 'default' entry applying to the others
+default_timeouts = {'default': 30, 'report': 60, 'mass_submit': 120,
+                    'urlfeed': 300}
 
-__feed_type = ['unfiltered', 'flagged']
-__intervals = ['hour', 'day']
-__priorities = ['urlfeed', 'low', 'medium', 'high']
-__search_types = ['string', 'regexp', 'ids_alert', 'urlquery_alert', 'js_script_hash']
-__result_types = ['reports', 'url_list']
-__url_matchings = ['url_host', 'url_path']
-__access_levels = ['public', 'nonpublic', 'private']
 
+# Fields added to every query, serialized once per client and API key
+_envelope_fields = ('key', 'gzip')
 
-def __set_default_values(gzip=False):
-    to_return = {}
-    to_return['key'] = key
-    if gzip_default or gzip:
-        to_return['gzip'] = True
-    return to_return
+# Names are single-underscored (instead of double) so they can be used
+# from within the Client class body without being mangled.
+_feed_type = ['unfiltered', 'flagged']
+_intervals = ['hour', 'day']
+_priorities = ['urlfeed', 'low', 'medium', 'high']
+_search_types = ['string', 'regexp', 'ids_alert', 'urlquery_alert', 'js_script_hash']
+_result_types = ['reports', 'url_list']
+_url_matchings = ['url_host', 'url_path']
+_access_levels = ['public', 'nonpublic', 'private']
 
 
-def __query(query, gzip=False):
-    if query.get('error') is not None:
-        return query
-    query.update(__set_default_values(gzip))
-    r = requests.post(base_url, data=json.dumps(query))
-    return r.json()
-
-
-def urlfeed(feed='unfiltered', interval='hour', timestamp=None):
+def _to_timestamp(value):
     """
-        The urlfeed function is used to access the main feed of URL from
-        the service. Currently there are two distinct feed:
-
+        Converts a time to a Unix timestamp. Accepts:
 
-            :param feed: Currently there are two distinct feed:
-
-                * *unfiltered*: contains all URL received by the service, as
-                    with other API calls some restrictions to the feed might
-                    apply depending. (default)
-                * *flagged*: contains URLs flagged by some detection by
-                    urlquery, it will not contain data triggered by IDS
-                    alerts as that not possible to correlate correctly to a
-                    given URL. Access to this is currently restricted.
-
-            :param interval: Sets the size of time window.
-                    * *hour*: splits the day into 24 slices which each
-                        goes from 00-59 of every hour,
-                        for example: 10:00-10:59 (default)
-                    * *day*: will return all URLs from a given date
-
-            :param timestamp: This selects which slice to return.
-                              Any timestamp within a given interval/time
-                              slice can be used to return URLs from that
-                              timeframe. (default: now)
-
-
-            :return: URLFEED
-
-                {
-                    "start_time"    : string,
-                    "end_time"      : string,
-                    "feed"          : [URLs]    Array of URL objects (see README)
-                }
+            * an int or a float, returned as is
+            * a datetime (a naive one is in local time) or a date
+            * an ISO 8601 string, or any string dateutil can parse
 
+        Raises ValueError (or TypeError) if it cannot be converted.
     """
+    if isinstance(value, bool):
+        raise TypeError('Not a time: {!r}'.format(value))
+    if isinstance(value, (int, float)):
+        return value
+    if not isinstance(value, (datetime, date)):
+        value = str(value).strip()
+        try:
+            return float(value)
+        except ValueError:
+            pass
+        try:
+            value = datetime.fromisoformat(value)
+        except (AttributeError, ValueError):
+            # Free-form string: python-dateutil is only needed here
+            from dateutil.parser import parse
+            value = parse(value)
+    if not isinstance(value, datetime):
+        return time.mktime(value.timetuple())
+    if value.tzinfo is None or value.utcoffset() is None:
+        return time.mktime(value.timetuple()) + value.microsecond / 1e6
+    return calendar.timegm(value.utctimetuple()) + value.microsecond / 1e6
+
+
+# Query builders: validate the parameters and return the JSON query to POST.
+# They are shared by the Client class and the module-level functions.
+
+def _urlfeed_query(feed='unfiltered', interval='hour', timestamp=None):
     query = {'method': 'urlfeed'}
-    if feed not in __feed_type:
-        query.update({'error': 'Feed can only be in ' + ', '.join(__feed_type)})
-    if interval not in __intervals:
-        query.update({'error': 'Interval can only be in ' + ', '.join(__intervals)})
+    if feed not in _feed_type:
+        query.update({'error': 'Feed can only be in ' + ', '.join(_feed_type)})
+    if interval not in _intervals:
+        query.update({'error': 'Interval can only be in ' + ', '.join(_intervals)})
     if timestamp is None:
-        ts = datetime.now()
+        # Whole seconds, like before: identical default queries made at
+        # the same time share their cache and single-flight keys
+        timestamp = int(time.time())
         if interval == 'hour':
-            ts = ts - timedelta(hours=1)
+            timestamp -= 3600
         if interval == 'day':
-            ts = ts - timedelta(days=1)
-        timestamp = time.mktime(ts.utctimetuple())
+            timestamp -= 24 * 3600
     else:
         try:
-            timestamp = time.mktime(parse(timestamp).utctimetuple())
+            timestamp = _to_timestamp(timestamp)
         except:
-            query.update({'error': 'Unable to convert time to timestamp: ' + str(time)})
+            query.update({'error': 'Unable to convert time to timestamp: ' + str(timestamp)})
     query['feed'] = feed
     query['interval'] = interval
     query['timestamp'] = timestamp
-    return __query(query)
-
-
-def submit(url, useragent=None, referer=None, priority='low',
-           access_level='public', callback_url=None, submit_vt=False,
-           save_only_alerted=False):
-    """
-        Submits an URL for analysis.
-
-        :param url: URL to submit for analysis
-
-        :param useragent: See user_agent_list API function. Setting an
-            invalid UserAgent will result in a random UserAgent getting
-            selected.
+    return query
 
-        :param referer: Referer to be applied to the first visiting URL
 
-        :param priority: Set a priority on the submission.
-            * *urlfeed*: URL might take several hour before completing.
-                Used for big unfiltered feeds. Some filtering applies
-                before accepting to queue so a submitted URL might not
-                be tested.
-            * *low*: For vetted or filtered feeds (default)
-            * *medium*: Normal submissions
-            * *high*: To ensure highest priority.
-
-        :param access_level: Set accessibility of the report
-            * *public*: URL is publicly available on the site (default)
-            * *nonpublic*: Shared with other security organizations/researchers.
-            * *private*: Only submitting key has access.
-
-        :param callback_url: Results are POSTed back to the provided
-            URL when processing has completed. The results will be
-            originating from uqapi.net. Requires an API key.
-
-        :param submit_vt: Submits any unknown file toVirusTotal for
-            analysis. Information from VirusTotal will be included the
-            report as soon as they have finished processing the sample.
-            Most likely will the report from urlquery be available
-            before the data is received back from VirusTotal.
-            Default: false
-
-            Only executables, zip archives and pdf documents are
-            currently submitted.
-
-            .. note:: Not fully implemented yet.
-
-        :param save_only_alerted: Only reports which contains alerts
-            (IDS, UQ alerts, Blacklists etc.) are kept. The main purpose
-            for this flag is for mass testing URLs which has not been
-            properly vetted so only URLs of interest are kept.
-            Default: false
-
-            Combining this with a callback URL will result in only those
-            that has alerts on them beingPOSTed back to the callback URL.
-
-        :return: QUEUE_STATUS
-
-            {
-                "status"     : string,  ("queued", "processing", "done")
-                "queue_id"   : string,
-                "report_id"  : string,   Included once "status" = "done"
-                "priority"   : string,
-                "url"        : URL object,      See README
-                "settings"   : SETTINGS object  See README
-            }
-
-
-    """
+def _submit_query(url, useragent=None, referer=None, priority='low',
+                  access_level='public', callback_url=None, submit_vt=False,
+                  save_only_alerted=False):
     query = {'method': 'submit'}
-    if priority not in __priorities:
-        query.update({'error': 'priority must be in ' + ', '.join(__priorities)})
-    if access_level not in __access_levels:
-        query.update({'error': 'assess_level must be in ' + ', '.join(__access_levels)})
+    if priority not in _priorities:
+        query.update({'error': 'priority must be in ' + ', '.join(_priorities)})
+    if access_level not in _access_levels:
+        query.update({'error': 'assess_level must be in ' + ', '.join(_access_levels)})
     query['url'] = url
     if useragent is not None:
         query['useragent'] = useragent
@@ -187,36 +126,21 @@ def submit(url, useragent=None, referer=None, priority='low',
         query['submit_vt'] = True
     if save_only_alerted:
         query['save_only_alerted'] = True
-    return __query(query)
+    return query
 
 
-def user_agent_list():
-    """
-        Returns a list of accepted user agent strings. These might
-        change over time, select one from the returned list.
-
-        :return: A list of accepted user agents
-    """
-    query = {'method': 'user_agent_list'}
-    return __query(query)
+def _user_agent_list_query():
+    return {'method': 'user_agent_list'}
 
 
-def mass_submit(urls, useragent=None, referer=None,
-                access_level='public', priority='low', callback_url=None):
-    """
-        See submit for details. All URLs will be queued with the same settings.
-
-        :return:
-
-            {
-                [QUEUE_STATUS]  Array of QUEUE_STATUS objects, See submit
-            }
-    """
+def _mass_submit_query(urls, useragent=None, referer=None,
+                       access_level='public', priority='low',
+                       callback_url=None):
     query = {'method': 'mass_submit'}
-    if access_level not in __access_levels:
-        query.update({'error': 'assess_level must be in ' + ', '.join(__access_levels)})
-    if priority not in __priorities:
-        query.update({'error': 'priority must be in ' + ', '.join(__priorities)})
+    if access_level not in _access_levels:
+        query.update({'error': 'assess_level must be in ' + ', '.join(_access_levels)})
+    if priority not in _priorities:
+        query.update({'error': 'priority must be in ' + ', '.join(_priorities)})
     if useragent is not None:
         query['useragent'] = useragent
     if referer is not None:
@@ -225,66 +149,18 @@ def mass_submit(urls, useragent=None, referer=None,
     query['priority'] = priority
     if callback_url is not None:
         query['callback_url'] = callback_url
-    return __query(query)
-
-
-def queue_status(queue_id):
-    """
-        Polls the current status of a queued URL. Normal processing time
-        for a URL is about 1 minute.
+    query['urls'] = list(urls)
+    return query
 
-        :param queue_id: QueueIDis returned by the submit API calls
 
-        :return: QUEUE_STATUS (See submit)
-    """
+def _queue_status_query(queue_id):
     query = {'method': 'queue_status'}
     query['queue_id'] = queue_id
-    return __query(query)
-
-
-def report(report_id, recent_limit=0, include_details=False,
-           include_screenshot=False, include_domain_graph=False):
-    """
-        This extracts data for a given report, the amount of data and
-        what is included is dependent on the parameters set and the
-        permissions of the API key.
-
-        :param report_id: ID of the report. To get a valid report_id
-            either use search to look for specificreports or report_list
-            to get a list of recently finished reports.
-            Can be string or an integer
+    return query
 
-        :param recent_limit: Number of recent reports to include.
-            Only applies when include_details is true.
-            Integer, default: 0
 
-        :param include_details: Includes details in the report, like the
-            alert information, Javascript and transaction data.
-            Default: False
-
-        :param include_screenshot: A screenshot is included in the report
-            as a base64. The mime type of the image is also included.
-            Default: False
-
-        :param include_domain_graph: A domain graph is included in the
-            report as a base64. The mime type of the image is also included.
-            Default: False
-
-
-        :return: BASICREPORT
-
-            {
-                "report_id": string,
-                "date"     : string,    Date formatted string
-                "url"      : URL,       URL object      - See README
-                "settings" : SETTINGS,  SETTINGS object - See README
-                "urlquery_alert_count"  : int,  Total UQ alerts
-                "ids_alert_count"       : int,  Total IDS alert
-                "blacklist_alert_count" : int,  Total Blacklist alerts
-                "screenshot"    : BINBLOB,      BINBLOB object - See README
-                "domain_graph"  : BINBLOB       BINBLOB object - See README
-            }
-    """
+def _report_query(report_id, recent_limit=0, include_details=False,
+                  include_screenshot=False, include_domain_graph=False):
     query = {'method': 'report'}
     query['report_id'] = report_id
     if recent_limit is not None:
@@ -295,104 +171,41 @@ def report(report_id, recent_limit=0, include_details=False,
         query['include_screenshot'] = True
     if include_domain_graph:
         query['include_domain_graph'] = True
-    return __query(query)
-
-
-def report_list(timestamp=None, limit=50):
-    """
-    Returns a list of reports created from the given timestamp, if it’s
-    not included the most recent reports will be returned.
+    return query
 
-    Used to get a list of reports from given timestamp, along with basic
-    information about the report like number of alerts and the
-    submitted URL.
 
-    To get reports which are nonpublic or private a API key is needed
-    which has access to these.
-
-    :param timestamp: Unix Epoch timestamp from the starting point to get
-        reports.
-        Default: If None, setted to datetime.now()
-
-    :param limit: Number of reports in the list
-        Default: 50
-
-    :return:
-
-        {
-            "reports": [BASICREPORTS]   List of BASICREPORTS - See report
-        }
-
-    """
+def _report_list_query(timestamp=None, limit=50):
     query = {'method': 'report_list'}
     if timestamp is None:
-        ts = datetime.now()
-        timestamp = time.mktime(ts.utctimetuple())
+        timestamp = int(time.time())
     else:
         try:
-            timestamp = time.mktime(parse(timestamp).utctimetuple())
+            timestamp = _to_timestamp(timestamp)
         except:
-            query.update({'error': 'Unable to convert time to timestamp: ' + str(time)})
+            query.update({'error': 'Unable to convert time to timestamp: ' + str(timestamp)})
     query['timestamp'] = timestamp
     query['limit'] = limit
-    return __query(query)
-
-
-def search(q, search_type='string', result_type='reports',
-           url_matching='url_host', date_from=None, deep=False):
-    """
-        Search in the database
-
-        :param q: Search query
-
-        :param search_type: Search type
-            * *string*: Used to find URLs which contains a given string.
-                To search for URLs on a specific IP use string. If a
-                string is found to match an IP address it will automaticly
-                search based on the IP. (default)
-            * *regexp*: Search for a regexp pattern within URLs
-            * *ids_alert*: Search for specific IDS alerts
-            * *urlquery_alert*: ????? FIXME ?????
-            * *js_script_hash*: Used to search for URLs/reports which
-                contains a specific JavaScript. The scripts are searched
-                based on SHA256, the hash value for each script are
-                included in the report details. Can be used to find other
-
-        :param result_type: Result type
-            * *reports*: Full reports (default)
-            * *url_list*: List of urls
-
-        :param url_matching: What part of an URL to do pattern matching
-            against. Only applies to string and regexp searches.
-            * *url_host*: match against host (default)
-            * *url_path*: match against path
-
-
-        :param date_from: Unix epoch timestamp for starting searching point.
-            Default: If None, setted to datetime.now()
+    return query
 
 
-        :param deep: Search all URLs, not just submitted URLs.
-            Default: false
-            Experimental! Should be used with care as it’s very resource
-            intensive.
-    """
+def _search_query(q, search_type='string', result_type='reports',
+                  url_matching='url_host', date_from=None, deep=False):
     query = {'method': 'search'}
-    if search_type not in __search_types:
-        query.update({'error': 'search_type can only be in ' + ', '.join(__search_types)})
-    if result_type not in __result_types:
-        query.update({'error': 'result_type can only be in ' + ', '.join(__result_types)})
-    if url_matching not in __url_matchings:
-        query.update({'error': 'url_matching can only be in ' + ', '.join(__url_matchings)})
-
+    if search_type not in _search_types:
+        query.update({'error': 'search_type can only be in ' + ', '.join(_search_types)})
+    if result_type not in _result_types:
+        query.update({'error': 'result_type can only be in ' + ', '.join(_result_types)})
+    if url_matching not in _url_matchings:
+        query.update({'error': 'url_matching can only be in ' + ', '.join(_url_matchings)})
+
+    timestamp = None
     if date_from is None:
-        ts = datetime.now()
-        timestamp = time.mktime(ts.utctimetuple())
+        timestamp = int(time.time())
     else:
         try:
-            timestamp = time.mktime(parse(date_from).utctimetuple())
+            timestamp = _to_timestamp(date_from)
         except:
-            query.update({'error': 'Unable to convert time to timestamp: ' + str(time)})
+            query.update({'error': 'Unable to convert time to timestamp: ' + str(date_from)})
 
     query['q'] = q
     query['search_type'] = search_type
@@ -401,20 +214,998 @@ def search(q, search_type='string', result_type='reports',
     query['from'] = timestamp
     if deep:
         query['deep'] = True
-    return __query(query)
+    return query
+
+
+def _iter_search_query(q, search_type='string', url_matching='url_host',
+                       start=None, end=None, deep=False):
+    query = _search_query(q, search_type, 'reports', url_matching, None, deep)
+    try:
+        end = time.time() if end is None else _to_timestamp(end)
+        start = end - 24 * 3600 if start is None else _to_timestamp(start)
+    except:
+        query.update({'error': 'Unable to convert time to timestamp: {} - {}'.format(start, end)})
+    return query, start, end
+
+
+def _reputation_query(q):
+    query = {'method': 'reputation'}
+    query['q'] = q
+    return query
+
+
+def _normalize_host(q):
+    """
+        Returns the domain or IP of a reputation query, lowercased and
+        without scheme, credentials, path, port or trailing dot (None if
+        nothing is left).
+    """
+    try:
+        q = q.strip()
+    except AttributeError:
+        return None
+    if '://' in q:
+        q = q.split('://', 1)[1]
+    q = q.split('/', 1)[0].rsplit('@', 1)[-1]
+    if q.startswith('['):
+        q = q[1:].split(']', 1)[0]
+    elif q.count(':') == 1:
+        q = q.split(':', 1)[0]
+    return q.lower().rstrip('.') or None
+
+
+def _chunks(iterable, size):
+    """
+        Splits an iterable in lists of *size* elements, yielding the offset
+        of each list along with it.
+    """
+    iterator = iter(iterable)
+    start = 0
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield start, chunk
+        start += len(chunk)
+
+
+def _queue_status_list(response):
+    if isinstance(response, list):
+        return response
+    if isinstance(response, dict):
+        for name, value in response.items():
+            if name != '_response_' and isinstance(value, list):
+                return value
+    return None
+
 
+ChunkFailure = namedtuple('ChunkFailure', ['start', 'urls', 'response'])
 
-def reputation(q):
+
+class MassSubmitResult(list):
     """
-        Searches a reputation list of URLs detected over the last month.
-        The search query can be a domain or an IP.
+        List of the QUEUE_STATUS of a mass_submit, in the order of the
+        submitted URLs.
 
-        With an API key, matching URLs will be returned along with the
-        triggering alert.
+        The URLs of a chunk which could not be submitted have None as
+        QUEUE_STATUS. The chunk is listed in *failures* as a ChunkFailure
+        (start, urls, response), response being the error the API returned,
+        or {'error': message} if the request failed.
+    """
 
-        :param q: Search query
+    def __init__(self, submit_chunk):
+        list.__init__(self)
+        self.failures = []
+        self._submit_chunk = submit_chunk
+
+    def _add(self, start, urls, response):
+        end = start + len(urls)
+        if len(self) < end:
+            self.extend([None] * (end - len(self)))
+        statuses = _queue_status_list(response)
+        if cache._is_error(response) or statuses is None \
+                or len(statuses) != len(urls):
+            self.failures.append(ChunkFailure(start, urls, response))
+        else:
+            self[start:end] = statuses
+
+    def retry(self, max_workers=4):
+        """
+            Submits again the chunks which failed, and updates the result.
+
+            :return: The result itself
+        """
+        failures, self.failures = self.failures, []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            responses = executor.map(self._submit_chunk,
+                                     [failure.urls for failure in failures])
+            for failure, response in zip(failures, responses):
+                self._add(failure.start, failure.urls, response)
+        return self
+
+
+class _Exchange(object):
+    """
+        A request sent by Client._exchange, and what was read of its
+        response.
     """
 
-    query = {'method': 'reputation'}
-    query['q'] = q
-    return __query(query)
+    __slots__ = ('r', 'response', 'received', 'response_bytes')
+
+    def __init__(self):
+        self.r = None
+        self.response = None
+        self.received = None
+        self.response_bytes = None
+
+
+def _gzip_compress(data):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+class Client(object):
+    """
+        Client to the urlquery API.
+
+        Each client owns a pooled, keep-alive HTTP session, so consecutive
+        calls reuse the same connections instead of doing a new TCP/TLS
+        handshake every time. A client only uses its own key and endpoint
+        and can be shared between threads.
+
+        :param key: API key. Default: the module-level *key*
+
+        :param base_url: URL of the API.
+            Default: the module-level *base_url*
+
+        :param gzip: Use gzip for the responses, and for the requests bigger
+            than *compress_threshold*. Every API method also takes a *gzip*
+            argument overriding this setting for a single call.
+            Default: the module-level *gzip_default*
+
+        :param pool_size: Maximum number of connections kept alive in the
+            pool. Set it to at least the number of threads using the client.
+            Default: 10
+
+        :param timeout: Timeout in seconds of a request, either a number or
+            a (connect, read) tuple, passed as is to requests, or a dict of
+            them per method (the 'default' entry applying to the others,
+            None to wait forever). Default: the module-level
+            *default_timeouts*
+
+        :param session: A requests.Session to use instead of creating one.
+
+        :param compress_threshold: Size in bytes from which the body of a
+            gzip'ed request is compressed (None to never compress it).
+            Default: 16384
+
+        :param cache: A cache from urlquery.cache (LRUCache, SQLiteCache)
+            for the responses of report, user_agent_list and reputation.
+            Default: None
+
+        :param rate_limiter: A urlquery.ratelimit.RateLimiter, shared with
+            the other clients using the same key. Default: None
+
+        :param coalesce: Concurrent identical calls to the read-only methods
+            (report, report_list, search, reputation, user_agent_list) share
+            one request and its response. Default: True
+
+        :param typed: Return the typed objects of urlquery.models (URL,
+            Report, QueueStatus...) instead of dicts. Every API method also
+            takes a *typed* argument overriding this setting for a single
+            call. Default: False
+
+        :param metrics: A urlquery.metrics.Metrics recording the calls,
+            latencies, sizes and errors per method. Default: None
+
+        :param archive: A urlquery.archive.ReportArchive storing every
+            report received. Default: None
+
+        :param local_first: Methods answered from the archive when it
+            can, among report, search and reputation. Default: ('report',)
+
+        :param codec: JSON codec of the requests and responses: a name
+            (orjson, simplejson, json), a urlquery.codec.Codec, or an
+            object with dumps and loads functions. Default: None (the
+            fastest available)
+
+        :param circuit_breaker: A urlquery.resilience.CircuitBreaker
+            failing fast while the API is failing. Default: None
+
+        :param hedging: A urlquery.resilience.Hedging sending a second copy
+            of the slow read requests. Default: None
+    """
+
+    def __init__(self, key=None, base_url=None, gzip=None, pool_size=10,
+                 timeout=None, session=None, compress_threshold=16384,
+                 cache=None, rate_limiter=None, coalesce=True,
+                 typed=False, metrics=None, archive=None,
+                 local_first=('report',), codec=None, circuit_breaker=None,
+                 hedging=None):
+        self.key = key
+        self.base_url = base_url
+        self.gzip = gzip
+        self.compress_threshold = compress_threshold
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self._in_flight = SingleFlight() if coalesce else None
+        self.typed = typed
+        self.metrics = metrics
+        self.archive = archive
+        self.local_first = local_first
+        self.codec = get_codec(codec)
+        self._envelopes = {}
+        self.circuit_breaker = circuit_breaker
+        self.hedging = hedging
+        self.pool_size = pool_size
+        self.timeout = timeout
+        if session is None:
+            # Imported here, it is the slowest part of importing urlquery
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size,
+                                  pool_maxsize=pool_size)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        self.session = session
+
+    def close(self):
+        """
+            Closes all the connections of the pool.
+        """
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _api_key(self):
+        return self.key if self.key is not None else key
+
+    def _timeout_for(self, method):
+        timeout = self.timeout if self.timeout is not None \
+            else default_timeouts
+        if not isinstance(timeout, dict):
+            return timeout
+        if method in timeout:
+            return timeout[method]
+        if 'default' in timeout:
+            return timeout['default']
+        return default_timeouts.get(method, default_timeouts.get('default'))
+
+    def _default_values(self, gzip=None):
+        to_return = {}
+        to_return['key'] = self._api_key()
+        if gzip is None:
+            gzip = self.gzip if self.gzip is not None else gzip_default
+        if gzip:
+            to_return['gzip'] = True
+        return to_return
+
+    def _serialize(self, query, gzip=None):
+        """
+            Adds the key and gzip fields to *query* and returns it
+            serialized. These fields are the same for all the requests:
+            they are serialized once and appended to the rest of the query.
+        """
+        values = self._default_values(gzip)
+        codec = self.codec
+        if not codec.envelope:
+            query.update(values)
+            return codec.dumps(query)
+        if 'key' in query or 'gzip' in query:
+            # Sent before
+            for name in _envelope_fields:
+                query.pop(name, None)
+        data = codec.dumps(query)
+        query.update(values)
+        envelope_key = (values['key'], 'gzip' in values)
+        envelope = self._envelopes.get(envelope_key)
+        if envelope is None:
+            envelope = codec.dumps(values)[1:-1]
+            self._envelopes[envelope_key] = envelope
+        if len(data) == 2:
+            return b'{' + envelope + b'}'
+        return b''.join((data[:-1], b',', envelope, b'}'))
+
+    def _post(self, query, gzip=None, event=None):
+        """
+            POSTs the query and returns the streamed response, to be used
+            as a context manager. The serialization time and the size of
+            the request are stored in the metrics *event*, if given.
+        """
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(self._api_key(), query['method'])
+        url = self.base_url if self.base_url is not None else base_url
+        start = time.time()
+        data = self._serialize(query, gzip)
+        headers = {}
+        if query.get('gzip') and self.compress_threshold is not None \
+                and len(data) >= self.compress_threshold:
+            data = _gzip_compress(data)
+            headers['Content-Encoding'] = 'gzip'
+        if event is not None:
+            event['_sent'] = time.time()
+            event['serialize'] = event['_sent'] - start
+            event['request_bytes'] = len(data)
+        return self.session.post(url, data=data, headers=headers,
+                                 timeout=self._timeout_for(query['method']),
+                                 stream=True)
+
+    def _query(self, query, gzip=None, typed=None):
+        if query.get('error') is not None:
+            return query
+        if self.metrics is not None:
+            self.metrics.call(query['method'])
+        if self._in_flight is not None and \
+                query['method'] in _coalesced_methods:
+            response = self._in_flight.do(
+                cache.make_key(query, self._api_key()),
+                lambda: self._fetch(query, gzip))
+        else:
+            response = self._fetch(query, gzip)
+        if typed or (typed is None and self.typed):
+            return models.wrap(query['method'], response)
+        return response
+
+    def _fetch(self, query, gzip=None):
+        if self.archive is not None and query['method'] in self.local_first:
+            response = self.archive.answer(query)
+            if response is not None:
+                return response
+        if self.cache is not None and query['method'] in self.cache.ttl:
+            api_key = self._api_key()
+            response = cache.lookup(self.cache, query, api_key)
+            if response is not None:
+                return response
+            response = self._request(query, gzip)
+            cache.store(self.cache, query, api_key, response)
+        else:
+            response = self._request(query, gzip)
+        if self.archive is not None:
+            self.archive.store(query, response)
+        return response
+
+    def _request(self, query, gzip=None):
+        if self.hedging is not None and query['method'] in self.hedging.methods:
+            return self.hedging.call(self._send, query, gzip)
+        return self._send(query, gzip)
+
+    def _send(self, query, gzip=None):
+        if self.rate_limiter is None and self.metrics is None and \
+                self.circuit_breaker is None and self.hedging is None:
+            with self._post(query, gzip) as r:
+                body = b''.join(_iter_body(r))
+            return self.codec.loads(body)
+        with self._exchange(query, gzip) as exchange:
+            body = b''.join(_iter_body(exchange.r))
+            exchange.received = time.time()
+            exchange.response_bytes = exchange.r.raw.tell() or len(body)
+            exchange.response = self.codec.loads(body)
+        return exchange.response
+
+    @contextmanager
+    def _exchange(self, query, gzip=None):
+        """
+            POSTs the query like _post, through the circuit breaker, the
+            rate limiter and the metrics, and yields an _Exchange. The
+            caller reads its *r* and sets its *response*, and *received*
+            and *response_bytes* once the body is read: the body can be
+            decoded at once or streamed.
+        """
+        limiter = self.rate_limiter
+        metrics = self.metrics
+        breaker = self.circuit_breaker
+        hedging = self.hedging
+        if breaker is not None:
+            breaker.before()
+        # Also gives the time the request was sent, once the rate limiter
+        # let it go, to the latencies of the hedging
+        event = {'method': query['method']} \
+            if metrics is not None or hedging is not None else None
+        exchange = _Exchange()
+        status_code = exception = None
+        start = time.time()
+        try:
+            with self._post(query, gzip, event) as r:
+                status_code = r.status_code
+                exchange.r = r
+                yield exchange
+            if event is not None and exchange.received is not None:
+                event['network'] = exchange.received - event['_sent']
+                event['decode'] = time.time() - exchange.received
+                event['response_bytes'] = exchange.response_bytes
+                if hedging is not None:
+                    hedging.observe(query['method'],
+                                    exchange.received - event['_sent'])
+        except Exception as e:
+            exception = e
+            raise
+        finally:
+            response = exchange.response
+            if breaker is not None:
+                breaker.after(status_code, exception)
+            if limiter is not None:
+                limiter.feedback(self._api_key(), query['method'],
+                                 status_code, response)
+            if metrics is not None:
+                event.pop('_sent', None)
+                event['total'] = time.time() - start
+                event['status_code'] = status_code
+                event['error'], event['error_message'] = error_details(
+                    status_code, response, exception)
+                metrics.record(event)
+
+    def urlfeed(self, feed='unfiltered', interval='hour', timestamp=None,
+                gzip=None, typed=None):
+        """
+            The urlfeed function is used to access the main feed of URL from
+            the service. Currently there are two distinct feed:
+
+
+                :param feed: Currently there are two distinct feed:
+
+                    * *unfiltered*: contains all URL received by the service, as
+                        with other API calls some restrictions to the feed might
+                        apply depending. (default)
+                    * *flagged*: contains URLs flagged by some detection by
+                        urlquery, it will not contain data triggered by IDS
+                        alerts as that not possible to correlate correctly to a
+                        given URL. Access to this is currently restricted.
+
+                :param interval: Sets the size of time window.
+                        * *hour*: splits the day into 24 slices which each
+                            goes from 00-59 of every hour,
+                            for example: 10:00-10:59 (default)
+                        * *day*: will return all URLs from a given date
+
+                :param timestamp: This selects which slice to return.
+                                  Any timestamp within a given interval/time
+                                  slice can be used to return URLs from that
+                                  timeframe: a Unix timestamp, a datetime
+                                  or a date string. (default: now)
+
+
+                :return: URLFEED
+
+                    {
+                        "start_time"    : string,
+                        "end_time"      : string,
+                        "feed"          : [URLs]    Array of URL objects (see README)
+                    }
+
+        """
+        return self._query(_urlfeed_query(feed, interval, timestamp), gzip,
+                           typed)
+
+    def iter_urlfeed(self, feed='unfiltered', interval='hour', timestamp=None,
+                     gzip=None, typed=None):
+        """
+            Same as urlfeed, but the URL objects are parsed while the
+            response is downloaded and yielded one by one, so the memory
+            used does not depend on the size of the slice.
+
+            :return: URLFeedStream, an iterator of URL objects with the
+                *start_time*, *end_time* and *error* attributes, set once
+                they have been parsed.
+        """
+        return URLFeedStream(self, _urlfeed_query(feed, interval, timestamp),
+                             gzip, typed)
+
+    def submit(self, url, useragent=None, referer=None, priority='low',
+               access_level='public', callback_url=None, submit_vt=False,
+               save_only_alerted=False, gzip=None, typed=None):
+        """
+            Submits an URL for analysis.
+
+            :param url: URL to submit for analysis
+
+            :param useragent: See user_agent_list API function. Setting an
+                invalid UserAgent will result in a random UserAgent getting
+                selected.
+
+            :param referer: Referer to be applied to the first visiting URL
+
+            :param priority: Set a priority on the submission.
+                * *urlfeed*: URL might take several hour before completing.
+                    Used for big unfiltered feeds. Some filtering applies
+                    before accepting to queue so a submitted URL might not
+                    be tested.
+                * *low*: For vetted or filtered feeds (default)
+                * *medium*: Normal submissions
+                * *high*: To ensure highest priority.
+
+            :param access_level: Set accessibility of the report
+                * *public*: URL is publicly available on the site (default)
+                * *nonpublic*: Shared with other security organizations/researchers.
+                * *private*: Only submitting key has access.
+
+            :param callback_url: Results are POSTed back to the provided
+                URL when processing has completed. The results will be
+                originating from uqapi.net. Requires an API key.
+
+            :param submit_vt: Submits any unknown file toVirusTotal for
+                analysis. Information from VirusTotal will be included the
+                report as soon as they have finished processing the sample.
+                Most likely will the report from urlquery be available
+                before the data is received back from VirusTotal.
+                Default: false
+
+                Only executables, zip archives and pdf documents are
+                currently submitted.
+
+                .. note:: Not fully implemented yet.
+
+            :param save_only_alerted: Only reports which contains alerts
+                (IDS, UQ alerts, Blacklists etc.) are kept. The main purpose
+                for this flag is for mass testing URLs which has not been
+                properly vetted so only URLs of interest are kept.
+                Default: false
+
+                Combining this with a callback URL will result in only those
+                that has alerts on them beingPOSTed back to the callback URL.
+
+            :return: QUEUE_STATUS
+
+                {
+                    "status"     : string,  ("queued", "processing", "done")
+                    "queue_id"   : string,
+                    "report_id"  : string,   Included once "status" = "done"
+                    "priority"   : string,
+                    "url"        : URL object,      See README
+                    "settings"   : SETTINGS object  See README
+                }
+
+
+        """
+        return self._query(_submit_query(url, useragent, referer, priority,
+                                         access_level, callback_url,
+                                         submit_vt, save_only_alerted),
+                           gzip, typed)
+
+    def user_agent_list(self, gzip=None, typed=None):
+        """
+            Returns a list of accepted user agent strings. These might
+            change over time, select one from the returned list.
+
+            :return: A list of accepted user agents
+        """
+        return self._query(_user_agent_list_query(), gzip, typed)
+
+    def mass_submit(self, urls, useragent=None, referer=None,
+                    access_level='public', priority='low', callback_url=None,
+                    gzip=None, typed=None, chunk_size=100, max_workers=4):
+        """
+            See submit for details. All URLs will be queued with the same settings.
+
+            The URLs are sent in chunks of *chunk_size*, *max_workers* chunks
+            at a time. A chunk failing does not stop the others, see
+            MassSubmitResult.
+
+            :param urls: Any iterable of URLs, consumed chunk by chunk
+
+            :param chunk_size: Number of URLs per request. Default: 100
+
+            :param max_workers: Number of chunks sent at the same time.
+                Default: 4
+
+            :return: MassSubmitResult
+
+                [QUEUE_STATUS]  List of QUEUE_STATUS objects, See submit
+        """
+        query = _mass_submit_query((), useragent, referer, access_level,
+                                   priority, callback_url)
+        if query.get('error') is not None:
+            return query
+
+        def submit_chunk(chunk):
+            try:
+                return self._query(dict(query, urls=chunk), gzip, typed)
+            except Exception as e:
+                return {'error': 'Unable to submit chunk: {}'.format(e)}
+
+        result = MassSubmitResult(submit_chunk)
+        in_flight = deque()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for start, chunk in _chunks(urls, chunk_size):
+                in_flight.append((start, chunk,
+                                  executor.submit(submit_chunk, chunk)))
+                # Do not read the whole iterable in advance
+                if len(in_flight) >= 2 * max_workers:
+                    start, chunk, future = in_flight.popleft()
+                    result._add(start, chunk, future.result())
+            for start, chunk, future in in_flight:
+                result._add(start, chunk, future.result())
+        return result
+
+    def queue_status(self, queue_id, gzip=None, typed=None):
+        """
+            Polls the current status of a queued URL. Normal processing time
+            for a URL is about 1 minute.
+
+            :param queue_id: QueueIDis returned by the submit API calls
+
+            :return: QUEUE_STATUS (See submit)
+        """
+        return self._query(_queue_status_query(queue_id), gzip, typed)
+
+    def report(self, report_id, recent_limit=0, include_details=False,
+               include_screenshot=False, include_domain_graph=False,
+               gzip=None, typed=None):
+        """
+            This extracts data for a given report, the amount of data and
+            what is included is dependent on the parameters set and the
+            permissions of the API key.
+
+            :param report_id: ID of the report. To get a valid report_id
+                either use search to look for specificreports or report_list
+                to get a list of recently finished reports.
+                Can be string or an integer
+
+            :param recent_limit: Number of recent reports to include.
+                Only applies when include_details is true.
+                Integer, default: 0
+
+            :param include_details: Includes details in the report, like the
+                alert information, Javascript and transaction data.
+                Default: False
+
+            :param include_screenshot: A screenshot is included in the report
+                as a base64. The mime type of the image is also included.
+                Default: False
+
+            :param include_domain_graph: A domain graph is included in the
+                report as a base64. The mime type of the image is also included.
+                Default: False
+
+
+            :return: BASICREPORT
+
+                {
+                    "report_id": string,
+                    "date"     : string,    Date formatted string
+                    "url"      : URL,       URL object      - See README
+                    "settings" : SETTINGS,  SETTINGS object - See README
+                    "urlquery_alert_count"  : int,  Total UQ alerts
+                    "ids_alert_count"       : int,  Total IDS alert
+                    "blacklist_alert_count" : int,  Total Blacklist alerts
+                    "screenshot"    : BINBLOB,      BINBLOB object - See README
+                    "domain_graph"  : BINBLOB       BINBLOB object - See README
+                }
+        """
+        return self._query(_report_query(report_id, recent_limit,
+                                         include_details, include_screenshot,
+                                         include_domain_graph), gzip, typed)
+
+    def report_many(self, report_ids, recent_limit=0, include_details=False,
+                    include_screenshot=False, include_domain_graph=False,
+                    max_workers=10, ordered=True, gzip=None, typed=None):
+        """
+            Fetches several reports concurrently. See report for the
+            parameters, they apply to all the reports.
+
+            The reports are fetched by at most *max_workers* threads sharing
+            the connection pool of the client, so *pool_size* should be at
+            least *max_workers*. A failing report does not stop the others:
+            if the request raises, its result is {'error': message}, in the
+            same way as an invalid query.
+
+            :param report_ids: Iterable of report IDs
+
+            :param max_workers: Maximum number of reports fetched at the
+                same time. Default: 10
+
+            :param ordered: If True, returns the list of results in the
+                order of *report_ids*. If False, returns an iterator of
+                (report_id, result) tuples in completion order.
+                Default: True
+
+            :return: [BASICREPORT] or iterator of (report_id, BASICREPORT)
+        """
+        report_ids = list(report_ids)
+
+        def fetch(report_id):
+            try:
+                return self.report(report_id, recent_limit, include_details,
+                                   include_screenshot, include_domain_graph,
+                                   gzip, typed)
+            except Exception as e:
+                return {'error': 'Unable to fetch report {}: {}'.format(report_id, e)}
+
+        if ordered:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                return list(executor.map(fetch, report_ids))
+        return self._iter_completed(fetch, report_ids, max_workers)
+
+    @staticmethod
+    def _iter_completed(fetch, items, max_workers):
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        futures = dict((executor.submit(fetch, item), item) for item in items)
+        try:
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+        finally:
+            # The consumer may stop early: do not fetch the rest
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def report_list(self, timestamp=None, limit=50, gzip=None, typed=None):
+        """
+        Returns a list of reports created from the given timestamp, if it’s
+        not included the most recent reports will be returned.
+
+        Used to get a list of reports from given timestamp, along with basic
+        information about the report like number of alerts and the
+        submitted URL.
+
+        To get reports which are nonpublic or private a API key is needed
+        which has access to these.
+
+        :param timestamp: Unix Epoch timestamp from the starting point to get
+            reports. A datetime or a date string are converted.
+            Default: If None, setted to datetime.now()
+
+        :param limit: Number of reports in the list
+            Default: 50
+
+        :return:
+
+            {
+                "reports": [BASICREPORTS]   List of BASICREPORTS - See report
+            }
+
+        """
+        return self._query(_report_list_query(timestamp, limit), gzip, typed)
+
+    def search(self, q, search_type='string', result_type='reports',
+               url_matching='url_host', date_from=None, deep=False,
+               gzip=None, typed=None):
+        """
+            Search in the database
+
+            :param q: Search query
+
+            :param search_type: Search type
+                * *string*: Used to find URLs which contains a given string.
+                    To search for URLs on a specific IP use string. If a
+                    string is found to match an IP address it will automaticly
+                    search based on the IP. (default)
+                * *regexp*: Search for a regexp pattern within URLs
+                * *ids_alert*: Search for specific IDS alerts
+                * *urlquery_alert*: ????? FIXME ?????
+                * *js_script_hash*: Used to search for URLs/reports which
+                    contains a specific JavaScript. The scripts are searched
+                    based on SHA256, the hash value for each script are
+                    included in the report details. Can be used to find other
+
+            :param result_type: Result type
+                * *reports*: Full reports (default)
+                * *url_list*: List of urls
+
+            :param url_matching: What part of an URL to do pattern matching
+                against. Only applies to string and regexp searches.
+                * *url_host*: match against host (default)
+                * *url_path*: match against path
+
+
+            :param date_from: Unix epoch timestamp for starting searching point.
+                A datetime or a date string are converted.
+                Default: If None, setted to datetime.now()
+
+
+            :param deep: Search all URLs, not just submitted URLs.
+                Default: false
+                Experimental! Should be used with care as it’s very resource
+                intensive.
+        """
+        return self._query(_search_query(q, search_type, result_type,
+                                         url_matching, date_from, deep),
+                           gzip, typed)
+
+    def iter_search(self, q, search_type='string', url_matching='url_host',
+                    start=None, end=None, deep=False, shard_size=3600,
+                    min_shard_size=10, max_workers=4, page_size=50,
+                    gzip=None, typed=None, direction='backward'):
+        """
+            Searches the whole time range between *start* and *end*. See
+            search for the other parameters.
+
+            The range is split in time shards, searched *max_workers* at a
+            time. A shard whose results fill a page is split, and the shard
+            size adapts to the density of the results.
+
+            A search is assumed to return the reports dated at or before
+            its date_from (which defaults to now), so the shards are
+            searched from *end* back to *start*. If the iteration stops
+            with an error saying the server searches forward, use
+            direction='forward'.
+
+            :param start: Beginning of the range, a Unix timestamp, a
+                datetime or a date string. Default: one day before *end*
+
+            :param end: End of the range. Default: now
+
+            :param shard_size: Initial size of the shards in seconds.
+                Default: 3600
+
+            :param min_shard_size: Smallest size of the shards in seconds.
+                Default: 10
+
+            :param max_workers: Number of shards searched at the same time.
+                Default: 4
+
+            :param page_size: Maximum number of reports returned by one
+                search. Default: 50
+
+            :param direction: 'backward' if a search returns the reports
+                before its date_from, 'forward' if it returns the ones
+                after it. Default: 'backward'
+
+            :return: SearchStream, an iterator of BASICREPORTs, newest
+                first (in time order with direction='forward'), each report
+                once, with an *error* attribute set if the iteration
+                stopped on an error.
+        """
+        query, start, end = _iter_search_query(q, search_type, url_matching,
+                                               start, end, deep)
+        return SearchStream(self, query, start, end, shard_size,
+                            min_shard_size, max_workers, page_size, gzip,
+                            typed, direction)
+
+    def reputation(self, q, gzip=None, typed=None):
+        """
+            Searches a reputation list of URLs detected over the last month.
+            The search query can be a domain or an IP.
+
+            With an API key, matching URLs will be returned along with the
+            triggering alert.
+
+            :param q: Search query
+        """
+        return self._query(_reputation_query(q), gzip, typed)
+
+    def reputation_many(self, queries, max_workers=10, gzip=None,
+                        typed=None):
+        """
+            Looks up the reputation of several domains or IPs concurrently.
+
+            The queries are normalized (lowercased, URLs reduced to their
+            host) and each distinct one is looked up once. With a cache on
+            the client, the responses are cached, the empty ones ("not
+            listed") with the negative_ttl of the cache.
+
+            :param queries: Iterable of domains, IPs or URLs
+
+            :param max_workers: Maximum number of lookups at the same time.
+                Default: 10
+
+            :return: Dict mapping each query to its response, or to
+                {'error': message}
+        """
+        hosts = {}
+        for q in queries:
+            if q not in hosts:
+                hosts[q] = _normalize_host(q)
+        unique = list(set(host for host in hosts.values() if host))
+
+        def fetch(host):
+            try:
+                return self.reputation(host, gzip, typed)
+            except Exception as e:
+                return {'error': 'Unable to look up {}: {}'.format(host, e)}
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = dict(zip(unique, executor.map(fetch, unique)))
+        return dict((q, results[host] if host else
+                     {'error': 'Invalid reputation query: {!r}'.format(q)})
+                    for q, host in hosts.items())
+
+
+# Module-level API: thin wrappers around a shared default client which
+# follows the module-level key, base_url and gzip_default settings.
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def default_client():
+    """
+        Returns the Client used by the module-level functions, creating it
+        on first use.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = Client()
+    return _client
+
+
+def urlfeed(feed='unfiltered', interval='hour', timestamp=None, **kwargs):
+    return default_client().urlfeed(feed, interval, timestamp, **kwargs)
+urlfeed.__doc__ = Client.urlfeed.__doc__
+
+
+def iter_urlfeed(feed='unfiltered', interval='hour', timestamp=None,
+                 **kwargs):
+    return default_client().iter_urlfeed(feed, interval, timestamp, **kwargs)
+iter_urlfeed.__doc__ = Client.iter_urlfeed.__doc__
+
+
+def submit(url, useragent=None, referer=None, priority='low',
+           access_level='public', callback_url=None, submit_vt=False,
+           save_only_alerted=False, **kwargs):
+    return default_client().submit(url, useragent, referer, priority,
+                                   access_level, callback_url, submit_vt,
+                                   save_only_alerted, **kwargs)
+submit.__doc__ = Client.submit.__doc__
+
+
+def user_agent_list(**kwargs):
+    return default_client().user_agent_list(**kwargs)
+user_agent_list.__doc__ = Client.user_agent_list.__doc__
+
+
+def mass_submit(urls, useragent=None, referer=None,
+                access_level='public', priority='low', callback_url=None,
+                **kwargs):
+    return default_client().mass_submit(urls, useragent, referer,
+                                        access_level, priority, callback_url,
+                                        **kwargs)
+mass_submit.__doc__ = Client.mass_submit.__doc__
+
+
+def queue_status(queue_id, **kwargs):
+    return default_client().queue_status(queue_id, **kwargs)
+queue_status.__doc__ = Client.queue_status.__doc__
+
+
+def report(report_id, recent_limit=0, include_details=False,
+           include_screenshot=False, include_domain_graph=False, **kwargs):
+    return default_client().report(report_id, recent_limit, include_details,
+                                   include_screenshot, include_domain_graph,
+                                   **kwargs)
+report.__doc__ = Client.report.__doc__
+
+
+def report_many(report_ids, recent_limit=0, include_details=False,
+                include_screenshot=False, include_domain_graph=False,
+                max_workers=10, ordered=True, **kwargs):
+    return default_client().report_many(report_ids, recent_limit,
+                                        include_details, include_screenshot,
+                                        include_domain_graph, max_workers,
+                                        ordered, **kwargs)
+report_many.__doc__ = Client.report_many.__doc__
+
+
+def report_list(timestamp=None, limit=50, **kwargs):
+    return default_client().report_list(timestamp, limit, **kwargs)
+report_list.__doc__ = Client.report_list.__doc__
+
+
+def search(q, search_type='string', result_type='reports',
+           url_matching='url_host', date_from=None, deep=False, **kwargs):
+    return default_client().search(q, search_type, result_type, url_matching,
+                                   date_from, deep, **kwargs)
+search.__doc__ = Client.search.__doc__
+
+
+def iter_search(q, search_type='string', url_matching='url_host', start=None,
+                end=None, deep=False, **kwargs):
+    return default_client().iter_search(q, search_type, url_matching, start,
+                                        end, deep, **kwargs)
+iter_search.__doc__ = Client.iter_search.__doc__
+
+
+def reputation(q, **kwargs):
+    return default_client().reputation(q, **kwargs)
+reputation.__doc__ = Client.reputation.__doc__
+
+
+def reputation_many(queries, max_workers=10, **kwargs):
+    return default_client().reputation_many(queries, max_workers, **kwargs)
+reputation_many.__doc__ = Client.reputation_many.__doc__
@@ -0,0 +1,320 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+    Local archive of the reports fetched, to pivot on them offline.
+
+    A ReportArchive given to a client (archive=...) stores every report the
+    client gets (from report, report_list and search), indexed on the
+    domain, fqdn, IP address, AS number and country code of their URL, on
+    their alert counts, and on the SHA256 of their scripts and their alerts
+    when the details were included.
+
+    Its search and reputation methods take the same parameters as the API
+    ones and return responses in the same format, answered locally. The
+    client answers report from it, and search and reputation too if they
+    are in its *local_first* methods.
+"""
+
+import json
+import re
+import threading
+import time
+
+from .cache import _is_error
+
+_columns = ('report_id', 'date', 'addr', 'fqdn', 'domain', 'tld', 'ip',
+            'asn', 'cc', 'urlquery_alert_count', 'ids_alert_count',
+            'blacklist_alert_count', 'details', 'data')
+_indexed = ('date', 'fqdn', 'domain', 'ip', 'asn', 'cc',
+            'urlquery_alert_count', 'ids_alert_count',
+            'blacklist_alert_count')
+_blobs = ('screenshot', 'domain_graph')
+_ip = re.compile(r'^[0-9.]+$|^[0-9a-fA-F:]*:[0-9a-fA-F:.]*$')
+
+
+def _regexp(pattern, value):
+    try:
+        return value is not None and re.search(pattern, value) is not None
+    except re.error:
+        return False
+
+
+class ReportArchive(object):
+    """
+        Reports stored in a SQLite database.
+
+        :param path: Path of the database file. Default: :memory:
+
+        :param keep_blobs: Also store the screenshots and domain graphs.
+            Default: False
+    """
+
+    def __init__(self, path=':memory:', keep_blobs=False):
+        import sqlite3
+        from .api import _to_timestamp
+        self._to_timestamp = _to_timestamp
+        self.path = path
+        self.keep_blobs = keep_blobs
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.create_function('REGEXP', 2, _regexp)
+        with self._db:
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS reports (report_id TEXT PRIMARY '
+                'KEY, date REAL, addr TEXT, fqdn TEXT, domain TEXT, tld TEXT, '
+                'ip TEXT, asn INTEGER, cc TEXT, urlquery_alert_count '
+                'INTEGER, ids_alert_count INTEGER, blacklist_alert_count '
+                'INTEGER, details INTEGER, data BLOB)')
+            for column in _indexed:
+                self._db.execute('CREATE INDEX IF NOT EXISTS reports_{0} ON '
+                                 'reports ({0})'.format(column))
+            self._db.execute('CREATE TABLE IF NOT EXISTS scripts '
+                             '(sha256 TEXT, report_id TEXT)')
+            self._db.execute('CREATE INDEX IF NOT EXISTS scripts_sha256 ON '
+                             'scripts (sha256)')
+            self._db.execute('CREATE TABLE IF NOT EXISTS alerts (kind TEXT, '
+                             'alert TEXT, report_id TEXT)')
+            self._db.execute('CREATE INDEX IF NOT EXISTS alerts_alert ON '
+                             'alerts (kind, alert)')
+
+    def close(self):
+        self._db.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM reports') \
+                .fetchone()[0]
+
+    # Storing
+
+    def _row(self, report):
+        url = report.get('url') or {}
+        ip = url.get('ip') or {}
+        try:
+            date = self._to_timestamp(report.get('date'))
+        except Exception:
+            date = None
+        data = dict((k, v) for k, v in report.items() if k != '_response_'
+                    and (self.keep_blobs or k not in _blobs))
+        details = any(k not in ('report_id', 'date', 'url', 'settings',
+                                'urlquery_alert_count', 'ids_alert_count',
+                                'blacklist_alert_count') + _blobs
+                      for k in data)
+        return (str(report['report_id']), date, url.get('addr'),
+                (url.get('fqdn') or '').lower() or None,
+                (url.get('domain') or '').lower() or None, url.get('tld'),
+                ip.get('addr'), ip.get('asn'), ip.get('cc'),
+                report.get('urlquery_alert_count'),
+                report.get('ids_alert_count'),
+                report.get('blacklist_alert_count'), int(details),
+                json.dumps(data).encode('utf-8'))
+
+    def add(self, reports):
+        """
+            Stores a report (BASICREPORT dict or typed Report), or a list of
+            them. A report already stored with its details is not replaced
+            by a version without.
+        """
+        if isinstance(reports, dict) or hasattr(reports, 'to_dict'):
+            reports = [reports]
+        rows, scripts, alerts = [], [], []
+        for report in reports:
+            if hasattr(report, 'to_dict'):
+                report = report.to_dict()
+            if not isinstance(report, dict) or _is_error(report) or \
+                    report.get('report_id') is None:
+                continue
+            row = self._row(report)
+            rows.append(row)
+            if row[12]:
+                report_id = row[0]
+                for script in report.get('javascript') or []:
+                    if isinstance(script, dict) and script.get('sha256'):
+                        scripts.append((script['sha256'].lower(), report_id))
+                for kind in ('urlquery', 'ids'):
+                    for alert in report.get(kind + '_alerts') or []:
+                        if isinstance(alert, dict) and alert.get('alert'):
+                            alerts.append((kind, alert['alert'], report_id))
+        if not rows:
+            return
+        with self._lock:
+            with self._db:
+                detailed = set()
+                ids = [(row[0],) for row in rows]
+                for report_id, in ids:
+                    if self._db.execute(
+                            'SELECT 1 FROM reports WHERE report_id = ? AND '
+                            'details = 1', (report_id,)).fetchone():
+                        detailed.add(report_id)
+                rows = [row for row in rows
+                        if row[12] or row[0] not in detailed]
+                updated = [(row[0],) for row in rows if row[12]]
+                self._db.executemany('DELETE FROM scripts WHERE report_id = ?',
+                                     updated)
+                self._db.executemany('DELETE FROM alerts WHERE report_id = ?',
+                                     updated)
+                self._db.executemany(
+                    'INSERT OR REPLACE INTO reports VALUES ({})'.format(
+                        ', '.join('?' * len(_columns))), rows)
+                self._db.executemany('INSERT INTO scripts VALUES (?, ?)',
+                                     scripts)
+                self._db.executemany('INSERT INTO alerts VALUES (?, ?, ?)',
+                                     alerts)
+
+    def store(self, query, response):
+        """
+            Stores the reports of the response to an API *query*.
+        """
+        if _is_error(response) or not isinstance(response, dict):
+            return
+        if query['method'] == 'report':
+            self.add(response)
+        elif query['method'] in ('report_list', 'search'):
+            self.add(response.get('reports') or [])
+
+    # Querying
+
+    def _select(self, where, params, limit=None, newest_first=False):
+        sql = 'SELECT data FROM reports'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY date DESC' if newest_first else ' ORDER BY date'
+        if limit is not None:
+            sql += ' LIMIT {:d}'.format(limit)
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        return [json.loads(bytes(row[0]).decode('utf-8')) for row in rows]
+
+    def get(self, report_id, include_details=False):
+        """
+            Returns the stored report, or None. With *include_details*,
+            only a report stored with its details is returned.
+        """
+        where = ['report_id = ?']
+        if include_details:
+            where.append('details = 1')
+        reports = self._select(where, [str(report_id)])
+        return reports[0] if reports else None
+
+    def find(self, domain=None, fqdn=None, ip=None, asn=None, cc=None,
+             sha256=None, min_alerts=None, since=None, until=None,
+             limit=None):
+        """
+            Returns the stored reports matching all the given criteria, in
+            chronological order.
+
+            :param min_alerts: Minimum total of urlquery, IDS and blacklist
+                alerts.
+
+            :param since, until: Time range, Unix timestamps, datetimes or
+                date strings.
+        """
+        where, params = [], []
+        for column, value in (('domain', domain), ('fqdn', fqdn),
+                              ('ip', ip), ('asn', asn), ('cc', cc)):
+            if value is not None:
+                where.append('{} = ?'.format(column))
+                params.append(value.lower() if column in ('domain', 'fqdn')
+                              else value)
+        if sha256 is not None:
+            where.append('report_id IN (SELECT report_id FROM scripts WHERE '
+                         'sha256 = ?)')
+            params.append(sha256.lower())
+        if min_alerts is not None:
+            where.append('COALESCE(urlquery_alert_count, 0) + '
+                         'COALESCE(ids_alert_count, 0) + '
+                         'COALESCE(blacklist_alert_count, 0) >= ?')
+            params.append(min_alerts)
+        if since is not None:
+            where.append('date >= ?')
+            params.append(self._to_timestamp(since))
+        if until is not None:
+            where.append('date < ?')
+            params.append(self._to_timestamp(until))
+        return self._select(where, params, limit)
+
+    def search(self, q, search_type='string', result_type='reports',
+               url_matching='url_host', date_from=None, deep=False,
+               limit=None):
+        """
+            Same as the search API method, on the stored reports: the ones
+            dated at or before *date_from* (any date if None), newest first.
+            *deep* is ignored: only the stored reports are searched.
+        """
+        where, params = [], []
+        column = 'fqdn' if url_matching == 'url_host' else 'addr'
+        if search_type == 'string':
+            if _ip.match(q):
+                where.append('ip = ?')
+                params.append(q)
+            else:
+                where.append("{} LIKE ? ESCAPE '\\'".format(column))
+                params.append('%{}%'.format(
+                    re.sub(r'([%_\\])', r'\\\1', q.lower() if column == 'fqdn'
+                           else q)))
+        elif search_type == 'regexp':
+            where.append('REGEXP(?, {})'.format(column))
+            params.append(q)
+        elif search_type == 'js_script_hash':
+            where.append('report_id IN (SELECT report_id FROM scripts WHERE '
+                         'sha256 = ?)')
+            params.append(q.lower())
+        elif search_type in ('ids_alert', 'urlquery_alert'):
+            where.append('report_id IN (SELECT report_id FROM alerts WHERE '
+                         "kind = ? AND alert LIKE ?)")
+            params.extend([search_type.split('_')[0], '%{}%'.format(q)])
+        else:
+            return {'error': 'Unknown search_type: {}'.format(search_type)}
+        if date_from is not None:
+            where.append('date <= ?')
+            params.append(self._to_timestamp(date_from))
+        reports = self._select(where, params, limit, newest_first=True)
+        if result_type == 'url_list':
+            return {'_response_': {'status': 'ok'},
+                    'url_list': [report.get('url') for report in reports]}
+        return {'_response_': {'status': 'ok'}, 'reports': reports}
+
+    def reputation(self, q, days=30):
+        """
+            Same as the reputation API method, on the stored reports: the
+            URLs of the domain or IP *q* with alerts over the last *days*.
+        """
+        q = q.lower()
+        column = 'ip' if _ip.match(q) else 'domain'
+        reports = self._select(
+            ['({} = ? OR fqdn = ?)'.format(column),
+             'COALESCE(urlquery_alert_count, 0) + COALESCE(ids_alert_count, '
+             '0) + COALESCE(blacklist_alert_count, 0) > 0', 'date >= ?'],
+            [q, q, time.time() - days * 24 * 3600])
+        return {'_response_': {'status': 'ok'},
+                'reputation': [{'url': report.get('url'),
+                                'date': report.get('date'),
+                                'report_id': report.get('report_id')}
+                               for report in reports]}
+
+    def answer(self, query):
+        """
+            Returns the response to an API *query* from the stored reports,
+            or None if it cannot be answered locally.
+        """
+        method = query['method']
+        if method == 'report':
+            report = self.get(query['report_id'], query.get('include_details'))
+            if report is None:
+                return None
+            for blob in _blobs:
+                if query.get('include_' + blob) and blob not in report:
+                    return None
+            return report
+        if method == 'search':
+            response = self.search(query['q'], query.get('search_type',
+                                                         'string'),
+                                   query.get('result_type', 'reports'),
+                                   query.get('url_matching', 'url_host'),
+                                   query.get('from'))
+            results = response.get('reports', response.get('url_list'))
+            return response if results else None
+        if method == 'reputation':
+            response = self.reputation(query['q'])
+            return response if response['reputation'] else None
+        return None
@@ -0,0 +1,244 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+    Backfilling all the reports of a time range from report_list.
+
+    report_list returns at most *limit* reports from a timestamp, so a long
+    range means many calls. The range is split in shards crawled in
+    parallel, each one page after page, starting the next page at the date
+    of the last report seen. The position of every shard is saved in a
+    state file, so an interrupted backfill resumes where it stopped.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import json
+import queue
+import threading
+import time
+
+from .cache import _is_error
+from .follower import _write_atomic
+from .search import _date
+
+_done = object()
+
+
+class _Shard(object):
+
+    def __init__(self, start, end, cursor=None, seen=(), done=False):
+        self.start = start
+        self.end = end
+        # Saved position: the reports before it have been consumed, as well
+        # as the *seen* ones at its date.
+        self.cursor = start if cursor is None else cursor
+        self.seen = set(seen)
+        self.done = done
+
+    def to_dict(self):
+        return {'start': self.start, 'end': self.end, 'cursor': self.cursor,
+                'seen': list(self.seen), 'done': self.done}
+
+
+class Backfill(object):
+    """
+        Iterates over the reports created between *start* and *end*, each
+        once. The order is only chronological within a shard.
+
+        A report is only counted as consumed (and the state saved) once the
+        loop asked for the next one, so after a crash a few reports can be
+        yielded again, never skipped.
+
+        :param start: Beginning of the range, a Unix timestamp, a datetime
+            or a date string
+
+        :param end: End of the range. Default: now, or the end of the
+            backfill being resumed
+
+        :param client: The Client used. Default: the default client
+
+        :param state: Path of the state file. Default: None (not saved)
+
+        :param workers: Number of shards crawled at the same time.
+            Default: 8
+
+        :param shards: Number of shards. Default: 4 times *workers*
+
+        :param limit: Reports per report_list call. Default: 50
+
+        :param details: Fetch each report with report(), with these
+            parameters: a dict of report parameters, or True for
+            {'include_details': True}. Default: None (the BASICREPORTs of
+            report_list are yielded)
+
+        :param detail_workers: Number of reports fetched at the same time
+            per page. Default: 10
+
+        :param retries: Number of times a failed call is retried before
+            the shard is given up (it is crawled again on resume).
+            Default: 3
+
+        :param retry_delay: Time in seconds before the first retry, doubled
+            at each retry. Default: 5
+    """
+
+    def __init__(self, start, end=None, client=None, state=None, workers=8,
+                 shards=None, limit=50, details=None, detail_workers=10,
+                 retries=3, retry_delay=5):
+        from .api import _to_timestamp, default_client
+        self._to_timestamp = _to_timestamp
+        self.client = client if client is not None else default_client()
+        self.start = _to_timestamp(start)
+        self.end = None if end is None else _to_timestamp(end)
+        self.state = state
+        self.workers = workers
+        self.limit = limit
+        if details is True:
+            details = {'include_details': True}
+        self.details = details
+        self.detail_workers = detail_workers
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.errors = []
+        self.reports = 0
+        self.shards = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        if state is not None:
+            self._load()
+        if self.end is None:
+            self.end = time.time()
+        if self.shards is None:
+            count = shards or 4 * workers
+            size = (self.end - self.start) / float(count)
+            self.shards = [_Shard(self.start + i * size,
+                                  self.end if i == count - 1
+                                  else self.start + (i + 1) * size)
+                           for i in range(count)]
+
+    def _load(self):
+        try:
+            with open(self.state) as f:
+                state = json.load(f)
+        except (IOError, OSError, ValueError):
+            return
+        if state.get('start') == self.start and \
+                self.end in (None, state.get('end')):
+            self.end = state['end']
+            self.shards = [_Shard(s['start'], s['end'], s['cursor'],
+                                  s['seen'], s['done'])
+                           for s in state['shards']]
+
+    def save(self):
+        """
+            Writes the position of every shard to the state file.
+        """
+        if self.state is None:
+            return
+        with self._lock:
+            state = {'start': self.start, 'end': self.end,
+                     'shards': [s.to_dict() for s in self.shards]}
+        _write_atomic(self.state, json.dumps(state).encode('utf-8'))
+
+    @property
+    def done(self):
+        return all(shard.done for shard in self.shards)
+
+    def _call(self, function, *args, **kwargs):
+        delay = self.retry_delay
+        for attempt in range(self.retries + 1):
+            try:
+                response = function(*args, **kwargs)
+            except Exception as e:
+                response = {'error': str(e)}
+            if not _is_error(response) or attempt == self.retries:
+                return response
+            time.sleep(delay)
+            delay *= 2
+
+    def _page(self, shard, cursor, seen):
+        """
+            Returns the reports of the page at *cursor* not in *seen*, in
+            chronological order, and the position of the next page (None
+            at the end of the shard).
+        """
+        response = self._call(self.client.report_list, cursor, self.limit,
+                              typed=False)
+        if _is_error(response):
+            raise ValueError(response.get('error') or
+                             response.get('_response_', {}).get('error'))
+        returned = response.get('reports') or []
+        reports = []
+        for report in returned:
+            date = _date(report, self._to_timestamp)
+            if date is not None and cursor <= date < shard.end and \
+                    report.get('report_id') not in seen:
+                reports.append((date, report))
+        reports.sort(key=lambda item: item[0])
+        if len(returned) < self.limit or not reports:
+            return reports, None
+        last = reports[-1][0]
+        if last <= cursor:
+            # A whole page in the same second: skip to the next one
+            return reports, (cursor + 1, set())
+        return reports, (last, set(r.get('report_id') for d, r in reports
+                                   if d == last))
+
+    def _put(self, pages, item):
+        while not self._stop.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _crawl(self, shard, pages):
+        cursor, seen = shard.cursor, set(shard.seen)
+        try:
+            while not self._stop.is_set():
+                reports, position = self._page(shard, cursor, seen)
+                if not self._put(pages, (shard, reports, position)) or \
+                        position is None:
+                    break
+                cursor, seen = position
+        except Exception as e:
+            self.errors.append('Shard {}-{}: {}'.format(shard.start,
+                                                         shard.end, e))
+        self._put(pages, (shard, _done, None))
+
+    def _with_details(self, reports):
+        ids = [report.get('report_id') for _, report in reports]
+        details = self.client.report_many(ids, max_workers=self.detail_workers,
+                                          **self.details)
+        return [(date, detail if not _is_error(detail) else report)
+                for (date, report), detail in zip(reports, details)]
+
+    def __iter__(self):
+        shards = [shard for shard in self.shards if not shard.done]
+        # Bounded, so the crawlers wait for the consumer
+        pages = queue.Queue(maxsize=2 * self.workers)
+        self._stop.clear()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for shard in shards:
+                executor.submit(self._crawl, shard, pages)
+            running = len(shards)
+            try:
+                while running:
+                    shard, reports, position = pages.get()
+                    if reports is _done:
+                        running -= 1
+                        continue
+                    if self.details is not None:
+                        reports = self._with_details(reports)
+                    for _, report in reports:
+                        yield report
+                        self.reports += 1
+                    with self._lock:
+                        if position is None:
+                            shard.done = True
+                        else:
+                            shard.cursor, shard.seen = position
+                    self.save()
+            finally:
+                # Stops the crawlers if the loop was left early
+                self._stop.set()
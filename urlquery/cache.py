@@ -0,0 +1,274 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+    Caches for the responses of the API.
+
+    A cache is given to a Client (cache=...) and is used for the methods
+    listed in its *ttl* dict, by default report, user_agent_list and
+    reputation. The entries are keyed on the method, its normalized
+    parameters and the API key used, since the data returned depends on
+    the permissions of the key.
+
+    Two backends are available: LRUCache, bounded and in memory, and
+    SQLiteCache, persistent and bounded by size.
+
+    The cached responses are shared: do not modify them.
+"""
+
+from collections import OrderedDict
+import hashlib
+import itertools
+import json
+import threading
+import time
+
+# Time to live in seconds of the entries, per method. None never expires:
+# reports do not change once they are done.
+default_ttl = {
+    'report': None,
+    'user_agent_list': 24 * 3600,
+    'reputation': 3600,
+}
+
+# Time to live of the empty responses ("not listed"), per method. They are
+# most of the reputation responses, and become stale sooner.
+default_negative_ttl = {
+    'reputation': 900,
+}
+
+_report_flags = ('include_details', 'include_screenshot', 'include_domain_graph')
+_ignored_params = ('key', 'gzip', 'error')
+
+
+def make_key(query, api_key=''):
+    """
+        Returns the cache key of a query: its method and its parameters,
+        normalized, along with a digest of the API key.
+    """
+    params = dict((k, v) for k, v in query.items() if k not in _ignored_params)
+    if params.get('method') == 'report':
+        params['report_id'] = str(params['report_id'])
+        for flag in _report_flags:
+            params[flag] = bool(params.get(flag))
+        if not params['include_details']:
+            # Only applies to the reports with details
+            params.pop('recent_limit', None)
+    digest = hashlib.sha1((api_key or '').encode('utf-8')).hexdigest()[:16]
+    return digest + ':' + json.dumps(params, sort_keys=True,
+                                     separators=(',', ':'))
+
+
+def _candidate_queries(query):
+    """
+        Yields the queries whose response can answer *query*, the exact one
+        first. A report fetched with more sections (details, screenshot,
+        domain graph) also satisfies a request for fewer.
+    """
+    yield query
+    if query.get('method') != 'report':
+        return
+    missing = [flag for flag in _report_flags if not query.get(flag)]
+    for n in range(1, len(missing) + 1):
+        for flags in itertools.combinations(missing, n):
+            candidate = dict(query)
+            for flag in flags:
+                candidate[flag] = True
+            if 'include_details' in flags:
+                # The recent reports are only included with the details
+                candidate['recent_limit'] = query.get('recent_limit') or 0
+            yield candidate
+
+
+def _is_error(response):
+    if not isinstance(response, dict):
+        return False
+    if response.get('error') is not None:
+        return True
+    status = response.get('_response_')
+    return isinstance(status, dict) and status.get('status') == 'error'
+
+
+def _is_negative(method, response):
+    return method == 'reputation' and isinstance(response, dict) and \
+        not response.get('reputation')
+
+
+def _expires(cache, method, negative, now):
+    ttl = cache.ttl.get(method)
+    if negative:
+        ttl = cache.negative_ttl.get(method, ttl)
+    return None if ttl is None else now + ttl
+
+
+def lookup(cache, query, api_key=''):
+    """
+        Returns the cached response to *query*, or None.
+    """
+    for candidate in _candidate_queries(query):
+        value = cache.get(make_key(candidate, api_key))
+        if value is not None:
+            return value
+    return None
+
+
+def store(cache, query, api_key, response):
+    """
+        Caches the response to *query*, unless it is an error.
+    """
+    if not _is_error(response):
+        cache.set(query['method'], make_key(query, api_key), response,
+                  _is_negative(query['method'], response))
+
+
+class LRUCache(object):
+    """
+        In-memory cache keeping at most *maxsize* entries, the least
+        recently used entry being dropped first.
+
+        :param maxsize: Maximum number of entries. Default: 1024
+
+        :param ttl: Dict of time to live in seconds per method, replaces
+            *default_ttl*. Only the methods in the dict are cached.
+
+        :param negative_ttl: Dict of time to live in seconds of the empty
+            responses per method, replaces *default_negative_ttl*.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None, negative_ttl=None):
+        self.maxsize = maxsize
+        self.ttl = dict(default_ttl if ttl is None else ttl)
+        self.negative_ttl = dict(default_negative_ttl if negative_ttl is None
+                                 else negative_ttl)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires is not None and expires < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, method, key, value, negative=False):
+        expires = _expires(self, method, negative, time.time())
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCache(object):
+    """
+        Persistent cache in a SQLite database. When the total size of the
+        cached responses goes over *max_bytes*, the least recently used
+        entries are dropped.
+
+        :param path: Path of the database file
+
+        :param ttl: Dict of time to live in seconds per method, replaces
+            *default_ttl*. Only the methods in the dict are cached.
+
+        :param negative_ttl: Dict of time to live in seconds of the empty
+            responses per method, replaces *default_negative_ttl*.
+
+        :param max_bytes: Maximum size of the cached responses.
+            Default: 256MiB
+    """
+
+    def __init__(self, path, ttl=None, max_bytes=256 * 1024 * 1024,
+                 negative_ttl=None):
+        self.path = path
+        self.ttl = dict(default_ttl if ttl is None else ttl)
+        self.negative_ttl = dict(default_negative_ttl if negative_ttl is None
+                                 else negative_ttl)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        import sqlite3  # Only imported when used
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute('CREATE TABLE IF NOT EXISTS cache ('
+                             'key TEXT PRIMARY KEY, method TEXT, value BLOB, '
+                             'size INTEGER, expires REAL, accessed REAL)')
+            self._db.execute('CREATE INDEX IF NOT EXISTS cache_accessed '
+                             'ON cache (accessed)')
+            self._db.execute('DELETE FROM cache WHERE expires < ?',
+                             (time.time(),))
+        self._size = self._db.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM cache').fetchone()[0]
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._db.execute('SELECT value, expires FROM cache '
+                                   'WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            value, expires = row
+            with self._db:
+                if expires is not None and expires < now:
+                    self._delete(key)
+                    return None
+                self._db.execute('UPDATE cache SET accessed = ? WHERE key = ?',
+                                 (now, key))
+        return json.loads(bytes(value).decode('utf-8'))
+
+    def set(self, method, key, value, negative=False):
+        now = time.time()
+        expires = _expires(self, method, negative, now)
+        data = json.dumps(value).encode('utf-8')
+        with self._lock:
+            with self._db:
+                self._delete(key)
+                self._db.execute('INSERT INTO cache VALUES (?, ?, ?, ?, ?, ?)',
+                                 (key, method, data, len(data),
+                                  expires, now))
+                self._size += len(data)
+                self._evict()
+
+    def _delete(self, key):
+        row = self._db.execute('SELECT size FROM cache WHERE key = ?',
+                               (key,)).fetchone()
+        if row is not None:
+            self._db.execute('DELETE FROM cache WHERE key = ?', (key,))
+            self._size -= row[0]
+
+    def _evict(self):
+        if self._size <= self.max_bytes:
+            return
+        self._db.execute('DELETE FROM cache WHERE expires < ?', (time.time(),))
+        size = self._db.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM cache').fetchone()[0]
+        to_delete = []
+        for key, entry_size in self._db.execute('SELECT key, size FROM cache '
+                                                'ORDER BY accessed').fetchall():
+            if size <= self.max_bytes:
+                break
+            to_delete.append((key,))
+            size -= entry_size
+        self._db.executemany('DELETE FROM cache WHERE key = ?', to_delete)
+        self._size = size
+
+    def clear(self):
+        with self._lock:
+            with self._db:
+                self._db.execute('DELETE FROM cache')
+            self._size = 0
+
+    def close(self):
+        self._db.close()
+
+    def __len__(self):
+        return self._db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
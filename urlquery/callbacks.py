@@ -0,0 +1,398 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+    Receiving the results of submissions on a callback URL instead of
+    polling queue_status.
+
+    A CallbackReceiver is a small threaded HTTP server. The submissions
+    made through it (or given to track) carry its callback_url, and the
+    results POSTed back by uqapi.net resolve them. A submission whose
+    callback has not come after *timeout* seconds is handed to a
+    QueueScheduler and polled instead.
+"""
+
+from concurrent.futures import Future
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import heapq
+import hmac
+import itertools
+import json
+import secrets
+import threading
+import time
+import zlib
+
+from .cache import _is_error
+from .scheduler import QueueScheduler, _Completed
+
+
+def parse_callback(body, content_type=None, max_size=None):
+    """
+        Returns the QUEUE_STATUS objects (see submit) of a callback body:
+        JSON, possibly gzip'ed or form-encoded, holding one object, a list
+        of them, or {"queue_status": [...]} like mass_submit. The objects
+        without a queue_id are dropped.
+
+        Raises ValueError if the gzip'ed body is larger than *max_size*
+        once decompressed.
+    """
+    if body[:2] == b'\x1f\x8b':
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        body = decompressor.decompress(body, max_size or 0)
+        if not decompressor.eof:
+            raise ValueError('truncated gzip body, or more than {} bytes '
+                             'once decompressed'.format(max_size))
+    text = body.decode('utf-8')
+    if content_type and \
+            content_type.startswith('application/x-www-form-urlencoded'):
+        for values in parse_qs(text).values():
+            text = values[0]
+            break
+    data = json.loads(text)
+    if isinstance(data, dict) and 'queue_status' in data:
+        data = data['queue_status']
+    if isinstance(data, dict):
+        data = [data]
+    return [status for status in data
+            if isinstance(status, dict) and status.get('queue_id')]
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, code, message, close=False):
+        data = json.dumps({'status': 'ok' if code == 200 else 'error',
+                           'message': message}).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        if close:
+            # The body was not read, the connection cannot be reused
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        receiver = self.server.receiver
+        # Nothing is read from unauthenticated clients
+        url = urlsplit(self.path)
+        if url.path != receiver.path:
+            return self._reply(404, 'Not found', close=True)
+        token = parse_qs(url.query).get('token') or ['']
+        if not hmac.compare_digest(token[0].encode('utf-8'),
+                                   receiver.token.encode('utf-8')):
+            return self._reply(403, 'Invalid token', close=True)
+        try:
+            length = int(self.headers.get('Content-Length'))
+        except (TypeError, ValueError):
+            return self._reply(400, 'Invalid Content-Length', close=True)
+        if length < 0:
+            return self._reply(400, 'Invalid Content-Length', close=True)
+        if length > receiver.max_body:
+            return self._reply(413, 'Callback too large', close=True)
+        body = self.rfile.read(length)
+        try:
+            statuses = parse_callback(body, self.headers.get('Content-Type'),
+                                      receiver.max_body)
+        except Exception as e:
+            return self._reply(400, 'Invalid callback: {}'.format(e))
+        for status in statuses:
+            receiver._received(status)
+        self._reply(200, '{} received'.format(len(statuses)))
+
+
+# Addresses the receiver can listen on, but not be reached at from outside
+_unreachable_hosts = ('', '0.0.0.0', '::', 'localhost', '::1')
+
+
+class _Pending(object):
+
+    __slots__ = ('queue_id', 'priority', 'callback', 'future')
+
+    def __init__(self, queue_id, priority, callback):
+        self.queue_id = queue_id
+        self.priority = priority
+        self.callback = callback
+        self.future = Future()
+
+
+class CallbackReceiver(object):
+    """
+        HTTP server receiving the callbacks of submissions.
+
+        The results are available like with a QueueScheduler: the Future
+        returned by track, submit and mass_submit, the optional callback,
+        and the as_completed iterator. The result is the QUEUE_STATUS
+        POSTed back (or polled), which has a "report_id". As with a
+        QueueScheduler, as_completed only yields the submissions
+        completing while it runs, unless *keep_completed* is set.
+
+        :param client: The Client used to submit, and to poll after a
+            timeout. Default: the default client
+
+        :param host: Address to listen on. Default: 0.0.0.0
+
+        :param port: Port to listen on, 0 for any free port. Default: 0
+
+        :param public_url: URL under which uqapi.net reaches the receiver,
+            required when *host* is a wildcard or loopback address (e.g.
+            the address of the machine, or of a reverse proxy in front of
+            it). Default: None (http://host:port)
+
+        :param path: Path the callbacks are POSTed to.
+            Default: /urlquery/callback
+
+        :param token: Secret added to the callback URL, the callbacks
+            without it are refused. Default: None (a random one)
+
+        :param timeout: Time in seconds after which a submission without
+            callback is polled. Default: 600
+
+        :param scheduler: The QueueScheduler polling the submissions which
+            timed out. Default: one created for *client* when first needed
+
+        :param keep_completed: Keep the completed submissions for
+            as_completed, even when it is not running. Default: False
+    """
+
+    # Callbacks received before their submission was tracked, kept for
+    # the submissions still being sent.
+    max_early = 10000
+    # Largest callback body accepted, in bytes
+    max_body = 4 * 1024 * 1024
+
+    def __init__(self, client=None, host='0.0.0.0', port=0, public_url=None,
+                 path='/urlquery/callback', token=None, timeout=600,
+                 scheduler=None, keep_completed=False):
+        if client is None:
+            from .api import default_client
+            client = default_client()
+        self.client = client
+        self.host = host
+        self.port = port
+        self.public_url = public_url
+        self.path = path
+        self.token = token if token is not None else secrets.token_urlsafe(16)
+        self.timeout = timeout
+        self.scheduler = scheduler
+        self.received = 0
+        self.polled = 0
+        self._pending = {}
+        self._early = OrderedDict()
+        self._deadlines = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._completed = _Completed(keep_completed)
+        self._closed = False
+        self._httpd = None
+        self._thread = None
+        self._timer = None
+
+    @property
+    def callback_url(self):
+        """
+            URL to give as callback_url to submit and mass_submit.
+
+            Raises ValueError if there is no *public_url* and *host* is not
+            an address uqapi.net can reach.
+        """
+        if self.public_url is not None:
+            url = self.public_url
+        elif self.host in _unreachable_hosts or \
+                self.host.startswith('127.'):
+            raise ValueError('uqapi.net cannot reach {!r}, set public_url '
+                             'to the URL of the receiver'.format(self.host))
+        else:
+            url = 'http://{}:{}{}'.format(self.host, self.port, self.path)
+        return url + '{}token={}'.format('&' if '?' in url else '?',
+                                         self.token)
+
+    @property
+    def pending(self):
+        """
+            Number of submissions not completed yet.
+        """
+        return len(self._pending)
+
+    def start(self):
+        """
+            Starts serving in a background thread.
+        """
+        self._httpd = ThreadingHTTPServer((self.host, self.port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.receiver = self
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever,
+                                        name='urlquery-callbacks')
+        self._thread.daemon = True
+        self._thread.start()
+        self._timer = threading.Thread(target=self._run,
+                                       name='urlquery-callbacks-timeout')
+        self._timer.daemon = True
+        self._timer.start()
+        return self
+
+    def close(self):
+        """
+            Stops the server. Pending submissions are not resolved.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+        if self.scheduler is not None:
+            self.scheduler.close(wait=False)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.close()
+
+    def track(self, queue_id, priority='low', callback=None):
+        """
+            Waits for the callback of a submission.
+
+            :param queue_id: The queue_id, or the QUEUE_STATUS returned by
+                submit, typed or not (its priority is then used).
+
+            :param priority: Priority of the submission, used for polling
+                after a timeout. Default: low
+
+            :param callback: Called with the queue_id and the result once
+                the submission completed.
+
+            :return: A concurrent.futures.Future of the result
+        """
+        if hasattr(queue_id, 'get'):
+            # A QUEUE_STATUS dict, or a models.QueueStatus
+            priority = queue_id.get('priority') or priority
+            queue_id = queue_id.get('queue_id')
+        pending = _Pending(queue_id, priority, callback)
+        with self._condition:
+            if self._closed:
+                raise RuntimeError('The receiver is closed')
+            early = self._early.pop(queue_id, None)
+            if early is None:
+                self._pending[queue_id] = pending
+                heapq.heappush(self._deadlines,
+                               (time.time() + self.timeout,
+                                next(self._counter), queue_id))
+                self._condition.notify()
+        if early is not None:
+            self._resolve(pending, early)
+        return pending.future
+
+    def submit(self, url, **kwargs):
+        """
+            Submits an URL with the callback URL of the receiver, see
+            Client.submit for the parameters.
+
+            :return: A concurrent.futures.Future of the result, already
+                resolved with the error if the submission failed
+        """
+        status = self.client.submit(url, callback_url=self.callback_url,
+                                    typed=False, **kwargs)
+        if _is_error(status):
+            future = Future()
+            future.set_result(status)
+            return future
+        return self.track(status, kwargs.get('priority', 'low'))
+
+    def mass_submit(self, urls, **kwargs):
+        """
+            Submits URLs with the callback URL of the receiver, see
+            Client.mass_submit for the parameters.
+
+            :return: List of concurrent.futures.Future of the results, in
+                the order of the URLs. Those of the URLs which could not be
+                submitted are already resolved with the error.
+        """
+        urls = list(urls)
+        result = self.client.mass_submit(urls, callback_url=self.callback_url,
+                                         typed=False, **kwargs)
+        errors = {}
+        if _is_error(result):
+            errors = dict.fromkeys(range(len(urls)), result)
+            result = []
+        for failure in getattr(result, 'failures', ()):
+            for i in range(failure.start, failure.start + len(failure.urls)):
+                errors[i] = failure.response
+        priority = kwargs.get('priority', 'low')
+        futures = []
+        for i in range(len(urls)):
+            status = result[i] if i < len(result) else None
+            if status is None or not status.get('queue_id'):
+                future = Future()
+                future.set_result(errors.get(i) or
+                                  {'error': 'Unable to submit {}'.format(urls[i])})
+                futures.append(future)
+            else:
+                futures.append(self.track(status, priority))
+        return futures
+
+    def as_completed(self, timeout=None):
+        """
+            Yields (queue_id, result) tuples as the submissions complete,
+            until none is pending. With *keep_completed*, the submissions
+            completed before are yielded first.
+
+            :param timeout: Maximum time in seconds to wait for the next
+                completion. Default: None (no limit)
+        """
+        return self._completed.iterate(lambda: len(self._pending), timeout)
+
+    def _received(self, status):
+        with self._condition:
+            pending = self._pending.pop(status['queue_id'], None)
+            if pending is None:
+                self._early[status['queue_id']] = status
+                while len(self._early) > self.max_early:
+                    self._early.popitem(last=False)
+                return
+            self.received += 1
+        self._resolve(pending, status)
+
+    def _polled(self, queue_id, result):
+        with self._condition:
+            pending = self._pending.pop(queue_id, None)
+            if pending is None:
+                return
+            self.polled += 1
+        self._resolve(pending, result)
+
+    def _resolve(self, pending, result):
+        self._completed.put((pending.queue_id, result))
+        pending.future.set_result(result)
+        if pending.callback is not None:
+            pending.callback(pending.queue_id, result)
+
+    def _run(self):
+        with self._condition:
+            while not self._closed:
+                if not self._deadlines:
+                    self._condition.wait()
+                    continue
+                due = self._deadlines[0][0] - time.time()
+                if due > 0:
+                    self._condition.wait(due)
+                    continue
+                queue_id = heapq.heappop(self._deadlines)[2]
+                pending = self._pending.get(queue_id)
+                if pending is None:
+                    continue
+                if self.scheduler is None:
+                    self.scheduler = QueueScheduler(self.client)
+                # Still pending: a late callback can resolve it first
+                self.scheduler.track(queue_id, pending.priority,
+                                     callback=self._polled)
@@ -0,0 +1,95 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+    Request coalescing ("single flight"): concurrent identical queries share
+    one HTTP request, and all the callers get its response or its error.
+
+    Only the read-only methods are coalesced, never the submissions.
+"""
+
+from concurrent.futures import Future
+import threading
+
+methods = ('report', 'report_list', 'search', 'reputation', 'user_agent_list')
+
+
+class SingleFlight(object):
+    """
+        Runs at most one call per key at a time, for threads.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, function):
+        """
+            Returns function(), or the result of the call with the same key
+            already in flight.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+        if not leader:
+            return call.result()
+        try:
+            result = function()
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class _AsyncCall(object):
+
+    __slots__ = ('task', 'waiters')
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class AsyncSingleFlight(object):
+    """
+        Runs at most one call per key at a time, for asyncio tasks.
+
+        The call runs in a task of its own, so a caller which is cancelled
+        (e.g. by its timeout) does not cancel it for the others. It is only
+        cancelled once nobody waits for it anymore.
+    """
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, function):
+        """
+            Returns await function(), or the result of the call with the
+            same key already in flight.
+        """
+        # Not imported with the module: asyncio is slow to import, and only
+        # needed by the asyncio client which has already imported it.
+        import asyncio
+        call = self._calls.get(key)
+        if call is None:
+            call = self._calls[key] = _AsyncCall(
+                asyncio.ensure_future(function()))
+            call.task.add_done_callback(lambda task: self._forget(key, call))
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if not call.waiters and not call.task.done():
+                self._forget(key, call)
+                call.task.cancel()
+
+    def _forget(self, key, call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
@@ -0,0 +1,148 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+    Memory-bounded "seen before" filters, to suppress duplicates in
+    never-ending streams like the URL feed.
+"""
+
+import hashlib
+import json
+import math
+import struct
+import time
+
+
+class BloomFilter(object):
+    """
+        Bloom filter sized for *capacity* items with a false positive rate
+        of *error_rate*. It never forgets an item, and its memory does not
+        grow: about 1.8 bytes per item for a 0.1% error rate.
+
+        :param capacity: Number of items the filter is sized for.
+            Default: 1000000
+
+        :param error_rate: Probability that a new item is reported as seen
+            once *capacity* items have been added. Default: 0.001
+    """
+
+    def __init__(self, capacity=1000000, error_rate=0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = int(math.ceil(-capacity * math.log(error_rate) /
+                                  math.log(2) ** 2))
+        self.hashes = max(1, int(round(self.size / float(capacity) *
+                                       math.log(2))))
+        self.count = 0
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _indexes(self, item):
+        if not isinstance(item, bytes):
+            item = str(item).encode('utf-8')
+        h1, h2 = struct.unpack('<QQ', hashlib.sha1(item).digest()[:16])
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def __contains__(self, item):
+        bits = self.bits
+        return all(bits[i >> 3] & (1 << (i & 7))
+                   for i in self._indexes(item))
+
+    def add(self, item):
+        """
+            Adds an item, returns True if it was (probably) already there.
+        """
+        bits = self.bits
+        seen = True
+        for i in self._indexes(item):
+            mask = 1 << (i & 7)
+            if not bits[i >> 3] & mask:
+                seen = False
+                bits[i >> 3] |= mask
+        if not seen:
+            self.count += 1
+        return seen
+
+    def clear(self):
+        self.bits = bytearray(len(self.bits))
+        self.count = 0
+
+
+class DecayingBloomFilter(object):
+    """
+        Bloom filter forgetting old items, so it can run forever with a
+        constant memory and error rate.
+
+        Items go to a current generation, which becomes the previous one
+        after *period* seconds or once it holds *capacity* items; the
+        previous generation is then dropped. An item is remembered for at
+        least *period* seconds (unless more than *capacity* items arrive in
+        the meantime), and at most twice that.
+
+        :param capacity: Number of items per generation. Default: 1000000
+
+        :param error_rate: False positive rate of each generation.
+            Default: 0.001
+
+        :param period: Life time in seconds of a generation.
+            Default: 7 days
+    """
+
+    def __init__(self, capacity=1000000, error_rate=0.001,
+                 period=7 * 24 * 3600):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.period = period
+        self.current = BloomFilter(capacity, error_rate)
+        self.previous = BloomFilter(capacity, error_rate)
+        self.started = time.time()
+
+    def _rotate(self):
+        if self.current.count >= self.capacity or \
+                time.time() - self.started >= self.period:
+            self.previous = self.current
+            self.current = BloomFilter(self.capacity, self.error_rate)
+            self.started = time.time()
+
+    def __contains__(self, item):
+        return item in self.current or item in self.previous
+
+    def add(self, item):
+        """
+            Adds an item, returns True if it was (probably) already there.
+        """
+        self._rotate()
+        seen = item in self.previous
+        return self.current.add(item) or seen
+
+    def to_bytes(self):
+        """
+            Serializes the filter: a JSON line with its parameters, then
+            the bits of the current and previous generations.
+        """
+        header = {'capacity': self.capacity, 'error_rate': self.error_rate,
+                  'period': self.period, 'started': self.started,
+                  'counts': [self.current.count, self.previous.count]}
+        return b''.join((json.dumps(header).encode('utf-8'), b'\n',
+                         bytes(self.current.bits), bytes(self.previous.bits)))
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+            Returns the filter serialized by to_bytes. Raises ValueError if
+            *data* is not one.
+        """
+        header, _, bits = bytes(data).partition(b'\n')
+        try:
+            header = json.loads(header.decode('utf-8'))
+            self = cls(header['capacity'], header['error_rate'],
+                       header['period'])
+            self.started = float(header['started'])
+            counts = [int(count) for count in header['counts']]
+        except (KeyError, TypeError, UnicodeDecodeError) as e:
+            raise ValueError('Invalid filter: {}'.format(e))
+        size = len(self.current.bits)
+        if len(counts) != 2 or len(bits) != 2 * size:
+            raise ValueError('Invalid filter: wrong size')
+        self.current.bits = bytearray(bits[:size])
+        self.previous.bits = bytearray(bits[size:])
+        self.current.count, self.previous.count = counts
+        return self
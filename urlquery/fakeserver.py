@@ -0,0 +1,518 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+    Offline stand-in for uqapi.net, speaking the v3 JSON protocol, to
+    develop, test and benchmark against without an API key or network.
+
+    Every method is answered with synthetic data. The data is generated
+    from the parameters of the query and the seed, so the same query always
+    gets the same answer (a report has the same content each time it is
+    fetched, a feed slice the same URLs...). Sizes, latency and error rates
+    can be configured.
+
+    From Python:
+
+        with FakeServer(feed_size=5000, latency=0.05) as server:
+            client = urlquery.Client(base_url=server.url)
+
+    Or standalone:
+
+        python -m urlquery.fakeserver --port 8080 --latency 0.05
+"""
+
+import argparse
+import base64
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.request import Request, urlopen
+import gzip
+import hashlib
+import json
+import random
+import socket
+import sys
+import threading
+import time
+
+_tlds = ['com', 'com', 'com', 'net', 'org', 'lu', 'de', 'fr', 'ru', 'cn',
+         'io', 'info', 'br', 'uk']
+_countries = [('US', 'United States'), ('LU', 'Luxembourg'),
+              ('DE', 'Germany'), ('FR', 'France'), ('RU', 'Russia'),
+              ('CN', 'China'), ('NL', 'Netherlands'), ('GB', 'United Kingdom'),
+              ('BR', 'Brazil'), ('IE', 'Ireland')]
+_words = ['mail', 'bank', 'cdn', 'shop', 'news', 'login', 'static', 'update',
+          'secure', 'media', 'blog', 'api', 'files', 'track', 'ads']
+_user_agents = [
+    'Mozilla/5.0 (Windows NT 6.1; WOW64; rv:24.0) Gecko/20100101 Firefox/24.0',
+    'Mozilla/5.0 (Windows NT 6.1; WOW64) AppleWebKit/537.36 (KHTML, like '
+    'Gecko) Chrome/30.0.1599.101 Safari/537.36',
+    'Mozilla/4.0 (compatible; MSIE 8.0; Windows NT 5.1; Trident/4.0)',
+    'Mozilla/5.0 (compatible; MSIE 10.0; Windows NT 6.2; Trident/6.0)',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 7_0 like Mac OS X) AppleWebKit/537.51'
+    '.1 (KHTML, like Gecko) Version/7.0 Mobile/11A465 Safari/9537.53',
+]
+_png_header = b'\x89PNG\r\n\x1a\n'
+
+
+def _date(timestamp):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(timestamp))
+
+
+class _Data(object):
+    """
+        Synthetic data generator. All the objects are derived from the seed
+        and an identifier.
+    """
+
+    def __init__(self, seed, domains, report_interval, screenshot_size):
+        self.seed = seed
+        self.report_interval = report_interval
+        self.screenshot_size = screenshot_size
+        rng = self._random('domains')
+        self.domains = []
+        for i in range(domains):
+            tld = rng.choice(_tlds)
+            cc, country = rng.choice(_countries)
+            asn = rng.randint(1000, 65000)
+            self.domains.append({
+                'domain': '{}{}.{}'.format(rng.choice(_words), i, tld),
+                'tld': tld,
+                'ip': {'addr': '{}.{}.{}.{}'.format(rng.randint(1, 223),
+                                                    rng.randint(0, 255),
+                                                    rng.randint(0, 255),
+                                                    rng.randint(1, 254)),
+                       'cc': cc, 'country': country, 'asn': asn,
+                       'as': 'AS{} {} Hosting'.format(asn, country)}})
+
+    def _random(self, *ids):
+        return random.Random(':'.join(str(i) for i in (self.seed,) + ids))
+
+    def url(self, rng):
+        d = rng.choice(self.domains)
+        fqdn = d['domain']
+        if rng.random() < 0.7:
+            fqdn = '{}.{}'.format(rng.choice(_words), fqdn)
+        path = '/'.join(rng.choice(_words) for _ in range(rng.randint(0, 3)))
+        return {'addr': '{}/{}'.format(fqdn, path), 'fqdn': fqdn,
+                'domain': d['domain'], 'tld': d['tld'], 'ip': dict(d['ip'])}
+
+    def feed(self, start, count):
+        rng = self._random('feed', start)
+        return [self.url(rng) for _ in range(count)]
+
+    def settings(self, rng, query=None):
+        query = query or {}
+        return {'useragent': query.get('useragent') or rng.choice(_user_agents),
+                'referer': query.get('referer', ''),
+                'pool': rng.choice(['tor', 'vpn', 'default']),
+                'access_level': query.get('access_level', 'public')}
+
+    def _blob(self, rng, size):
+        size = max(0, size - len(_png_header))
+        data = _png_header
+        if size:
+            data += rng.getrandbits(8 * size).to_bytes(size, 'little')
+        return {'base64_data': base64.b64encode(data).decode('ascii'),
+                'media_type': 'image/png'}
+
+    def report_time(self, report_id):
+        return int(report_id) * self.report_interval
+
+    def report_url(self, report_id):
+        """
+            The URL of a report, without generating the rest of it.
+        """
+        rng = self._random('report', report_id)
+        rng.random()
+        return self.url(rng)
+
+    def report(self, report_id, query=None):
+        query = query or {}
+        rng = self._random('report', report_id)
+        alerted = rng.random() < 0.2
+        report = {'report_id': str(report_id),
+                  'date': _date(self.report_time(report_id)),
+                  'url': self.url(rng), 'settings': self.settings(rng),
+                  'urlquery_alert_count': rng.randint(1, 5) if alerted else 0,
+                  'ids_alert_count': rng.randint(0, 3) if alerted else 0,
+                  'blacklist_alert_count': rng.randint(0, 2) if alerted else 0}
+        if query.get('include_details'):
+            report['javascript'] = [
+                {'sha256': hashlib.sha256(
+                    '{}'.format(rng.randint(0, 5000)).encode('ascii')).hexdigest(),
+                 'url': 'http://{}/{}.js'.format(report['url']['fqdn'],
+                                                 rng.choice(_words)),
+                 'size': rng.randint(100, 100000)}
+                for _ in range(rng.randint(0, 5))]
+            report['urlquery_alerts'] = [
+                {'alert': 'Suspicious {} detected'.format(rng.choice(_words))}
+                for _ in range(report['urlquery_alert_count'])]
+            report['ids_alerts'] = [
+                {'alert': 'ET POLICY {}'.format(rng.choice(_words)),
+                 'severity': rng.randint(1, 3)}
+                for _ in range(report['ids_alert_count'])]
+            report['transactions'] = [
+                {'url': self.url(rng), 'status': rng.choice([200, 302, 404]),
+                 'content_type': rng.choice(['text/html', 'image/png',
+                                             'application/javascript'])}
+                for _ in range(rng.randint(1, 20))]
+            recent = int(query.get('recent_limit') or 0)
+            report['recent'] = [
+                {'report_id': str(int(report_id) - i - 1),
+                 'date': _date(self.report_time(int(report_id) - i - 1))}
+                for i in range(recent)]
+        if query.get('include_screenshot'):
+            report['screenshot'] = self._blob(rng, self.screenshot_size)
+        if query.get('include_domain_graph'):
+            report['domain_graph'] = self._blob(rng, self.screenshot_size // 4)
+        return report
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        # The headers and the body are written separately: without this,
+        # Nagle's algorithm and delayed ACKs add 40ms to each response.
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server.fake
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        try:
+            query = json.loads(body.decode('utf-8'))
+            method = query['method']
+        except Exception:
+            query, method = {}, None
+        server._count(method)
+        latency = server.latency
+        if isinstance(latency, (tuple, list)):
+            latency = server._rng.uniform(*latency)
+        if latency:
+            time.sleep(latency)
+        status = 200
+        if server._rng.random() < server.throttle_rate:
+            status = 429
+            response = _error('Rate limit exceeded')
+        elif server._rng.random() < server.error_rate:
+            response = _error('Internal error')
+        else:
+            response = server.answer(method, query)
+        data = json.dumps(response).encode('utf-8')
+        if query.get('gzip'):
+            data = gzip.compress(data, 6)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def _error(message):
+    return {'_response_': {'status': 'error', 'error': message}}
+
+
+def _ok(response):
+    response['_response_'] = {'status': 'ok'}
+    return response
+
+
+class FakeServer(object):
+    """
+        Threaded HTTP server answering the API methods with synthetic data.
+
+        :param host: Address to listen on. Default: 127.0.0.1
+
+        :param port: Port to listen on, 0 for any free port. Default: 0
+
+        :param feed_size: Number of URLs in an hour slice of the feed (a day
+            slice has 24 times more). Default: 1000
+
+        :param report_interval: Time in seconds between two reports. The
+            reports are numbered by their creation time: report N was
+            created at N * report_interval. Default: 10
+
+        :param domains: Number of distinct domains the URLs are drawn from.
+            Default: 500
+
+        :param screenshot_size: Size in bytes of the screenshots (the
+            domain graphs are 4 times smaller). Default: 65536
+
+        :param processing_time: Time in seconds before a submitted URL is
+            done. Default: 0
+
+        :param latency: Time in seconds added to every response, or a
+            (min, max) tuple for a uniformly random latency. Default: 0
+
+        :param error_rate: Fraction of the requests answered with a
+            RESPONSE error. Default: 0
+
+        :param throttle_rate: Fraction of the requests answered with an
+            HTTP 429 and a rate limit error. Default: 0
+
+        :param callback_rate: Fraction of the submissions with a
+            callback_url whose QUEUE_STATUS is POSTed to it once done.
+            Default: 1
+
+        :param seed: Seed of the synthetic data. Default: 0
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, feed_size=1000,
+                 report_interval=10, domains=500, screenshot_size=65536,
+                 processing_time=0, latency=0, error_rate=0, throttle_rate=0,
+                 callback_rate=1, seed=0):
+        self.host = host
+        self.port = port
+        self.feed_size = feed_size
+        self.processing_time = processing_time
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.callback_rate = callback_rate
+        self.callbacks = 0
+        self.data = _Data(seed, domains, report_interval, screenshot_size)
+        self.requests = {}
+        self._rng = random.Random(seed)
+        self._queue = {}
+        self._lock = threading.Lock()
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def url(self):
+        """
+            URL to give as base_url to the clients.
+        """
+        return 'http://{}:{}/v3/json'.format(self.host, self.port)
+
+    def start(self):
+        """
+            Starts serving in a background thread.
+        """
+        self._httpd = ThreadingHTTPServer((self.host, self.port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.fake = self
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def join(self):
+        """
+            Blocks until the server is stopped.
+        """
+        if self._thread is not None:
+            self._thread.join()
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _count(self, method):
+        with self._lock:
+            self.requests[method] = self.requests.get(method, 0) + 1
+
+    def answer(self, method, query):
+        """
+            Returns the response to a decoded query.
+        """
+        handler = getattr(self, '_' + str(method), None)
+        if handler is None or method.startswith('_'):
+            return _error('Unknown method: {}'.format(method))
+        try:
+            return _ok(handler(query))
+        except Exception as e:
+            return _error('Invalid query: {}'.format(e))
+
+    # Methods
+
+    def _urlfeed(self, query):
+        size = 3600 if query.get('interval', 'hour') == 'hour' else 86400
+        timestamp = int(float(query.get('timestamp') or time.time()))
+        start = timestamp - timestamp % size
+        count = self.feed_size * size // 3600
+        if query.get('feed') == 'flagged':
+            count //= 10
+        return {'start_time': _date(start), 'end_time': _date(start + size - 1),
+                'feed': self.data.feed('{}:{}'.format(query.get('feed'), start),
+                                       count)}
+
+    def _enqueue(self, query, url):
+        with self._lock:
+            queue_id = '{:x}{:04x}'.format(int(time.time() * 1000),
+                                           len(self._queue) % 65536)
+            self._queue[queue_id] = (time.time(), url, query)
+        return self._status(queue_id)
+
+    def _status(self, queue_id):
+        with self._lock:
+            entry = self._queue.get(queue_id)
+        if entry is None:
+            raise ValueError('unknown queue_id {}'.format(queue_id))
+        submitted, url, query = entry
+        rng = self.data._random('queue', queue_id)
+        fqdn = url.split('://')[-1].split('/')[0]
+        status = {'queue_id': queue_id,
+                  'priority': query.get('priority', 'low'),
+                  'url': {'addr': url, 'fqdn': fqdn,
+                          'domain': '.'.join(fqdn.split('.')[-2:]),
+                          'tld': fqdn.split('.')[-1],
+                          'ip': dict(rng.choice(self.data.domains)['ip'])},
+                  'settings': self.data.settings(rng, query)}
+        elapsed = time.time() - submitted
+        if elapsed >= self.processing_time:
+            status['status'] = 'done'
+            status['report_id'] = str(int(submitted // self.data.report_interval))
+        elif elapsed >= self.processing_time / 2.:
+            status['status'] = 'processing'
+        else:
+            status['status'] = 'queued'
+        return status
+
+    def _callback_later(self, query, statuses):
+        """
+            POSTs the QUEUE_STATUS of the submissions to their callback_url
+            once they are done.
+        """
+        url = query.get('callback_url')
+        with self._lock:
+            queue_ids = [status['queue_id'] for status in statuses
+                         if self._rng.random() < self.callback_rate]
+        if not url or not queue_ids:
+            return
+        timer = threading.Timer(self.processing_time, self._post_callbacks,
+                                (url, queue_ids))
+        timer.daemon = True
+        timer.start()
+
+    def _post_callbacks(self, url, queue_ids):
+        for queue_id in queue_ids:
+            data = json.dumps(_ok(self._status(queue_id))).encode('utf-8')
+            try:
+                urlopen(Request(url, data,
+                                {'Content-Type': 'application/json'}),
+                        timeout=10).close()
+            except Exception:
+                continue
+            with self._lock:
+                self.callbacks += 1
+
+    def _submit(self, query):
+        status = self._enqueue(query, query['url'])
+        self._callback_later(query, [status])
+        return status
+
+    def _mass_submit(self, query):
+        statuses = [self._enqueue(query, url) for url in query['urls']]
+        self._callback_later(query, statuses)
+        return {'queue_status': statuses}
+
+    def _queue_status(self, query):
+        return self._status(query['queue_id'])
+
+    def _user_agent_list(self, query):
+        return {'user_agents': list(_user_agents)}
+
+    def _report(self, query):
+        report_id = int(query['report_id'])
+        if self.data.report_time(report_id) > time.time():
+            raise ValueError('unknown report_id {}'.format(report_id))
+        return self.data.report(report_id, query)
+
+    def _report_ids(self, timestamp, limit):
+        """
+            IDs of the *limit* reports created from *timestamp*, or of the
+            latest reports if there are not enough.
+        """
+        interval = self.data.report_interval
+        last = int(time.time() // interval)
+        first = -(-int(float(timestamp)) // interval)
+        first = max(0, min(first, last - limit + 1))
+        return range(first, min(first + limit, last + 1))
+
+    def _report_list(self, query):
+        ids = self._report_ids(query.get('timestamp') or time.time(),
+                               int(query.get('limit', 50)))
+        return {'reports': [self.data.report(i) for i in ids]}
+
+    def _search(self, query):
+        q = str(query['q']).lower()
+        interval = self.data.report_interval
+        # At most 50 results, newest first, from the reports of the day
+        # up to *from*
+        last = int(time.time() // interval)
+        first = min(last, int(float(query.get('from') or time.time())) //
+                    interval)
+        reports = []
+        for report_id in range(first, max(-1, first - 86400 // interval), -1):
+            url = self.data.report_url(report_id)
+            if q in url['addr'].lower() or q == url['ip']['addr']:
+                reports.append(self.data.report(report_id))
+                if len(reports) >= 50:
+                    break
+        if query.get('result_type') == 'url_list':
+            return {'url_list': [report['url'] for report in reports]}
+        return {'reports': reports}
+
+    def _reputation(self, query):
+        q = str(query['q']).lower()
+        rng = self.data._random('reputation', q)
+        entries = []
+        if rng.random() < 0.3:
+            for _ in range(rng.randint(1, 5)):
+                url = self.data.url(rng)
+                url['fqdn'] = q if not q[0].isdigit() else url['fqdn']
+                entries.append({'url': url, 'date': _date(
+                    time.time() - rng.randint(0, 30 * 86400)),
+                    'alert': 'Suspicious {} detected'.format(
+                        rng.choice(_words))})
+        return {'reputation': entries}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline stand-in for uqapi.net.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--feed-size', type=int, default=1000)
+    parser.add_argument('--report-interval', type=int, default=10)
+    parser.add_argument('--screenshot-size', type=int, default=65536)
+    parser.add_argument('--processing-time', type=float, default=0)
+    parser.add_argument('--latency', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--throttle-rate', type=float, default=0)
+    parser.add_argument('--callback-rate', type=float, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    server = FakeServer(args.host, args.port, args.feed_size,
+                        args.report_interval,
+                        screenshot_size=args.screenshot_size,
+                        processing_time=args.processing_time,
+                        latency=args.latency, error_rate=args.error_rate,
+                        throttle_rate=args.throttle_rate,
+                        callback_rate=args.callback_rate, seed=args.seed)
+    server.start()
+    print('Serving on {}'.format(server.url))
+    sys.stdout.flush()
+    try:
+        server.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+    Columnar, indexed container for the URL objects of a urlfeed slice, to
+    evaluate many filters (watchlists) over the same slice cheaply.
+
+    The feed is walked once: the strings are dictionary-encoded into integer
+    columns, the ASNs go to an integer array, and hash indexes (value ->
+    rows), a domain suffix index and sorted IP arrays are built from them.
+    A query is then a few index lookups, whatever the size of the slice,
+    and returns the original URL objects.
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+import ipaddress
+
+# Columns of strings, dictionary-encoded, and how to read them from a URL
+_string_columns = (
+    ('tld', lambda url, ip: url.get('tld')),
+    ('domain', lambda url, ip: url.get('domain')),
+    ('fqdn', lambda url, ip: url.get('fqdn')),
+    ('cc', lambda url, ip: ip.get('cc')),
+    ('country', lambda url, ip: ip.get('country')),
+)
+
+predicates = ('tld', 'domain', 'fqdn', 'cc', 'country', 'asn',
+              'domain_suffix', 'ip_prefix')
+
+
+def _normalize(name, value):
+    if value is None:
+        return None
+    if name in ('tld', 'domain', 'fqdn', 'domain_suffix'):
+        return value.lower().strip('.')
+    if name == 'cc':
+        return value.upper()
+    return value
+
+
+class FeedIndex(object):
+    """
+        Index over the URL objects of a feed.
+
+        :param feed: A urlfeed response, or any iterable of URL objects
+            (dicts or urlquery.models.URL). Entries which are not URL
+            objects are ignored.
+
+        The predicates usable in select and match_many are:
+
+            * *tld*, *domain*, *fqdn*, *cc*, *country*: exact match
+                (case-insensitive for names and country codes)
+            * *asn*: AS number
+            * *domain_suffix*: the fqdn is the suffix or a subdomain of it,
+                e.g. "example.lu" matches "www.example.lu"
+            * *ip_prefix*: the IP address is in the network, e.g.
+                "192.0.2.0/24" or "2001:db8::/32"
+
+        Each predicate takes a value or a list of values (any of them).
+    """
+
+    def __init__(self, feed):
+        if isinstance(feed, dict):
+            feed = feed.get('feed') or []
+        self.urls = []
+        self.dictionaries = dict((name, []) for name, _ in _string_columns)
+        self.columns = dict((name, array('i')) for name, _ in _string_columns)
+        self.columns['asn'] = array('l')
+        codes = dict((name, {}) for name, _ in _string_columns)
+        for url in feed:
+            if not hasattr(url, 'get'):
+                continue
+            ip = url.get('ip') or {}
+            for name, read in _string_columns:
+                value = _normalize(name, read(url, ip))
+                code = codes[name].get(value)
+                if code is None:
+                    code = codes[name][value] = len(self.dictionaries[name])
+                    self.dictionaries[name].append(value)
+                self.columns[name].append(code)
+            asn = ip.get('asn')
+            self.columns['asn'].append(asn if isinstance(asn, int) else -1)
+            self.urls.append(url)
+        self._codes = codes
+        self._build_indexes()
+
+    def __len__(self):
+        return len(self.urls)
+
+    def _build_indexes(self):
+        # value code -> rows, per string column
+        self._indexes = {}
+        for name, _ in _string_columns:
+            index = {}
+            for row, code in enumerate(self.columns[name]):
+                rows = index.get(code)
+                if rows is None:
+                    rows = index[code] = array('i')
+                rows.append(row)
+            self._indexes[name] = index
+        asns = {}
+        for row, asn in enumerate(self.columns['asn']):
+            asns.setdefault(asn, array('i')).append(row)
+        self._indexes['asn'] = asns
+        # Every suffix of every fqdn (on label boundaries) -> fqdn codes
+        suffixes = {}
+        for code, fqdn in enumerate(self.dictionaries['fqdn']):
+            if not fqdn:
+                continue
+            labels = fqdn.split('.')
+            for i in range(len(labels)):
+                suffixes.setdefault('.'.join(labels[i:]), []).append(code)
+        self._suffixes = suffixes
+        # Sorted (address, row) arrays per IP version
+        ips = {4: [], 6: []}
+        for row, url in enumerate(self.urls):
+            try:
+                address = ipaddress.ip_address(
+                    str((url.get('ip') or {}).get('addr')))
+            except ValueError:
+                continue
+            ips[address.version].append((int(address), row))
+        self._ips = {}
+        for version, pairs in ips.items():
+            pairs.sort()
+            self._ips[version] = ([address for address, _ in pairs],
+                                  array('i', [row for _, row in pairs]))
+
+    def _rows(self, name, value):
+        """
+            Returns the set of rows matching one predicate value.
+        """
+        if name in self._codes:
+            code = self._codes[name].get(_normalize(name, value))
+            return set(self._indexes[name].get(code, ()))
+        if name == 'asn':
+            return set(self._indexes['asn'].get(int(value), ()))
+        if name == 'domain_suffix':
+            rows = set()
+            fqdn_index = self._indexes['fqdn']
+            for code in self._suffixes.get(_normalize(name, value), ()):
+                rows.update(fqdn_index[code])
+            return rows
+        if name == 'ip_prefix':
+            network = ipaddress.ip_network(str(value), strict=False)
+            addresses, rows = self._ips[network.version]
+            start = bisect_left(addresses, int(network.network_address))
+            end = bisect_right(addresses, int(network.broadcast_address))
+            return set(rows[start:end])
+        raise ValueError('Predicate can only be in ' + ', '.join(predicates))
+
+    def rows(self, match='any', **conditions):
+        """
+            Returns the sorted list of the rows matching the predicates.
+
+            :param match: *any* to match any of the predicates (default),
+                *all* to match all of them.
+        """
+        result = None
+        for name, values in conditions.items():
+            if isinstance(values, (str, int)):
+                values = [values]
+            rows = set()
+            for value in values:
+                rows |= self._rows(name, value)
+            if result is None:
+                result = rows
+            elif match == 'all':
+                result &= rows
+            else:
+                result |= rows
+        return sorted(result or ())
+
+    def select(self, match='any', **conditions):
+        """
+            Returns the URL objects matching the predicates, in feed order.
+            See rows.
+        """
+        return [self.urls[row] for row in self.rows(match, **conditions)]
+
+    def match_many(self, watchlists, match='any'):
+        """
+            Evaluates many watchlists over the slice.
+
+            :param watchlists: Dict of name -> dict of predicates
+
+            :return: Dict of name -> list of matching URL objects
+        """
+        return dict((name, self.select(match, **conditions))
+                    for name, conditions in watchlists.items())
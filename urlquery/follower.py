@@ -0,0 +1,212 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+    Following the URL feed slice after slice.
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import time
+
+from .cache import _is_error
+from .dedup import DecayingBloomFilter
+from .models import URL
+
+_slice_sizes = {'hour': 3600, 'day': 24 * 3600}
+
+
+class FeedFollower(object):
+    """
+        Iterates over the URL feed forever, slice after slice.
+
+        The position is saved in a checkpoint file after each slice, so a
+        restarted follower starts again from the first slice it did not
+        finish. The slices missed while it was stopped are fetched
+        concurrently, then the follower waits for each new slice to be
+        complete before fetching it.
+
+        URLs already seen are suppressed by a DecayingBloomFilter, saved
+        along with the checkpoint, so the memory used does not grow.
+
+        :param client: The Client used. Default: the default client
+
+        :param checkpoint: Path of the checkpoint file. Default: None (the
+            position is not saved)
+
+        :param feed: See urlfeed. Default: unfiltered
+
+        :param interval: See urlfeed. Default: hour
+
+        :param start: Unix timestamp to start from when there is no
+            checkpoint. Default: the last complete slice
+
+        :param dedup: Object with an add(key) method returning True for
+            the keys already seen, or None to not suppress duplicates.
+            Default: True, a DecayingBloomFilter remembering URLs for a
+            week
+
+        :param key: Function returning the deduplication key of a URL
+            object. Default: its "addr"
+
+        :param max_workers: Number of slices fetched at the same time when
+            catching up. Default: 4
+
+        :param delay: Time in seconds to wait after the end of a slice
+            before fetching it. Default: 300
+
+        :param retry_interval: Time in seconds to wait before fetching again
+            a slice which failed. Default: 60
+
+        :param typed: Yield urlquery.models.URL objects instead of dicts.
+            The deduplication key is still computed on the dicts.
+            Default: None (the setting of the client)
+    """
+
+    def __init__(self, client=None, checkpoint=None, feed='unfiltered',
+                 interval='hour', start=None, dedup=True, key=None,
+                 max_workers=4, delay=300, retry_interval=60, typed=None):
+        if client is None:
+            from .api import default_client
+            client = default_client()
+        self.client = client
+        self.checkpoint = checkpoint
+        self.feed = feed
+        self.interval = interval
+        self.slice_size = _slice_sizes[interval]
+        self.key = key if key is not None else (lambda url: url.get('addr'))
+        self.max_workers = max_workers
+        self.delay = delay
+        self.retry_interval = retry_interval
+        self.typed = client.typed if typed is None else typed
+        self.next_slice = None
+        self.dedup = dedup
+        if checkpoint is not None:
+            self._load()
+        if self.dedup is True:
+            self.dedup = DecayingBloomFilter()
+        if self.next_slice is None:
+            if start is None:
+                start = time.time() - self.delay - self.slice_size
+            self.next_slice = self._slice_start(start)
+
+    def _slice_start(self, timestamp):
+        return int(timestamp) - int(timestamp) % self.slice_size
+
+    def _load(self):
+        try:
+            with open(self.checkpoint) as f:
+                state = json.load(f)
+        except (IOError, OSError, ValueError):
+            return
+        if state.get('feed') == self.feed and \
+                state.get('interval') == self.interval:
+            self.next_slice = state['next_slice']
+        if self.dedup is True and os.path.exists(self.checkpoint + '.dedup'):
+            try:
+                with open(self.checkpoint + '.dedup', 'rb') as f:
+                    self.dedup = DecayingBloomFilter.from_bytes(f.read())
+            except (IOError, OSError, ValueError):
+                # Starts with an empty filter
+                pass
+
+    def save(self):
+        """
+            Writes the checkpoint (and the deduplication filter) to disk.
+        """
+        if self.checkpoint is None:
+            return
+        state = {'feed': self.feed, 'interval': self.interval,
+                 'next_slice': self.next_slice}
+        _write_atomic(self.checkpoint, json.dumps(state).encode('utf-8'))
+        if isinstance(self.dedup, DecayingBloomFilter):
+            _write_atomic(self.checkpoint + '.dedup', self.dedup.to_bytes())
+
+    def fetch(self, slice_start):
+        """
+            Returns the urlfeed response of the slice starting at
+            *slice_start*.
+        """
+        # Any time within the slice selects it, the middle is the safest
+        middle = slice_start + self.slice_size // 2
+        try:
+            # Wrapped once deduplicated, see _new_urls
+            return self.client.urlfeed(self.feed, self.interval, middle,
+                                       typed=False)
+        except Exception as e:
+            return {'error': 'Unable to fetch slice {}: {}'.format(slice_start, e)}
+
+    def _complete_slices(self):
+        last = self._slice_start(time.time() - self.delay) - self.slice_size
+        return list(range(self.next_slice, last + 1, self.slice_size))
+
+    def _fetch_all(self, slices):
+        # At most max_workers slices fetched ahead of the one consumed, so
+        # a long backlog does not pile up in memory
+        in_flight = deque()
+        slices = iter(slices)
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            while True:
+                for slice_start in slices:
+                    in_flight.append((slice_start,
+                                      executor.submit(self.fetch, slice_start)))
+                    if len(in_flight) >= self.max_workers:
+                        break
+                if not in_flight:
+                    return
+                slice_start, future = in_flight.popleft()
+                yield slice_start, future.result()
+        finally:
+            # Stopped early (error or consumer gone): drop the rest
+            for _, future in in_flight:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def _new_urls(self, response):
+        for url in response.get('feed') or []:
+            if not isinstance(url, dict):
+                continue
+            if self.dedup is not None and self.dedup.add(self.key(url)):
+                continue
+            yield URL.from_dict(url) if self.typed else url
+
+    def catch_up(self):
+        """
+            Yields the new URLs of the complete slices not fetched yet, and
+            returns. Stops at the first slice which cannot be fetched.
+        """
+        fetched = self._fetch_all(self._complete_slices())
+        try:
+            for slice_start, response in fetched:
+                if _is_error(response):
+                    return
+                for url in self._new_urls(response):
+                    yield url
+                self.next_slice = slice_start + self.slice_size
+                self.save()
+        finally:
+            fetched.close()
+
+    def __iter__(self):
+        """
+            Yields the new URLs forever.
+        """
+        while True:
+            for url in self.catch_up():
+                yield url
+            ready = self.next_slice + self.slice_size + self.delay
+            now = time.time()
+            if ready > now:
+                time.sleep(ready - now)
+            elif self._complete_slices():
+                # The next slice is available but could not be fetched
+                time.sleep(self.retry_interval)
+
+
+def _write_atomic(path, data):
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
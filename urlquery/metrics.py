@@ -0,0 +1,276 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+    Per-method metrics of the requests sent by a client.
+
+    Give a Metrics object to a client (metrics=...) and it records, for each
+    API method: the number of calls and of requests actually sent (calls
+    answered by the cache or coalesced with another one send nothing), the
+    latency of the requests split into phases, the bytes sent and received,
+    and the errors.
+
+    The phases of a request are:
+
+        * *serialize*: JSON encoding (and gzip compression) of the query
+        * *network*: from sending the query to the end of the body
+        * *decode*: JSON decoding of the body
+        * *total*: the whole request, rate limiter wait included
+
+    The metrics can be read as a dict (snapshot), rendered in the
+    Prometheus text format (to_prometheus), or forwarded to sinks: any
+    object with a record(event) method, called after each request.
+"""
+
+from bisect import bisect_left
+import logging
+import threading
+
+default_buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1, 2.5, 5, 10, 30, 60)
+phases = ('serialize', 'network', 'decode', 'total')
+
+
+# Bounded labels of the RESPONSE errors, the first word found in the
+# message (lowercased) wins. The messages themselves, which contain IDs,
+# URLs..., would make one time series each.
+response_errors = (
+    ('rate limit', 'rate_limited'),
+    ('throttl', 'rate_limited'),
+    ('key', 'access_denied'),
+    ('permission', 'access_denied'),
+    ('access', 'access_denied'),
+    ('unknown', 'not_found'),
+    ('not found', 'not_found'),
+    ('invalid', 'invalid_query'),
+    ('internal', 'internal_error'),
+)
+
+
+def error_details(status_code, response, exception=None):
+    """
+        Returns the (label, message) of the error of a request, (None,
+        None) if it succeeded. The label is the name of the exception
+        raised, the HTTP status if it is an error, or for an error in the
+        RESPONSE object, one of the labels of *response_errors* ('error'
+        if none matches). The message is the text of the error.
+    """
+    if exception is not None:
+        return type(exception).__name__, str(exception)
+    if status_code is not None and status_code >= 400:
+        label = 'HTTP {}'.format(status_code)
+        return label, label
+    if isinstance(response, dict):
+        status = response.get('_response_')
+        if isinstance(status, dict) and status.get('status') == 'error':
+            message = str(status.get('error') or 'error')
+            lowered = message.lower()
+            for word, label in response_errors:
+                if word in lowered:
+                    return label, message
+            return 'error', message
+    return None, None
+
+
+def error_label(status_code, response, exception=None):
+    """
+        Returns the label of the error of a request, None if it succeeded.
+        See error_details.
+    """
+    return error_details(status_code, response, exception)[0]
+
+
+class Histogram(object):
+    """
+        Cumulative histogram, as defined by Prometheus: the count of the
+        values lower or equal to each bucket bound, their sum and count.
+    """
+
+    def __init__(self, buckets=default_buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self):
+        cumulative = []
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            cumulative.append((bound, total))
+        return {'buckets': cumulative, 'sum': self.sum, 'count': self.count}
+
+
+class _MethodMetrics(object):
+
+    def __init__(self, buckets):
+        self.calls = 0
+        self.requests = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.errors = {}
+        self.latency = dict((phase, Histogram(buckets)) for phase in phases)
+
+    def snapshot(self):
+        return {'calls': self.calls, 'requests': self.requests,
+                'request_bytes': self.request_bytes,
+                'response_bytes': self.response_bytes,
+                'errors': dict(self.errors),
+                'latency': dict((phase, h.snapshot())
+                                for phase, h in self.latency.items())}
+
+
+class Metrics(object):
+    """
+        Thread-safe store of the metrics of one or more clients.
+
+        :param buckets: Upper bounds in seconds of the latency histogram
+            buckets. Default: 1ms to 60s
+
+        :param sinks: Objects with a record(event) method, given every
+            request event. See record. Default: None
+    """
+
+    def __init__(self, buckets=default_buckets, sinks=None):
+        self.buckets = tuple(buckets)
+        self.sinks = list(sinks or [])
+        self._methods = {}
+        self._lock = threading.Lock()
+
+    def _get(self, method):
+        metrics = self._methods.get(method)
+        if metrics is None:
+            metrics = self._methods[method] = _MethodMetrics(self.buckets)
+        return metrics
+
+    def call(self, method):
+        """
+            Counts a call to *method*, whether it sends a request or not.
+        """
+        with self._lock:
+            self._get(method).calls += 1
+
+    def record(self, event):
+        """
+            Records a request. *event* is a dict with the keys:
+
+                * *method*: the API method
+                * *serialize*, *network*, *decode*, *total*: the duration
+                    of the phases in seconds, None if not reached
+                * *request_bytes*, *response_bytes*: sizes on the wire
+                * *status_code*: the HTTP status, None if there is none
+                * *error*: None, or the label of the error (error_label)
+                * *error_message*: None, or the text of the error, only
+                    passed to the sinks
+
+            The event is then passed to the sinks.
+        """
+        with self._lock:
+            metrics = self._get(event['method'])
+            metrics.requests += 1
+            metrics.request_bytes += event.get('request_bytes') or 0
+            metrics.response_bytes += event.get('response_bytes') or 0
+            error = event.get('error')
+            if error is not None:
+                metrics.errors[error] = metrics.errors.get(error, 0) + 1
+            for phase in phases:
+                if event.get(phase) is not None:
+                    metrics.latency[phase].observe(event[phase])
+        for sink in self.sinks:
+            sink.record(event)
+
+    def snapshot(self):
+        """
+            Returns the metrics as a dict of method -> dict of calls,
+            requests, request_bytes, response_bytes, errors (dict of
+            error label -> count) and latency (dict of phase -> histogram
+            with cumulative *buckets* (bound, count), *sum* and *count*).
+        """
+        with self._lock:
+            return dict((method, metrics.snapshot())
+                        for method, metrics in self._methods.items())
+
+    def reset(self):
+        with self._lock:
+            self._methods = {}
+
+    def to_prometheus(self, prefix='urlquery'):
+        """
+            Returns the metrics in the Prometheus text exposition format.
+        """
+        snapshot = self.snapshot()
+        lines = []
+
+        def metric(name, kind, description, samples):
+            lines.append('# HELP {}_{} {}'.format(prefix, name, description))
+            lines.append('# TYPE {}_{} {}'.format(prefix, name, kind))
+            for suffix, labels, value in samples:
+                lines.append('{}_{}{}{{{}}} {}'.format(
+                    prefix, name, suffix, ','.join(
+                        '{}="{}"'.format(label, _escape(v))
+                        for label, v in labels), _format(value)))
+
+        for name, description in (
+                ('calls', 'Calls to the API methods.'),
+                ('requests', 'Requests sent to the API.'),
+                ('request_bytes', 'Bytes sent to the API.'),
+                ('response_bytes', 'Bytes received from the API.')):
+            metric(name + '_total', 'counter', description,
+                   [('', [('method', method)], m[name])
+                    for method, m in sorted(snapshot.items())])
+        metric('errors_total', 'counter', 'Failed requests, by error.',
+               [('', [('method', method), ('error', error)], count)
+                for method, m in sorted(snapshot.items())
+                for error, count in sorted(m['errors'].items())])
+        samples = []
+        for method, m in sorted(snapshot.items()):
+            for phase in phases:
+                histogram = m['latency'][phase]
+                labels = [('method', method), ('phase', phase)]
+                for bound, count in histogram['buckets']:
+                    samples.append(('_bucket', labels + [('le', bound)],
+                                    count))
+                samples.append(('_sum', labels, histogram['sum']))
+                samples.append(('_count', labels, histogram['count']))
+        metric('request_duration_seconds', 'histogram',
+               'Duration of the phases of the requests.', samples)
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    if isinstance(value, float):
+        return _format(value)
+    return str(value).replace('\\', r'\\').replace('"', r'\"') \
+        .replace('\n', r'\n')
+
+
+def _format(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class LoggingSink(object):
+    """
+        Sink logging every request event.
+
+        :param logger: Logger to use. Default: the "urlquery" logger
+
+        :param level: Level of the messages. Default: DEBUG
+    """
+
+    def __init__(self, logger=None, level=logging.DEBUG):
+        self.logger = logger or logging.getLogger('urlquery')
+        self.level = level
+
+    def record(self, event):
+        self.logger.log(self.level, '%s: %s in %.3fs, %s bytes sent, %s '
+                        'received', event['method'],
+                        event.get('error_message') or event.get('error') or
+                        'ok', event.get('total') or 0,
+                        event.get('request_bytes'),
+                        event.get('response_bytes'))
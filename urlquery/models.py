@@ -0,0 +1,307 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+    Typed, compact versions of the objects returned by the API (see
+    README): URL, IP, Settings, BinBlob, QueueStatus and Report.
+
+    They use __slots__ and intern the strings repeated across many objects
+    (country codes, AS names, TLDs...), so a big feed or a report archive
+    takes a fraction of the memory of the same data as dicts. The nested
+    sections of a report are only converted when accessed.
+
+    Pass typed=True to a Client, or to a single call, to get them instead
+    of dicts. to_dict() converts them back.
+"""
+
+import binascii
+import re
+import sys
+
+from .cache import _is_error
+
+_intern = sys.intern
+_unset = object()
+_whitespace = re.compile(r'\s')
+_whitespace_bytes = re.compile(br'\s')
+
+
+def _has_whitespace(encoded):
+    if isinstance(encoded, str):
+        return _whitespace.search(encoded) is not None
+    return _whitespace_bytes.search(encoded) is not None
+
+
+def _interned(value):
+    if isinstance(value, str):
+        return _intern(value)
+    return value
+
+
+class _Model(object):
+
+    __slots__ = ()
+    # (attribute, key in the JSON object, interned)
+    _fields = ()
+
+    @classmethod
+    def from_dict(cls, d):
+        if d is None or isinstance(d, cls):
+            return d
+        self = cls.__new__(cls)
+        for attribute, name, intern in cls._fields:
+            value = d.get(name)
+            setattr(self, attribute, _interned(value) if intern else value)
+        return self
+
+    def to_dict(self):
+        to_return = {}
+        for attribute, name, _ in self._fields:
+            value = getattr(self, attribute)
+            if value is not None:
+                to_return[name] = value.to_dict() \
+                    if isinstance(value, _Model) else value
+        return to_return
+
+    def get(self, name, default=None):
+        """
+            Same as dict.get with the JSON key, for code written for dicts.
+        """
+        for attribute, key, _ in self._fields:
+            if key == name:
+                value = getattr(self, attribute)
+                return default if value is None else value
+        return default
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '{}({!r})'.format(type(self).__name__, self.to_dict())
+
+
+class IP(_Model):
+    __slots__ = ('addr', 'cc', 'country', 'asn', 'as_')
+    _fields = (('addr', 'addr', False), ('cc', 'cc', True),
+               ('country', 'country', True), ('asn', 'asn', False),
+               ('as_', 'as', True))
+
+
+class URL(_Model):
+    __slots__ = ('addr', 'fqdn', 'domain', 'tld', 'ip')
+    _fields = (('addr', 'addr', False), ('fqdn', 'fqdn', False),
+               ('domain', 'domain', True), ('tld', 'tld', True),
+               ('ip', 'ip', False))
+
+    @classmethod
+    def from_dict(cls, d):
+        self = super(URL, cls).from_dict(d)
+        if self is not None and not isinstance(self.ip, IP):
+            self.ip = IP.from_dict(self.ip)
+        return self
+
+
+class Settings(_Model):
+    __slots__ = ('useragent', 'referer', 'pool', 'access_level')
+    _fields = (('useragent', 'useragent', True),
+               ('referer', 'referer', False), ('pool', 'pool', True),
+               ('access_level', 'access_level', True))
+
+
+class BinBlob(_Model):
+    """
+        A binary blob (screenshot, domain graph) as sent by the API, base64
+        encoded. It is only decoded on access, and never kept decoded: use
+        save or iter_bytes to write it out in chunks without ever holding
+        the whole decoded data, or data to get it at once.
+    """
+
+    __slots__ = ('base64_data', 'media_type')
+    _fields = (('base64_data', 'base64_data', False),
+               ('media_type', 'media_type', True))
+
+    def _encoded(self):
+        encoded = self.base64_data or ''
+        if _has_whitespace(encoded):
+            if isinstance(encoded, str):
+                encoded = encoded.encode('ascii')
+            encoded = bytes(encoded).translate(None, b' \t\r\n')
+        if isinstance(encoded, (bytes, bytearray)):
+            # Slices of a memoryview do not copy the data
+            encoded = memoryview(encoded)
+        return encoded
+
+    @property
+    def size(self):
+        """
+            Size in bytes of the decoded data, without decoding it.
+        """
+        encoded = self._encoded()
+        tail = encoded[-2:]
+        if isinstance(tail, memoryview):
+            tail = tail.tobytes().decode('ascii')
+        return len(encoded) // 4 * 3 - tail.count('=')
+
+    @property
+    def data(self):
+        """
+            The decoded data, as bytes. Decoded again at each access.
+        """
+        return b''.join(self.iter_bytes())
+
+    def iter_bytes(self, chunk_size=1024 * 1024):
+        """
+            Yields the decoded data in chunks of about *chunk_size* bytes.
+        """
+        encoded = self._encoded()
+        step = max(4, chunk_size // 3 * 4)
+        for start in range(0, len(encoded), step):
+            chunk = encoded[start:start + step]
+            if isinstance(chunk, str):
+                chunk = chunk.encode('ascii')
+            yield binascii.a2b_base64(chunk)
+
+    def save(self, target, chunk_size=1024 * 1024):
+        """
+            Writes the decoded data to *target*, a path or a file-like
+            object, chunk by chunk.
+
+            :return: The number of bytes written
+        """
+        if hasattr(target, 'write'):
+            return self._write(target, chunk_size)
+        with open(target, 'wb') as f:
+            return self._write(f, chunk_size)
+
+    def _write(self, f, chunk_size):
+        written = 0
+        for chunk in self.iter_bytes(chunk_size):
+            f.write(chunk)
+            written += len(chunk)
+        return written
+
+
+class QueueStatus(_Model):
+    __slots__ = ('status', 'queue_id', 'report_id', 'priority', 'url',
+                 'settings')
+    _fields = (('status', 'status', True), ('queue_id', 'queue_id', False),
+               ('report_id', 'report_id', False),
+               ('priority', 'priority', True), ('url', 'url', False),
+               ('settings', 'settings', False))
+
+    @classmethod
+    def from_dict(cls, d):
+        self = super(QueueStatus, cls).from_dict(d)
+        if self is not None:
+            self.url = URL.from_dict(self.url)
+            self.settings = Settings.from_dict(self.settings)
+        return self
+
+
+def _lazy(name, convert):
+    """
+        Property converting the *name* section of the raw report the first
+        time it is accessed, and dropping the raw version.
+    """
+    slot = '_' + name
+
+    def getter(self):
+        value = getattr(self, slot)
+        if value is _unset:
+            value = self._raw.pop(name, None)
+            if value is not None:
+                value = convert(value)
+            setattr(self, slot, value)
+        return value
+
+    def setter(self, value):
+        self._raw.pop(name, None)
+        setattr(self, slot, value)
+    return property(getter, setter)
+
+
+class Report(_Model):
+    """
+        A report (BASICREPORT, see report). The url, settings, screenshot
+        and domain_graph sections are converted on first access; *details*
+        holds the other sections returned with include_details, as dicts.
+    """
+
+    __slots__ = ('report_id', 'date', 'urlquery_alert_count',
+                 'ids_alert_count', 'blacklist_alert_count', '_raw', '_url',
+                 '_settings', '_screenshot', '_domain_graph')
+    _basic = (('report_id', 'report_id', False), ('date', 'date', False),
+              ('urlquery_alert_count', 'urlquery_alert_count', False),
+              ('ids_alert_count', 'ids_alert_count', False),
+              ('blacklist_alert_count', 'blacklist_alert_count', False))
+    _sections = ('url', 'settings', 'screenshot', 'domain_graph')
+    _fields = _basic + tuple((name, name, False) for name in _sections)
+
+    url = _lazy('url', URL.from_dict)
+    settings = _lazy('settings', Settings.from_dict)
+    screenshot = _lazy('screenshot', BinBlob.from_dict)
+    domain_graph = _lazy('domain_graph', BinBlob.from_dict)
+
+    @classmethod
+    def from_dict(cls, d):
+        if d is None or isinstance(d, cls):
+            return d
+        self = cls.__new__(cls)
+        raw = dict(d)
+        for attribute, name, _ in cls._basic:
+            setattr(self, attribute, raw.pop(name, None))
+        for name in cls._sections:
+            setattr(self, '_' + name, _unset)
+        self._raw = raw
+        return self
+
+    @property
+    def details(self):
+        """
+            The sections of the report other than the basic ones, as a dict.
+        """
+        return dict((name, value) for name, value in self._raw.items()
+                    if name not in self._sections)
+
+    def to_dict(self):
+        to_return = self.details
+        to_return.update(super(Report, self).to_dict())
+        return to_return
+
+
+def _list_of(model, values):
+    if not isinstance(values, list):
+        return values
+    return [model.from_dict(v) if isinstance(v, dict) else v for v in values]
+
+
+def wrap(method, response):
+    """
+        Converts the response of an API *method* to the typed objects.
+        Errors are returned unchanged.
+    """
+    if _is_error(response):
+        return response
+    if method in ('submit', 'queue_status'):
+        return QueueStatus.from_dict(response)
+    if method == 'report':
+        return Report.from_dict(response)
+    if method == 'mass_submit':
+        if isinstance(response, list):
+            return _list_of(QueueStatus, response)
+        response = dict(response)
+        for name, value in response.items():
+            if name != '_response_' and isinstance(value, list):
+                response[name] = _list_of(QueueStatus, value)
+        return response
+    if method == 'urlfeed' and 'feed' in response:
+        response = dict(response)
+        response['feed'] = _list_of(URL, response['feed'])
+    elif method in ('report_list', 'search') and 'reports' in response:
+        response = dict(response)
+        response['reports'] = _list_of(Report, response['reports'])
+    return response
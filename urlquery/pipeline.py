@@ -0,0 +1,549 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+    Staged processing of a stream of items (feed URLs, reports...), every
+    stage running at the same time as the others.
+
+    The stages are connected by bounded queues: a slow stage makes the
+    ones before it wait instead of piling up items in memory. Each stage
+    has its own concurrency: threads for the blocking I/O (API calls),
+    tasks of an event loop for coroutines, and a process pool for the CPU
+    heavy functions (filtering, rendering), so all the cores are used.
+
+        pipeline = Pipeline(urlquery.iter_urlfeed())
+        pipeline.filter(is_interesting, processes=4)
+        pipeline.unique(key=lambda url: url['ip']['addr'])
+        pipeline.map(fetch_reports, workers=20)
+        pipeline.map(render, processes=4)
+        pipeline.sink(EmailSink(sender, to, smtp_server))
+        pipeline.run()
+
+    The functions of the process stages, their items and their results
+    are pickled: use module-level functions, not lambdas.
+"""
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import json
+import queue
+import threading
+import time
+
+_end = object()
+
+
+def _iscoroutinefunction(function):
+    import inspect
+    return inspect.iscoroutinefunction(function)
+
+
+def _call_list(function, item):
+    # The results of a flat_map in a process pool are sent back as a list
+    return list(function(item))
+
+
+class _Stage(object):
+
+    def __init__(self, name, kind, function, workers, processes,
+                 queue_size):
+        self.name = name
+        self.kind = kind
+        self.function = function
+        self.processes = processes
+        if workers is None:
+            # Enough items in flight to keep the pool busy
+            workers = 2 * processes if processes else 1
+        self.workers = workers
+        self.queue_size = queue_size
+        self.is_async = _iscoroutinefunction(
+            getattr(function, 'write', function))
+        self.items_in = 0
+        self.items_out = 0
+        self.errors = 0
+        self.busy = 0.
+        self.seen = set()
+        self.executor = None
+        self.running = workers
+        self.lock = threading.Lock()
+
+    def apply(self, item):
+        """
+            Returns the list of the items to pass to the next stage.
+        """
+        kind = self.kind
+        if kind == 'unique':
+            key = item if self.function is None else self.function(item)
+            with self.lock:
+                if key in self.seen:
+                    return []
+                self.seen.add(key)
+            return [item]
+        if kind == 'sink':
+            write = getattr(self.function, 'write', self.function)
+            write(item)
+            return []
+        if self.executor is not None:
+            if kind == 'flat_map':
+                return self.executor.submit(_call_list, self.function,
+                                            item).result()
+            result = self.executor.submit(self.function, item).result()
+        else:
+            result = self.function(item)
+        return self._results(item, result)
+
+    async def apply_async(self, item):
+        if self.kind == 'sink':
+            await getattr(self.function, 'write', self.function)(item)
+            return []
+        return self._results(item, await self.function(item))
+
+    def _results(self, item, result):
+        if self.kind == 'map':
+            return [result]
+        if self.kind == 'filter':
+            return [item] if result else []
+        return list(result)
+
+    def stats(self):
+        return {'workers': self.workers, 'processes': self.processes,
+                'in': self.items_in, 'out': self.items_out,
+                'errors': self.errors, 'busy': self.busy}
+
+
+class Pipeline(object):
+    """
+        Chain of stages processing the items of *source*.
+
+        The stages are added with map, filter, flat_map, unique and sink,
+        and run with run (blocking), start and join, or by iterating over
+        the pipeline, which yields the items coming out of the last stage.
+
+        An exception raised by a function drops the item: it is counted
+        in the stats of the stage and kept in *errors* as a (stage name,
+        item, exception) tuple (the last *max_errors* ones).
+
+        :param source: Iterable of items, consumed from a thread
+
+        :param queue_size: Default size of the queue before each stage.
+            Default: 100
+    """
+
+    max_errors = 1000
+
+    def __init__(self, source, queue_size=100):
+        self.source = source
+        self.queue_size = queue_size
+        self.stages = []
+        self.errors = deque(maxlen=self.max_errors)
+        self.started = None
+        self.finished = None
+        self._queues = []
+        self._threads = []
+        self._stop = threading.Event()
+
+    def _add(self, kind, function, workers=None, processes=None,
+             queue_size=None, name=None):
+        if self.started is not None:
+            raise RuntimeError('The pipeline is already started')
+        if name is None:
+            name = '{}-{}'.format(len(self.stages), kind)
+        self.stages.append(_Stage(name, kind, function, workers, processes,
+                                  queue_size or self.queue_size))
+        return self
+
+    def map(self, function, workers=None, processes=None, queue_size=None,
+            name=None):
+        """
+            Passes function(item) to the next stage.
+
+            :param function: A function, or a coroutine function to run the
+                items on an event loop
+
+            :param workers: Number of items processed at the same time (the
+                threads, or the tasks for a coroutine function).
+                Default: 1, or twice *processes*
+
+            :param processes: Size of the process pool to run *function*
+                in, for the CPU heavy functions. Default: None (run in the
+                threads)
+
+            :param queue_size: Size of the queue before the stage.
+                Default: the queue_size of the pipeline
+
+            :param name: Name of the stage in the stats
+
+            :return: The pipeline
+        """
+        return self._add('map', function, workers, processes, queue_size,
+                         name)
+
+    def filter(self, function, workers=None, processes=None,
+               queue_size=None, name=None):
+        """
+            Passes the items for which function(item) is true. See map for
+            the parameters.
+        """
+        return self._add('filter', function, workers, processes,
+                         queue_size, name)
+
+    def flat_map(self, function, workers=None, processes=None,
+                 queue_size=None, name=None):
+        """
+            Passes each item of the iterable function(item) returns. See
+            map for the parameters.
+        """
+        return self._add('flat_map', function, workers, processes,
+                         queue_size, name)
+
+    def unique(self, key=None, queue_size=None, name=None):
+        """
+            Passes each item (or each key(item)) only the first time.
+        """
+        return self._add('unique', key, 1, None, queue_size, name)
+
+    def sink(self, sink, workers=1, queue_size=None, name=None):
+        """
+            Sends the items to *sink*: a FileSink, an EmailSink, any object
+            with a write(item) method (and optionally close(), called at
+            the end), or a function.
+        """
+        return self._add('sink', sink, workers, None, queue_size, name)
+
+    # Running
+
+    def _get(self, items):
+        while not self._stop.is_set():
+            try:
+                return items.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return _end
+
+    def _put(self, items, item):
+        while not self._stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _read(self, output):
+        try:
+            for item in self.source:
+                if not self._put(output, item):
+                    break
+        except Exception as e:
+            self.errors.append(('source', None, e))
+        self._put(output, _end)
+
+    def _process(self, stage, item, output):
+        start = time.time()
+        try:
+            results = stage.apply(item)
+        except Exception as e:
+            self._count(stage, start, None)
+            self.errors.append((stage.name, item, e))
+            return
+        self._count(stage, start, results)
+        for result in results:
+            if not self._put(output, result):
+                return
+
+    def _count(self, stage, start, results):
+        with stage.lock:
+            stage.items_in += 1
+            stage.busy += time.time() - start
+            if results is None:
+                stage.errors += 1
+            else:
+                stage.items_out += len(results)
+
+    def _finish(self, stage, output):
+        with stage.lock:
+            stage.running -= 1
+            if stage.running:
+                return
+        if stage.executor is not None:
+            stage.executor.shutdown()
+        if stage.kind == 'sink' and hasattr(stage.function, 'close'):
+            try:
+                stage.function.close()
+            except Exception as e:
+                self.errors.append((stage.name, None, e))
+        self._put(output, _end)
+
+    def _work(self, stage, input, output):
+        while True:
+            item = self._get(input)
+            if item is _end:
+                # For the other workers of the stage
+                self._put(input, _end)
+                break
+            self._process(stage, item, output)
+        self._finish(stage, output)
+
+    def _work_async(self, stage, input, output):
+        import asyncio
+        loop = asyncio.new_event_loop()
+
+        async def read(items):
+            while True:
+                item = await loop.run_in_executor(None, self._get, input)
+                await items.put(item)
+                if item is _end:
+                    return
+
+        async def work(items):
+            while True:
+                item = await items.get()
+                if item is _end:
+                    items.put_nowait(_end)
+                    return
+                start = time.time()
+                try:
+                    results = await stage.apply_async(item)
+                except Exception as e:
+                    self._count(stage, start, None)
+                    self.errors.append((stage.name, item, e))
+                    continue
+                self._count(stage, start, results)
+                for result in results:
+                    # Blocks a thread of the executor, not the loop
+                    if not await loop.run_in_executor(None, self._put,
+                                                      output, result):
+                        break
+
+        async def run():
+            items = asyncio.Queue(maxsize=stage.workers)
+            await asyncio.gather(read(items),
+                                 *[work(items) for _ in range(stage.workers)])
+
+        try:
+            loop.run_until_complete(run())
+        finally:
+            loop.close()
+        stage.running = 1
+        self._finish(stage, output)
+
+    def start(self):
+        """
+            Starts the source and all the stages in background threads.
+        """
+        if self.started is not None:
+            raise RuntimeError('The pipeline is already started')
+        self.started = time.time()
+        self._stop.clear()
+        self._queues = [queue.Queue(maxsize=stage.queue_size)
+                        for stage in self.stages]
+        self._queues.append(queue.Queue(maxsize=self.queue_size))
+        self._thread(self._read, 'source', self._queues[0])
+        for i, stage in enumerate(self.stages):
+            input, output = self._queues[i], self._queues[i + 1]
+            if stage.is_async:
+                self._thread(self._work_async, stage.name, stage, input,
+                             output)
+                continue
+            if stage.processes:
+                stage.executor = ProcessPoolExecutor(stage.processes)
+            for _ in range(stage.workers):
+                self._thread(self._work, stage.name, stage, input, output)
+        return self
+
+    def _thread(self, target, name, *args):
+        thread = threading.Thread(target=target, args=args,
+                                  name='urlquery-pipeline-{}'.format(name))
+        thread.daemon = True
+        thread.start()
+        self._threads.append(thread)
+
+    def __iter__(self):
+        if self.started is None:
+            self.start()
+        output = self._queues[-1]
+        completed = False
+        try:
+            while True:
+                item = self._get(output)
+                if item is _end:
+                    break
+                yield item
+            completed = True
+        finally:
+            if not completed:
+                # Left early
+                self.close()
+        self._wait()
+
+    def join(self, timeout=None):
+        """
+            Waits until all the items went through the pipeline (or it was
+            closed).
+        """
+        if not self.stages or self.stages[-1].kind != 'sink':
+            # Nothing consumes the last queue: drain it
+            for _ in self:
+                pass
+            return
+        self._wait(timeout)
+
+    def _wait(self, timeout=None):
+        deadline = None if timeout is None else time.time() + timeout
+        for thread in self._threads:
+            thread.join(None if deadline is None
+                        else max(0, deadline - time.time()))
+        if not any(thread.is_alive() for thread in self._threads):
+            self.finished = self.finished or time.time()
+
+    def run(self):
+        """
+            Runs the pipeline until the source is exhausted.
+
+            :return: The stats, see stats
+        """
+        self.start()
+        self.join()
+        return self.stats()
+
+    def close(self):
+        """
+            Stops the pipeline. The items in the queues are dropped.
+        """
+        self._stop.set()
+        # Not the source, it can be blocked in the iterable
+        for thread in self._threads[1:]:
+            thread.join()
+        for stage in self.stages:
+            if stage.executor is not None:
+                stage.executor.shutdown(wait=False)
+        self.finished = self.finished or time.time()
+
+    def stats(self):
+        """
+            Returns a dict of the items in and out, the errors, the time
+            spent processing (busy) and the workers of every stage, along
+            with the total elapsed time. A stage whose busy time is close
+            to elapsed * workers is the bottleneck.
+        """
+        end = self.finished or time.time()
+        return {'elapsed': end - self.started if self.started else 0,
+                'stages': dict((stage.name, stage.stats())
+                               for stage in self.stages)}
+
+
+class FileSink(object):
+    """
+        Writes the items to a file, one per line: strings as they are, the
+        other items as JSON.
+
+        :param path: Path of the file, or a file object
+
+        :param mode: Mode the file is opened with. Default: a (append)
+
+        :param flush: Flush after every item. Default: True
+    """
+
+    def __init__(self, path, mode='a', flush=True):
+        self.path = path
+        self.mode = mode
+        self.flush = flush
+        self._file = None
+        self._lock = threading.Lock()
+
+    def write(self, item):
+        if not isinstance(item, str):
+            item = json.dumps(item, sort_keys=True)
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, self.mode) \
+                    if isinstance(self.path, str) else self.path
+            self._file.write(item + '\n')
+            if self.flush:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None and self._file is not self.path:
+                self._file.close()
+            self._file = None
+
+
+class EmailSink(object):
+    """
+        Sends each item by email. An item is either a dict with a 'body'
+        and optionally a 'subject', a string (the body), or anything else,
+        sent as indented JSON. The SMTP connection is reused between the
+        items.
+
+        :param sender: From address
+
+        :param to: To address, or list of addresses
+
+        :param smtp_server: Host of the SMTP server
+
+        :param port: Port of the SMTP server. Default: 0 (the default one)
+
+        :param subject: Subject of the items without one.
+            Default: urlquery
+
+        :param ssl: Connect with SMTP over SSL. Default: False
+
+        :param login: (user, password) tuple to log in with.
+            Default: None
+    """
+
+    def __init__(self, sender, to, smtp_server, port=0, subject='urlquery',
+                 ssl=False, login=None):
+        self.sender = sender
+        self.to = [to] if isinstance(to, str) else list(to)
+        self.smtp_server = smtp_server
+        self.port = port
+        self.subject = subject
+        self.ssl = ssl
+        self.login = login
+        self._smtp = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        import smtplib
+        smtp = (smtplib.SMTP_SSL if self.ssl else smtplib.SMTP)(
+            self.smtp_server, self.port)
+        if self.login is not None:
+            smtp.login(*self.login)
+        return smtp
+
+    def write(self, item):
+        from email.mime.text import MIMEText
+        subject = self.subject
+        if isinstance(item, dict) and 'body' in item:
+            subject = item.get('subject') or subject
+            item = item['body']
+        if not isinstance(item, str):
+            item = json.dumps(item, sort_keys=True, indent=4)
+        message = MIMEText(item)
+        message['Subject'] = subject
+        message['From'] = self.sender
+        message['To'] = ', '.join(self.to)
+        with self._lock:
+            import smtplib
+            for attempt in range(2):
+                if self._smtp is None:
+                    self._smtp = self._connect()
+                try:
+                    self._smtp.sendmail(self.sender, self.to,
+                                        message.as_string())
+                    return
+                except smtplib.SMTPServerDisconnected:
+                    # Idle connection closed by the server: reconnect once
+                    self._smtp = None
+                    if attempt:
+                        raise
+
+    def close(self):
+        with self._lock:
+            if self._smtp is not None:
+                try:
+                    self._smtp.quit()
+                except Exception:
+                    pass
+                self._smtp = None
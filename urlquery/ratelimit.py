@@ -0,0 +1,175 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+    Client-side rate limiting.
+
+    A RateLimiter is given to one or more clients (rate_limiter=...), which
+    then wait for a token before each request. Share the same RateLimiter
+    between all the clients, threads and tasks using a key, so they all
+    draw from the same buckets.
+
+    The rates adapt to the answers of the API: they are cut when the
+    server throttles or fails, and grow back slowly while the requests
+    succeed (additive increase, multiplicative decrease).
+"""
+
+import re
+import threading
+import time
+
+_throttled = re.compile(r'rate|limit|throttl|too many|quota', re.IGNORECASE)
+
+
+class TokenBucket(object):
+    """
+        Token bucket refilled at *rate* tokens per second, holding at most
+        *burst* tokens. Safe to use from several threads and tasks.
+
+        *rate* can be changed at any time, *max_rate* keeps the rate the
+        bucket was created with.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.max_rate = float(rate)
+        self.burst = float(burst)
+        self._tokens = float(burst)
+        self._last = time.time()
+        # Time the rate was last cut, see RateLimiter.feedback
+        self._decreased = 0.
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """
+            Takes a token, returns the time in seconds to wait before using
+            it (0 if it is available right away).
+        """
+        with self._lock:
+            now = time.time()
+            self._tokens = min(self.burst,
+                               self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0
+            return -self._tokens / self.rate
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        import asyncio
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class RateLimiter(object):
+    """
+        Token buckets per API key, and optionally per API key and method.
+
+        :param rate: Requests per second allowed per API key. Default: 5
+
+        :param burst: Number of requests which can be sent at once after a
+            quiet period. Default: 10
+
+        :param method_rates: Dict of requests per second per method, on top
+            of the limit of the key. Default: None
+
+        :param min_rate: Lowest rate the adaptation can go down to, as a
+            fraction of the configured rates. Default: 0.05
+
+        :param decrease: Factor applied to the rates when the API throttles.
+            Server errors and failed requests apply its square root.
+            Default: 0.5
+
+        :param increase: Fraction of the configured rates added back after
+            each successful request. Default: 0.02
+
+        :param cooldown: Time in seconds during which the rates are cut at
+            most once: the requests in flight when the API starts
+            throttling all come back throttled, but count as one signal.
+            Default: 2
+    """
+
+    def __init__(self, rate=5, burst=10, method_rates=None, min_rate=0.05,
+                 decrease=0.5, increase=0.02, cooldown=2):
+        self.rate = rate
+        self.burst = burst
+        self.method_rates = dict(method_rates or {})
+        self.min_rate = min_rate
+        self.decrease = decrease
+        self.increase = increase
+        self.cooldown = cooldown
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _get_buckets(self, api_key, method):
+        with self._lock:
+            buckets = self._buckets.get((api_key, method))
+            if buckets is None:
+                key_bucket = self._buckets.get((api_key, None))
+                if key_bucket is None:
+                    key_bucket = TokenBucket(self.rate, self.burst)
+                    self._buckets[(api_key, None)] = [key_bucket]
+                else:
+                    key_bucket = key_bucket[0]
+                buckets = [key_bucket]
+                if method in self.method_rates:
+                    buckets.append(TokenBucket(self.method_rates[method],
+                                               self.burst))
+                self._buckets[(api_key, method)] = buckets
+            return buckets
+
+    def acquire(self, api_key, method):
+        """
+            Blocks until a request to *method* can be sent with *api_key*.
+        """
+        wait = max(b.reserve() for b in self._get_buckets(api_key, method))
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, api_key, method):
+        """
+            Coroutine version of acquire.
+        """
+        import asyncio
+        wait = max(b.reserve() for b in self._get_buckets(api_key, method))
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    @staticmethod
+    def _classify(status_code, response):
+        if status_code in (429, 509):
+            return 'throttled'
+        if status_code is None or status_code >= 500 or response is None:
+            return 'error'
+        if isinstance(response, dict):
+            status = response.get('_response_')
+            if isinstance(status, dict) and status.get('status') == 'error':
+                if _throttled.search(str(status.get('error', ''))):
+                    return 'throttled'
+        return 'ok'
+
+    def feedback(self, api_key, method, status_code=None, response=None):
+        """
+            Adapts the rates to the outcome of a request: its HTTP status
+            and decoded response, both None if the request failed.
+        """
+        outcome = self._classify(status_code, response)
+        if outcome == 'throttled':
+            factor = self.decrease
+        else:
+            factor = self.decrease ** 0.5
+        now = time.time()
+        for bucket in self._get_buckets(api_key, method):
+            with bucket._lock:
+                if outcome == 'ok':
+                    bucket.rate = min(bucket.max_rate,
+                                      bucket.rate + bucket.max_rate * self.increase)
+                elif now - bucket._decreased >= self.cooldown:
+                    bucket.rate = max(bucket.max_rate * self.min_rate,
+                                      bucket.rate * factor)
+                    bucket._decreased = now
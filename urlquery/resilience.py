@@ -0,0 +1,285 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+    Keeping the tail latency down when the API is slow or failing.
+
+    A Hedging object given to a client (hedging=...) sends a second copy of
+    a read request when the first one has not been answered after the
+    usual latency of the method (its 95th percentile by default), and
+    takes the first answer. A CircuitBreaker (circuit_breaker=...) stops
+    sending requests after consecutive failures, raising CircuitOpenError
+    at once instead, and lets a single probe request through from time to
+    time to detect when the API is back.
+"""
+
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, \
+    ThreadPoolExecutor, wait
+import threading
+import time
+
+# Methods without side effects, safe to send twice
+idempotent_methods = ('report', 'report_list', 'search', 'reputation',
+                      'user_agent_list', 'queue_status', 'urlfeed')
+
+
+class CircuitOpenError(Exception):
+    """
+        Raised instead of sending a request while the circuit is open.
+    """
+    pass
+
+
+class CircuitBreaker(object):
+    """
+        Fails fast while the API is unhealthy.
+
+        A request failing (connection error, timeout, HTTP 5xx) after
+        *failures* failed ones in a row opens the circuit: the requests
+        raise CircuitOpenError without being sent. After *recovery_time*
+        seconds, one request is let through as a probe: if it succeeds the
+        circuit closes, otherwise it stays open for another
+        *recovery_time*. The RESPONSE errors (invalid query, unknown
+        report...) are answers, not failures.
+
+        A circuit breaker can be shared by several clients of the same API.
+
+        :param failures: Number of failures in a row opening the circuit.
+            Default: 5
+
+        :param recovery_time: Time in seconds before probing the API.
+            Default: 30
+    """
+
+    def __init__(self, failures=5, recovery_time=30):
+        self.failures = failures
+        self.recovery_time = recovery_time
+        self.state = 'closed'
+        self.opened = None
+        self._failed = 0
+        self._probing = False
+        self._probe_started = None
+        self._lock = threading.Lock()
+
+    def before(self):
+        """
+            Called before sending a request, raises CircuitOpenError if it
+            must not be sent.
+        """
+        with self._lock:
+            if self.state == 'closed':
+                return
+            now = time.time()
+            if self.state == 'open' and \
+                    now - self.opened >= self.recovery_time:
+                self.state = 'half_open'
+                self._probing = False
+            # A new probe if the last one never finished (e.g. cancelled)
+            if self.state == 'half_open' and (
+                    not self._probing or
+                    now - self._probe_started >= self.recovery_time):
+                self._probing = True
+                self._probe_started = now
+                return
+            raise CircuitOpenError(
+                'The API is failing, next try in {:.0f}s'.format(
+                    max(0, self.opened + self.recovery_time - now)))
+
+    def after(self, status_code, exception=None):
+        """
+            Called with the result of a request sent.
+        """
+        failed = exception is not None or \
+            (status_code is not None and status_code >= 500)
+        with self._lock:
+            if not failed:
+                self._failed = 0
+                self.state = 'closed'
+                self._probing = False
+                return
+            self._failed += 1
+            if self.state == 'half_open' or self._failed >= self.failures:
+                self.state = 'open'
+                self.opened = time.time()
+                self._probing = False
+
+
+class Hedging(object):
+    """
+        Sends a second copy of the slow read requests.
+
+        The delay before the copy is the *quantile* of the latest
+        latencies of the method (bounded by *min_delay* and *max_delay*),
+        or *max_delay* until *min_samples* are known. At most *budget* of
+        the requests are hedged, so a slow API does not get twice the
+        load.
+
+        The synchronous client sends the first request of a method which
+        may be hedged from a thread of its own, and the copies from a pool
+        of *max_workers* threads; the copy which lost is not interrupted,
+        its answer is dropped. The async client cancels it. The latencies
+        are measured by the clients from the time the request is sent,
+        after waiting for the rate limiter.
+
+        :param methods: Methods hedged. Default: the idempotent methods,
+            except urlfeed (big responses)
+
+        :param quantile: Quantile of the latencies used as delay.
+            Default: 0.95
+
+        :param min_delay: Minimum delay in seconds. Default: 0.05
+
+        :param max_delay: Maximum delay in seconds. Default: 2
+
+        :param budget: Maximum fraction of requests hedged. Default: 0.1
+
+        :param window: Number of latencies kept per method. Default: 500
+
+        :param min_samples: Number of latencies needed to use the quantile.
+            Default: 20
+
+        :param max_workers: Size of the thread pool. Default: 32
+    """
+
+    def __init__(self, methods=None, quantile=0.95, min_delay=0.05,
+                 max_delay=2, budget=0.1, window=500, min_samples=20,
+                 max_workers=32):
+        if methods is None:
+            methods = [m for m in idempotent_methods if m != 'urlfeed']
+        self.methods = frozenset(methods)
+        self.quantile = quantile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.window = window
+        self.min_samples = min_samples
+        self.max_workers = max_workers
+        self.requests = 0
+        self.hedged = 0
+        self.won = 0
+        self._latencies = {}
+        self._delays = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def delay(self, method):
+        """
+            Returns the time in seconds to wait before hedging a request.
+        """
+        delay = self._delays.get(method)
+        return self.max_delay if delay is None else delay
+
+    def observe(self, method, seconds):
+        """
+            Records the latency of a request.
+        """
+        with self._lock:
+            latencies = self._latencies.get(method)
+            if latencies is None:
+                latencies = self._latencies[method] = deque(maxlen=self.window)
+            latencies.append(seconds)
+            # Sorted again every few requests only
+            if len(latencies) >= self.min_samples and len(latencies) % 10 == 0:
+                ordered = sorted(latencies)
+                value = ordered[min(len(ordered) - 1,
+                                    int(self.quantile * len(ordered)))]
+                self._delays[method] = min(self.max_delay,
+                                           max(self.min_delay, value))
+
+    def _can_hedge(self):
+        return self.hedged < self.budget * self.requests
+
+    def _allow(self):
+        with self._lock:
+            if not self._can_hedge():
+                return False
+            self.hedged += 1
+            return True
+
+    def _hedge(self, send, query, gzip):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers)
+        # A copy each: sending adds the key and gzip fields to the query
+        return self._executor.submit(send, dict(query), gzip)
+
+    def call(self, send, query, gzip=None):
+        """
+            Returns send(query, gzip), hedged. send records the latency of
+            the requests with observe.
+        """
+        with self._lock:
+            self.requests += 1
+            can_hedge = self._can_hedge()
+        if not can_hedge:
+            return send(query, gzip)
+        # The caller must be free to take the answer of the copy, so the
+        # first request gets its own thread: not the pool, which would
+        # limit the concurrency of the client and delay the request.
+        first = Future()
+
+        def attempt():
+            try:
+                first.set_result(send(dict(query), gzip))
+            except BaseException as e:
+                first.set_exception(e)
+        threading.Thread(target=attempt, daemon=True).start()
+        done, _ = wait([first], timeout=self.delay(query['method']))
+        if done or not self._allow():
+            return first.result()
+        futures = [first, self._hedge(send, query, gzip)]
+        while True:
+            done, pending = wait(futures, return_when=FIRST_COMPLETED)
+            # A successful answer first, even if both came at once
+            ordered = sorted(done, key=lambda f: f.exception() is not None)
+            future = ordered[0]
+            if future.exception() is None or not pending:
+                if future is not first:
+                    with self._lock:
+                        self.won += 1
+                return future.result()
+            futures = list(pending)
+
+    async def call_async(self, send, query, gzip=None):
+        """
+            Returns await send(query, gzip), hedged. send records the
+            latency of the requests with observe.
+        """
+        import asyncio
+        with self._lock:
+            self.requests += 1
+        first = asyncio.ensure_future(send(dict(query), gzip))
+        done, _ = await asyncio.wait([first],
+                                     timeout=self.delay(query['method']))
+        if done or not self._allow():
+            return await first
+        tasks = [first, asyncio.ensure_future(send(dict(query), gzip))]
+        try:
+            while True:
+                done, pending = await asyncio.wait(
+                    tasks, return_when=asyncio.FIRST_COMPLETED)
+                ordered = sorted(done, key=lambda t: t.exception() is not None)
+                task = ordered[0]
+                if task.exception() is None or not pending:
+                    if task is not first:
+                        with self._lock:
+                            self.won += 1
+                    return task.result()
+                tasks = list(pending)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stats(self):
+        """
+            Returns the number of requests, of hedged requests, of hedges
+            answered first, and the current delay per method.
+        """
+        return {'requests': self.requests, 'hedged': self.hedged,
+                'won': self.won, 'delays': dict(self._delays)}
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
@@ -0,0 +1,283 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+    Polling of queue_status for many submissions at once.
+
+    A QueueScheduler keeps all the outstanding queue IDs in a single timer
+    heap and polls them from a small pool of threads. The first poll of a
+    submission happens at half the time submissions of the same priority
+    usually take to complete, the second one around that time, and the
+    next ones back off from there, so a queue ID is polled a few times
+    instead of every few seconds.
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+import heapq
+import itertools
+import queue
+import threading
+import time
+
+from .cache import _is_error
+
+# Expected processing time in seconds per priority, before any submission
+# has been seen completing.
+default_expected = {
+    'high': 30,
+    'medium': 60,
+    'low': 120,
+    'urlfeed': 1800,
+}
+
+
+class _Submission(object):
+
+    __slots__ = ('queue_id', 'priority', 'callback', 'future', 'submitted',
+                 'delay', 'probe', 'pending_at', 'errors')
+
+    def __init__(self, queue_id, priority, callback):
+        self.queue_id = queue_id
+        self.priority = priority
+        self.callback = callback
+        self.future = Future()
+        self.submitted = time.time()
+        self.delay = None
+        self.probe = None
+        # Last time the submission was seen not completed
+        self.pending_at = self.submitted
+        self.errors = 0
+
+
+class _Completed(object):
+    """
+        The completed submissions waiting for as_completed. They are only
+        kept while an as_completed iterator runs, or always if *keep* is
+        set: nobody would take them otherwise.
+    """
+
+    def __init__(self, keep=False):
+        self.keep = keep
+        self._queue = queue.Queue()
+        self._consumers = 0
+        self._lock = threading.Lock()
+
+    def put(self, item):
+        with self._lock:
+            if self.keep or self._consumers:
+                self._queue.put(item)
+
+    def iterate(self, pending, timeout=None):
+        """
+            Yields the completed submissions until *pending* returns 0.
+        """
+        with self._lock:
+            self._consumers += 1
+        try:
+            while True:
+                try:
+                    yield self._queue.get(block=False)
+                    continue
+                except queue.Empty:
+                    if not pending():
+                        return
+                yield self._queue.get(timeout=timeout)
+        finally:
+            with self._lock:
+                self._consumers -= 1
+                if not self._consumers and not self.keep:
+                    while not self._queue.empty():
+                        self._queue.get(block=False)
+
+
+class QueueScheduler(object):
+    """
+        Tracks submissions until their report is available.
+
+        The completed submissions are available three ways: the Future
+        returned by track, the optional callback given to track, and the
+        as_completed iterator. The result is the last QUEUE_STATUS (see
+        submit), which has a "report_id". If a submission times out or keeps
+        failing, the result is {'error': message, 'queue_id': queue_id}.
+
+        as_completed only yields the submissions completing while it runs,
+        unless *keep_completed* is set: they are then all kept until
+        as_completed takes them, so it must be used.
+
+        :param client: The Client used to poll. Default: the default client
+
+        :param workers: Number of threads polling. Default: 4
+
+        :param min_delay: Minimum delay in seconds between two polls of a
+            submission. Default: 5
+
+        :param max_delay: Maximum delay in seconds between two polls of a
+            submission. Default: 600
+
+        :param timeout: Time in seconds after which a submission is given
+            up. Default: None (never)
+
+        :param max_errors: Number of failed polls in a row after which a
+            submission is given up. Default: 5
+
+        :param keep_completed: Keep the completed submissions for
+            as_completed, even when it is not running. Default: False
+    """
+
+    # Weight of the last completion time in the expected processing time
+    smoothing = 0.2
+    # Growth of the delay between two polls of the same submission
+    backoff = 1.5
+
+    def __init__(self, client=None, workers=4, min_delay=5, max_delay=600,
+                 timeout=None, max_errors=5, keep_completed=False):
+        if client is None:
+            from .api import default_client
+            client = default_client()
+        self.client = client
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.max_errors = max_errors
+        self.expected = dict(default_expected)
+        self._heap = []
+        self._counter = itertools.count()
+        self._pending = 0
+        self._condition = threading.Condition()
+        self._completed = _Completed(keep_completed)
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run,
+                                        name='urlquery-scheduler')
+        self._thread.daemon = True
+        self._thread.start()
+
+    @property
+    def pending(self):
+        """
+            Number of submissions not completed yet.
+        """
+        return self._pending
+
+    def track(self, queue_id, priority='low', callback=None):
+        """
+            Starts polling a submission.
+
+            :param queue_id: The queue_id, or the QUEUE_STATUS returned by
+                submit, typed or not (its priority is then used).
+
+            :param priority: Priority of the submission, used to pick the
+                polling delays. Default: low
+
+            :param callback: Called with the queue_id and the result once
+                the submission completed.
+
+            :return: A concurrent.futures.Future of the result
+        """
+        if hasattr(queue_id, 'get'):
+            # A QUEUE_STATUS dict, or a models.QueueStatus
+            priority = queue_id.get('priority') or priority
+            queue_id = queue_id.get('queue_id')
+        submission = _Submission(queue_id, priority, callback)
+        with self._condition:
+            if self._closed:
+                raise RuntimeError('The scheduler is closed')
+            self._pending += 1
+            expected = self.expected.get(priority, self.expected['low'])
+            # An early probe, so that a faster queue is seen, then a poll
+            # around the expected completion, then more often
+            probe = max(self.min_delay, expected * 0.5)
+            submission.probe = max(self.min_delay, expected - probe)
+            submission.delay = max(self.min_delay, expected * 0.25)
+            self._schedule(submission, probe)
+        return submission.future
+
+    def as_completed(self, timeout=None):
+        """
+            Yields (queue_id, result) tuples as the submissions complete,
+            until none is pending. With *keep_completed*, the submissions
+            completed before are yielded first.
+
+            :param timeout: Maximum time in seconds to wait for the next
+                completion. Default: None (no limit)
+        """
+        return self._completed.iterate(lambda: self._pending, timeout)
+
+    def close(self, wait=True):
+        """
+            Stops polling. Pending submissions are not resolved.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _schedule(self, submission, delay):
+        heapq.heappush(self._heap, (time.time() + delay, next(self._counter),
+                                    submission))
+        self._condition.notify()
+
+    def _run(self):
+        with self._condition:
+            while not self._closed:
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+                due = self._heap[0][0] - time.time()
+                if due > 0:
+                    self._condition.wait(due)
+                    continue
+                submission = heapq.heappop(self._heap)[2]
+                self._executor.submit(self._poll, submission)
+
+    def _poll(self, submission):
+        try:
+            status = self.client.queue_status(submission.queue_id)
+        except Exception as e:
+            status = {'error': 'Unable to poll {}: {}'.format(submission.queue_id, e)}
+        now = time.time()
+        if _is_error(status):
+            submission.errors += 1
+            if submission.errors >= self.max_errors:
+                return self._complete(submission, status)
+        else:
+            submission.errors = 0
+            if status.get('report_id') is not None:
+                # It completed between the last two polls
+                self._learn(submission.priority,
+                            (submission.pending_at + now) / 2 -
+                            submission.submitted)
+                return self._complete(submission, status)
+            submission.pending_at = now
+        if self.timeout is not None and now - submission.submitted >= self.timeout:
+            return self._complete(submission, {
+                'error': 'Timeout waiting for {}'.format(submission.queue_id),
+                'queue_id': submission.queue_id})
+        with self._condition:
+            if self._closed:
+                return
+            if submission.probe is not None:
+                self._schedule(submission, submission.probe)
+                submission.probe = None
+            else:
+                self._schedule(submission, submission.delay)
+                submission.delay = min(self.max_delay,
+                                       submission.delay * self.backoff)
+
+    def _learn(self, priority, elapsed):
+        expected = self.expected.get(priority, elapsed)
+        self.expected[priority] = (1 - self.smoothing) * expected + \
+            self.smoothing * elapsed
+
+    def _complete(self, submission, result):
+        self._completed.put((submission.queue_id, result))
+        with self._condition:
+            self._pending -= 1
+        submission.future.set_result(result)
+        if submission.callback is not None:
+            submission.callback(submission.queue_id, result)
@@ -0,0 +1,182 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+    Searching a whole time range, split in time shards searched
+    concurrently.
+
+    A search returns at most a page of reports (50) from its *from*
+    timestamp. As documented by the API (*from* defaults to now), the
+    reports are the ones dated at or before *from*: the shards are walked
+    from the end of the range to its start. For a server which reads
+    forward from *from* instead, use direction='forward'; a backward search
+    stops with an error when the server turns out to read forward.
+
+    A shard whose page comes back full is complete down to (or up to) the
+    date of its last report: the rest of it is split in two smaller
+    shards, and the following shards are made smaller too. Shards with few
+    results make the following ones bigger again.
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from .cache import _is_error
+from .models import Report
+
+
+def _date(report, to_timestamp):
+    try:
+        return to_timestamp(report.get('date'))
+    except Exception:
+        return None
+
+
+class SearchStream(object):
+    """
+        Iterator over the reports matching a search between *start* and
+        *end*, each report once: newest first with direction='backward',
+        in time order with direction='forward'.
+
+        Iterating stops at the first shard which cannot be fetched, *error*
+        is then set. If the query is invalid, nothing is yielded and *error*
+        is set.
+
+        With typed set, the reports are urlquery.models.Report.
+    """
+
+    def __init__(self, client, query, start, end, shard_size,
+                 min_shard_size, max_workers, page_size, gzip=None,
+                 typed=None, direction='backward'):
+        # Not imported with the module, api imports this one
+        from .api import _to_timestamp
+        self._to_timestamp = _to_timestamp
+        self._client = client
+        self._query = query
+        self._gzip = gzip
+        self._typed = client.typed if typed is None else typed
+        if direction not in ('backward', 'forward'):
+            raise ValueError('Unknown direction: {}'.format(direction))
+        self.direction = direction
+        # The shards are walked on positions: the timestamps, negated when
+        # searching backward, so both directions share the same code.
+        self._sign = -1 if direction == 'backward' else 1
+        self.start = start
+        self.end = end
+        self.shard_size = shard_size
+        self.min_shard_size = min_shard_size
+        self.max_shard_size = shard_size * 16
+        self.max_workers = max_workers
+        self.page_size = page_size
+        self.shards = 0
+        self._error = None
+
+    @property
+    def error(self):
+        return self._query.get('error') or self._error
+
+    def _fetch(self, shard_start):
+        date_from = self._sign * shard_start
+        try:
+            query = dict(self._query, **{'from': date_from})
+            return self._client._query(query, self._gzip, False)
+        except Exception as e:
+            return {'error': 'Unable to search from {}: {}'.format(date_from, e)}
+
+    def _range(self):
+        """
+            Returns the positions of the start and end of the range.
+        """
+        if self._sign > 0:
+            return self.start, self.end
+        return -self.end, -self.start
+
+    def _process(self, shard_start, shard_end, response, previous_ids):
+        """
+            Handles the response of a shard. Returns the reports to yield,
+            their IDs, and the (start, end) of the shards to search before
+            the next ones, or None if the iteration must stop (*error* is
+            then set).
+        """
+        if _is_error(response):
+            self._error = response.get('error') or \
+                response.get('_response_', {}).get('error')
+            return None
+        returned = []
+        for report in response.get('reports') or []:
+            date = _date(report, self._to_timestamp)
+            if date is not None:
+                returned.append((self._sign * date, report))
+        returned.sort(key=lambda item: item[0])
+        if returned and returned[-1][0] < shard_start:
+            # Everything is on the wrong side of *from*
+            self._error = 'The server does not search {} from the start ' \
+                'date, try direction={!r}'.format(
+                    self.direction,
+                    'forward' if self._sign < 0 else 'backward')
+            return None
+        complete_until = shard_end
+        again = []
+        if len(returned) >= self.page_size and \
+                shard_start <= returned[-1][0] < shard_end:
+            # Full page: only complete up to the last date, split the rest
+            # and make the next shards smaller.
+            complete_until = max(returned[-1][0], shard_start + 1)
+            middle = (complete_until + shard_end) / 2.
+            if shard_end - complete_until > 2 * self.min_shard_size:
+                again = [(complete_until, middle), (middle, shard_end)]
+            else:
+                again = [(complete_until, shard_end)]
+            self.shard_size = max(self.min_shard_size, self.shard_size / 2.)
+        elif len(returned) < self.page_size / 4:
+            self.shard_size = min(self.max_shard_size, self.shard_size * 2)
+        reports = []
+        ids = set()
+        for date, report in returned:
+            if not shard_start <= date < complete_until:
+                continue
+            report_id = report.get('report_id')
+            if report_id in ids or report_id in previous_ids:
+                continue
+            ids.add(report_id)
+            reports.append(Report.from_dict(report) if self._typed
+                           else report)
+        return reports, ids, again
+
+    def __iter__(self):
+        if self._query.get('error') is not None:
+            return
+        # Shards in time order: (start, end, future)
+        shards = deque()
+        next_start, last = self._range()
+        # Reports of the last shard, for the ones on its end boundary
+        previous_ids = set()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+
+            def submit(shard_start, shard_end):
+                self.shards += 1
+                return (shard_start, shard_end,
+                        executor.submit(self._fetch, shard_start))
+
+            try:
+                while True:
+                    while len(shards) < 2 * self.max_workers and \
+                            next_start < last:
+                        shard_end = min(last, next_start + self.shard_size)
+                        shards.append(submit(next_start, shard_end))
+                        next_start = shard_end
+                    if not shards:
+                        return
+                    shard_start, shard_end, future = shards.popleft()
+                    result = self._process(shard_start, shard_end,
+                                           future.result(), previous_ids)
+                    if result is None:
+                        return
+                    reports, previous_ids, again = result
+                    for start, end in reversed(again):
+                        shards.appendleft(submit(start, end))
+                    for report in reports:
+                        yield report
+            finally:
+                # Stopped early (error or consumer gone): drop the rest
+                for _, _, future in shards:
+                    future.cancel()
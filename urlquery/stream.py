@@ -0,0 +1,317 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+    Streaming of the response bodies: incremental gzip decompression and
+    incremental parsing of big JSON responses.
+
+    Only the array holding the bulk of the data (e.g. the "feed" of a
+    urlfeed response) is streamed, one element at a time. The other values
+    of the top-level object are small and decoded as a whole.
+"""
+
+import codecs
+import json
+import re
+import time
+import zlib
+
+from .models import URL
+
+_whitespace = re.compile(r'[ \t\n\r]*')
+_decoder = json.JSONDecoder()
+
+
+class _Gunzip(object):
+    """
+        Incremental decompressor for a response body. The API sends the body
+        gzip'ed when the query has 'gzip' set, with or without a
+        Content-Encoding header, so the body is sniffed for the gzip magic
+        number and passed through unchanged if it is not compressed.
+    """
+
+    def __init__(self):
+        self._head = b''
+        self._decompressor = None
+        self._sniffed = False
+
+    def feed(self, chunk):
+        if not self._sniffed:
+            self._head += chunk
+            if len(self._head) < 2:
+                return b''
+            chunk, self._head = self._head, b''
+            self._sniffed = True
+            if chunk[:2] == b'\x1f\x8b':
+                self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if self._decompressor is None:
+            return chunk
+        return self._decompressor.decompress(chunk)
+
+    def flush(self):
+        if self._decompressor is None:
+            return self._head
+        return self._decompressor.flush()
+
+
+def _iter_body(r, chunk_size=65536):
+    """
+        Yields the decompressed body of a streamed requests response, one
+        chunk at a time.
+    """
+    gunzip = _Gunzip()
+    for chunk in r.raw.stream(chunk_size, decode_content=True):
+        data = gunzip.feed(chunk)
+        if data:
+            yield data
+    data = gunzip.flush()
+    if data:
+        yield data
+
+
+class _Buffer(object):
+    """
+        Text buffer over an iterable of byte chunks, refilled on demand.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self.data = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """
+            Appends the next chunk to the buffer, dropping what has already
+            been consumed. Returns False once the input is exhausted.
+        """
+        if self.eof:
+            return False
+        text = ''
+        for chunk in self._chunks:
+            text = self._decoder.decode(chunk)
+            if text:
+                break
+        else:
+            text = self._decoder.decode(b'', final=True)
+            self.eof = True
+        return self._append(text)
+
+    def _append(self, text):
+        self.data = self.data[self.pos:] + text
+        self.pos = 0
+        return not self.eof or bool(text)
+
+    def peek(self):
+        """
+            Skips whitespaces and returns the next character, '' at the end
+            of the input.
+        """
+        while True:
+            self.pos = _whitespace.match(self.data, self.pos).end()
+            if self.pos < len(self.data):
+                return self.data[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError('Expected {!r}, found {!r}'.format(char, found))
+        self.pos += 1
+
+    def value(self):
+        """
+            Decodes the next complete JSON value.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.data, self.pos)
+            except ValueError:
+                if self.fill():
+                    continue
+                raise
+            # A number at the end of the buffer might continue in the next
+            # chunk.
+            if end == len(self.data) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_array(chunks, key, fields):
+    """
+        Parses a JSON object from an iterable of byte chunks and yields the
+        elements of its *key* array one by one. The other members of the
+        object are stored in the *fields* dict as they are parsed.
+    """
+    buf = _Buffer(chunks)
+    buf.expect('{')
+    if buf.peek() == '}':
+        return
+    while True:
+        name = buf.value()
+        buf.expect(':')
+        if name == key and buf.peek() == '[':
+            buf.pos += 1
+            if buf.peek() == ']':
+                buf.pos += 1
+            else:
+                while True:
+                    yield buf.value()
+                    char = buf.peek()
+                    buf.pos += 1
+                    if char == ']':
+                        break
+                    if char != ',':
+                        raise ValueError('Expected "," or "]", found {!r}'.format(char))
+        else:
+            fields[name] = buf.value()
+        char = buf.peek()
+        buf.pos += 1
+        if char == '}':
+            return
+        if char != ',':
+            raise ValueError('Expected "," or "}}", found {!r}'.format(char))
+
+
+class _AsyncBuffer(_Buffer):
+    """
+        _Buffer over an async iterable of byte chunks.
+    """
+
+    def __init__(self, chunks):
+        _Buffer.__init__(self, ())
+        self._chunks = chunks.__aiter__()
+
+    async def fill(self):
+        if self.eof:
+            return False
+        text = ''
+        async for chunk in self._chunks:
+            text = self._decoder.decode(chunk)
+            if text:
+                break
+        else:
+            text = self._decoder.decode(b'', final=True)
+            self.eof = True
+        return self._append(text)
+
+    async def peek(self):
+        while True:
+            self.pos = _whitespace.match(self.data, self.pos).end()
+            if self.pos < len(self.data):
+                return self.data[self.pos]
+            if not await self.fill():
+                return ''
+
+    async def expect(self, char):
+        found = await self.peek()
+        if found != char:
+            raise ValueError('Expected {!r}, found {!r}'.format(char, found))
+        self.pos += 1
+
+    async def value(self):
+        await self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.data, self.pos)
+            except ValueError:
+                if await self.fill():
+                    continue
+                raise
+            if end == len(self.data) and await self.fill():
+                continue
+            self.pos = end
+            return value
+
+
+async def aiter_array(chunks, key, fields):
+    """
+        Same as iter_array, for an async iterable of byte chunks.
+    """
+    buf = _AsyncBuffer(chunks)
+    await buf.expect('{')
+    if await buf.peek() == '}':
+        return
+    while True:
+        name = await buf.value()
+        await buf.expect(':')
+        if name == key and await buf.peek() == '[':
+            buf.pos += 1
+            if await buf.peek() == ']':
+                buf.pos += 1
+            else:
+                while True:
+                    yield await buf.value()
+                    char = await buf.peek()
+                    buf.pos += 1
+                    if char == ']':
+                        break
+                    if char != ',':
+                        raise ValueError('Expected "," or "]", found {!r}'.format(char))
+        else:
+            fields[name] = await buf.value()
+        char = await buf.peek()
+        buf.pos += 1
+        if char == '}':
+            return
+        if char != ',':
+            raise ValueError('Expected "," or "}}", found {!r}'.format(char))
+
+
+class URLFeedStream(object):
+    """
+        Iterator over the URL objects of a urlfeed response, parsed while
+        the response is downloaded. Only one URL object is held in memory
+        at a time, whatever the size of the slice.
+
+        The other members of the response (start_time, end_time, the
+        RESPONSE object...) are available in *fields* as soon as they have
+        been parsed, and in any case once the iteration is over.
+        If the query is invalid, nothing is yielded and *error* is set.
+
+        With typed set, the URL objects are urlquery.models.URL.
+
+        The request goes through the rate limiter and the circuit breaker
+        of the client, and is recorded in its metrics, like the others.
+    """
+
+    def __init__(self, client, query, gzip=None, typed=None):
+        self._client = client
+        self._query = query
+        self._gzip = gzip
+        self._typed = client.typed if typed is None else typed
+        self.fields = {}
+
+    @property
+    def error(self):
+        return self._query.get('error') or \
+            self.fields.get('_response_', {}).get('error')
+
+    @property
+    def start_time(self):
+        return self.fields.get('start_time')
+
+    @property
+    def end_time(self):
+        return self.fields.get('end_time')
+
+    def __iter__(self):
+        if self._query.get('error') is not None:
+            return
+        client = self._client
+        if client.metrics is not None:
+            client.metrics.call(self._query['method'])
+        # Instrumented like any other request, only the body is streamed
+        with client._exchange(self._query, self._gzip) as exchange:
+            # What was parsed so far, if the iteration stops early
+            exchange.response = self.fields
+            for url in iter_array(_iter_body(exchange.r), 'feed',
+                                  self.fields):
+                if self._typed and isinstance(url, dict):
+                    url = URL.from_dict(url)
+                yield url
+            exchange.received = time.time()
+            exchange.response_bytes = exchange.r.raw.tell()